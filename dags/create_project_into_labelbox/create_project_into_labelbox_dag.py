@@ -6,13 +6,11 @@ import os
 from datetime import datetime, timedelta
 
 from airflow import DAG
-from airflow.hooks.base_hook import BaseHook
-from airflow.models import Variable
 from airflow.operators.dummy_operator import DummyOperator
 from airflow.operators.python_operator import BranchPythonOperator, PythonOperator
 
 from create_project_into_labelbox import create_project_into_labelbox
-from utils import file_ops, slack
+from utils import airflow_config, file_ops, slack
 
 
 BASE_AIRFLOW_FOLDER = "/usr/local/airflow/"
@@ -20,14 +18,12 @@ AIRFLOW_DATA_FOLDER = os.path.join(BASE_AIRFLOW_FOLDER, "data")
 AIRFLOW_IMAGE_FOLDER = os.path.join(AIRFLOW_DATA_FOLDER, "images")
 AIRFLOW_JSON_FOLDER = os.path.join(AIRFLOW_DATA_FOLDER, "json")
 
-labelbox_api_url = BaseHook.get_connection("labelbox").host
-labelbox_api_key = BaseHook.get_connection("labelbox").password
-slack_webhook_token = BaseHook.get_connection("slack").password
+labelbox_api_url = airflow_config.get_connection("labelbox").host
+labelbox_api_key = airflow_config.get_connection("labelbox").password
 
-
-bucket_name = Variable.get("bucket_name")
-ontology_front = Variable.get("ontology_front")
-ontology_bottom = Variable.get("ontology_bottom")
+# Only used in templated fields, resolved when the tasks run
+ontology_front = airflow_config.get_variable_template("ontology_front")
+ontology_bottom = airflow_config.get_variable_template("ontology_bottom")
 
 json_files = file_ops.get_files_in_directory(AIRFLOW_JSON_FOLDER, "*.json")
 
@@ -6,14 +6,12 @@ from datetime import datetime, timedelta
 
 from airflow import DAG
 from airflow.contrib.sensors.file_sensor import FileSensor
-from airflow.hooks.base_hook import BaseHook
-from airflow.models import Variable
 from airflow.operators.bash_operator import BashOperator
 from airflow.operators.python_operator import BranchPythonOperator, PythonOperator
 from airflow.operators.slack_operator import SlackAPIPostOperator
 
 from export_img_to_gcs_dataset import export_img_to_gcs_dataset
-from utils import slack
+from utils import airflow_config, slack
 
 
 BASE_AIRFLOW_FOLDER = "/usr/local/airflow/"
@@ -24,8 +22,8 @@ AIRFLOW_JSON_FOLDER = os.path.join(AIRFLOW_DATA_FOLDER, "json")
 
 GCP_STORAGE_BASE = "https://storage.googleapis.com/"
 
-slack_webhook_token = BaseHook.get_connection("slack").password
-bucket_name = Variable.get("bucket_name")
+# Only used in templated fields, resolved when the tasks run
+bucket_name = airflow_config.get_variable_template("bucket_name")
 
 
 default_args = {
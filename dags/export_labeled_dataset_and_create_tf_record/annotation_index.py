@@ -0,0 +1,297 @@
+"""
+Columnar index of Pascal VOC annotations.
+
+Every annotation XML is parsed once (iterparse, across a process pool) and stored as
+NumPy arrays in a single memory-mappable file:
+
+    example_ids   (N,)    S   Example id (annotation filename without extension)
+    filenames     (N,)    S   Image filename
+    widths        (N,)    i4  Image width from the annotation
+    heights       (N,)    i4  Image height from the annotation
+    xml_sha256    (N, 32) u1  SHA-256 of the annotation file
+    box_offsets   (N+1,)  i8  Boxes of example i are boxes[box_offsets[i]:box_offsets[i + 1]]
+    boxes         (M, 4)  f4  xmin, ymin, xmax, ymax in pixels (NaN when missing)
+    box_classes   (M,)    i4  Index of the box class in class_names
+    class_names   (C,)    S   Class names found in the annotations
+
+File layout: magic, uint64 header size, JSON header (dtype, shape and offset of every
+array) then the raw arrays aligned on 64 bytes.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree as ET
+
+import numpy as np
+
+INDEX_MAGIC = b"VOCIDX01"
+ARRAY_ALIGNMENT = 64
+PARSE_CHUNK_SIZE = 256
+BOX_FIELDS = ("xmin", "ymin", "xmax", "ymax")
+
+
+def __to_float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def __to_int(text):
+    try:
+        return int(float(text))
+    except (TypeError, ValueError):
+        return 0
+
+
+def __parse_annotation(xml_path):
+    """__parse_annotation
+
+    Parse one annotation file with iterparse
+
+    :param xml_path: Annotation file path
+    :type xml_path: str
+    :return: Tuple of (filename, width, height, xml_sha256, boxes, class_names)
+    :rtype: tuple
+    """
+    with open(xml_path, "rb") as infile:
+        content = infile.read()
+
+    filename = ""
+    width = 0
+    height = 0
+    boxes = []
+    class_names = []
+
+    for _, element in ET.iterparse(io.BytesIO(content)):
+        if element.tag == "filename":
+            filename = element.text or ""
+        elif element.tag == "size":
+            width = __to_int(element.findtext("width"))
+            height = __to_int(element.findtext("height"))
+        elif element.tag == "object":
+            bndbox = element.find("bndbox")
+            if bndbox is None:
+                boxes.append([float("nan")] * len(BOX_FIELDS))
+            else:
+                boxes.append([__to_float(bndbox.findtext(field)) for field in BOX_FIELDS])
+            class_names.append(element.findtext("name") or "")
+            element.clear()
+
+    return filename, width, height, hashlib.sha256(content).digest(), boxes, class_names
+
+
+def __parse_annotation_chunk(xml_paths):
+    return [
+        __parse_annotation(xml_path) if os.path.exists(xml_path) else None for xml_path in xml_paths
+    ]
+
+
+def __to_bytes_array(values):
+    encoded_values = [value.encode("utf8") for value in values]
+    return np.array(encoded_values, dtype=f"S{max([len(v) for v in encoded_values] + [1])}")
+
+
+def write_columnar_file(path, arrays):
+    """write_columnar_file
+
+    Write named NumPy arrays into a single memory-mappable file
+
+    :param path: Output file path
+    :type path: str
+    :param arrays: Arrays by name
+    :type arrays: dict
+    """
+    header = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+        header[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+
+    header_bytes = json.dumps(header).encode("utf8")
+    data_start = len(INDEX_MAGIC) + 8 + len(header_bytes)
+    data_start = -(-data_start // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as outfile:
+        outfile.write(INDEX_MAGIC)
+        outfile.write(struct.pack("<Q", data_start))
+        outfile.write(header_bytes)
+        for name, array in arrays.items():
+            outfile.seek(data_start + header[name]["offset"])
+            outfile.write(np.ascontiguousarray(array).tobytes())
+        outfile.truncate(data_start + offset)
+    os.replace(temporary_path, path)
+
+
+def load_columnar_file(path):
+    """load_columnar_file
+
+    Memory map the arrays of a file written by write_columnar_file
+
+    :param path: File path
+    :type path: str
+    :raises ValueError: The file is not a columnar file
+    :return: Read-only arrays by name
+    :rtype: dict
+    """
+    with open(path, "rb") as infile:
+        if infile.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            raise ValueError(f"{path} is not an annotation index file")
+        (data_start,) = struct.unpack("<Q", infile.read(8))
+        header = json.loads(infile.read(data_start - len(INDEX_MAGIC) - 8).rstrip(b"\0"))
+
+    arrays = {}
+    for name, info in header.items():
+        shape = tuple(info["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=info["dtype"])
+            continue
+        arrays[name] = np.memmap(
+            path, dtype=info["dtype"], mode="r", offset=data_start + info["offset"], shape=shape
+        )
+
+    return arrays
+
+
+def build_annotation_index(annotation_dir, examples, index_file, workers=None):
+    """build_annotation_index
+
+    Parse the annotation of every example once across a process pool and save the
+    columnar index. Examples without an annotation file are left out
+
+    :param annotation_dir: Annotation directory
+    :type annotation_dir: str
+    :param examples: Example ids (annotation filenames without extension)
+    :type examples: list
+    :param index_file: Output index file path
+    :type index_file: str
+    :param workers: Number of parsing processes, defaults to the cpu count
+    :type workers: int, optional
+    :return: The memory mapped index
+    :rtype: dict
+    """
+    xml_paths = [os.path.join(annotation_dir, f"{example}.xml") for example in examples]
+    chunks = [
+        xml_paths[start : start + PARSE_CHUNK_SIZE]
+        for start in range(0, len(xml_paths), PARSE_CHUNK_SIZE)
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        annotations = [
+            annotation
+            for chunk in executor.map(__parse_annotation_chunk, chunks)
+            for annotation in chunk
+        ]
+
+    example_ids = []
+    filenames = []
+    widths = []
+    heights = []
+    xml_sha256 = []
+    box_offsets = [0]
+    boxes = []
+    box_class_names = []
+
+    for example, xml_path, annotation in zip(examples, xml_paths, annotations):
+        if annotation is None:
+            logging.warning("Could not find %s, ignoring example.", xml_path)
+            continue
+        filename, width, height, digest, example_boxes, example_class_names = annotation
+        example_ids.append(example)
+        filenames.append(filename)
+        widths.append(width)
+        heights.append(height)
+        xml_sha256.append(np.frombuffer(digest, dtype=np.uint8))
+        boxes.extend(example_boxes)
+        box_class_names.extend(example_class_names)
+        box_offsets.append(len(boxes))
+
+    class_names = sorted(set(box_class_names))
+    class_indexes = {class_name: index for index, class_name in enumerate(class_names)}
+
+    write_columnar_file(
+        index_file,
+        {
+            "example_ids": __to_bytes_array(example_ids),
+            "filenames": __to_bytes_array(filenames),
+            "widths": np.array(widths, dtype=np.int32),
+            "heights": np.array(heights, dtype=np.int32),
+            "xml_sha256": np.array(xml_sha256, dtype=np.uint8).reshape(-1, 32),
+            "box_offsets": np.array(box_offsets, dtype=np.int64),
+            "boxes": np.array(boxes, dtype=np.float32).reshape(-1, len(BOX_FIELDS)),
+            "box_classes": np.array(
+                [class_indexes[class_name] for class_name in box_class_names], dtype=np.int32
+            ),
+            "class_names": __to_bytes_array(class_names),
+        },
+    )
+    logging.info(f"Indexed {len(example_ids)} annotations ({len(boxes)} boxes) in {index_file}")
+
+    return load_annotation_index(index_file)
+
+
+def load_annotation_index(index_file):
+    """load_annotation_index
+
+    :param index_file: Index file path
+    :type index_file: str
+    :return: The memory mapped index
+    :rtype: dict
+    """
+    return load_columnar_file(index_file)
+
+
+def get_box_example_rows(index):
+    """get_box_example_rows
+
+    :param index: Annotation index
+    :type index: dict
+    :return: The example row of every box
+    :rtype: numpy.ndarray
+    """
+    return np.repeat(
+        np.arange(len(index["example_ids"])), np.diff(index["box_offsets"]).astype(np.int64)
+    )
+
+
+def get_normalized_boxes(index):
+    """get_normalized_boxes
+
+    Normalize every box by its image size in one vectorized pass
+
+    :param index: Annotation index
+    :type index: dict
+    :return: Boxes as xmin, ymin, xmax, ymax in [0, 1] (NaN or inf for invalid sizes)
+    :rtype: numpy.ndarray
+    """
+    box_example_rows = get_box_example_rows(index)
+    widths = index["widths"][box_example_rows].astype(np.float32)
+    heights = index["heights"][box_example_rows].astype(np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return index["boxes"] / np.stack([widths, heights, widths, heights], axis=1)
+
+
+def get_box_label_ids(index, label_map_dict):
+    """get_box_label_ids
+
+    Map the class of every box to its label map id
+
+    :param index: Annotation index
+    :type index: dict
+    :param label_map_dict: A map from label names to ids
+    :type label_map_dict: dict
+    :return: Label id of every box, -1 for classes missing from the label map
+    :rtype: numpy.ndarray
+    """
+    class_label_ids = np.array(
+        [label_map_dict.get(name.decode("utf8"), -1) for name in index["class_names"]] + [-1],
+        dtype=np.int64,
+    )
+    return class_label_ids[index["box_classes"]]
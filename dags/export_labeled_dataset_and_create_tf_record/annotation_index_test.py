@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from export_labeled_dataset_and_create_tf_record import annotation_index
+
+ANNOTATION = """<annotation>
+  <filename>{filename}</filename>
+  <size><width>200</width><height>100</height><depth>3</depth></size>
+  {objects}
+</annotation>
+"""
+OBJECT = """<object>
+    <name>{name}</name>
+    <bndbox><xmin>{xmin}</xmin><ymin>10</ymin><xmax>100</xmax><ymax>50</ymax></bndbox>
+  </object>"""
+
+
+class AnnotationIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.annotation_dir = self.temp_dir.name
+        self.index_file = os.path.join(self.temp_dir.name, "annotations.idx")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_annotation(self, example, objects):
+        with open(os.path.join(self.annotation_dir, f"{example}.xml"), "w") as outfile:
+            outfile.write(
+                ANNOTATION.format(
+                    filename=f"{example}.jpg",
+                    objects="".join(OBJECT.format(name=name, xmin=xmin) for name, xmin in objects),
+                )
+            )
+
+    def test_columnar_file_round_trip(self):
+        arrays = {
+            "ids": np.array([b"a", b"bc"]),
+            "boxes": np.arange(12, dtype=np.float32).reshape(3, 4),
+            "empty": np.zeros((0, 4), dtype=np.float32),
+        }
+        annotation_index.write_columnar_file(self.index_file, arrays)
+
+        loaded = annotation_index.load_columnar_file(self.index_file)
+
+        self.assertEqual(sorted(loaded), sorted(arrays))
+        for name, array in arrays.items():
+            self.assertEqual(loaded[name].dtype, array.dtype)
+            np.testing.assert_array_equal(loaded[name], array)
+        self.assertFalse(loaded["boxes"].flags.writeable)
+        self.assertFalse(os.path.exists(f"{self.index_file}.tmp"))
+
+    def test_bad_magic_or_version_is_rejected(self):
+        annotation_index.write_columnar_file(self.index_file, {"ids": np.array([b"a"])})
+        with open(self.index_file, "rb") as infile:
+            content = infile.read()
+
+        for magic in [b"VOCIDX02", b"NOTANIDX"]:
+            with open(self.index_file, "wb") as outfile:
+                outfile.write(magic + content[len(annotation_index.INDEX_MAGIC) :])
+            with self.assertRaises(ValueError):
+                annotation_index.load_columnar_file(self.index_file)
+
+    def test_build_annotation_index(self):
+        self.write_annotation("a", [("car", 20), ("truck", 40)])
+        self.write_annotation("b", [("bus", 0)])
+
+        with self.assertLogs(level="WARNING") as logs:
+            index = annotation_index.build_annotation_index(
+                self.annotation_dir, ["a", "missing", "b"], self.index_file, workers=1
+            )
+
+        self.assertIn("missing.xml", logs.output[0])
+        np.testing.assert_array_equal(index["example_ids"], [b"a", b"b"])
+        np.testing.assert_array_equal(index["filenames"], [b"a.jpg", b"b.jpg"])
+        np.testing.assert_array_equal(index["box_offsets"], [0, 2, 3])
+        np.testing.assert_array_equal(index["class_names"], [b"bus", b"car", b"truck"])
+        np.testing.assert_array_equal(index["box_classes"], [1, 2, 0])
+        self.assertEqual(index["xml_sha256"].shape, (2, 32))
+
+        np.testing.assert_allclose(
+            annotation_index.get_normalized_boxes(index),
+            [[0.1, 0.1, 0.5, 0.5], [0.2, 0.1, 0.5, 0.5], [0.0, 0.1, 0.5, 0.5]],
+        )
+        np.testing.assert_array_equal(
+            annotation_index.get_box_label_ids(index, {"car": 1, "bus": 2}), [1, -1, 2]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
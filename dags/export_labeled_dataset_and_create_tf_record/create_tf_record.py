@@ -21,46 +21,71 @@ See: O. M. Parkhi, A. Vedaldi, A. Zisserman, C. V. Jawahar
 Example usage:
     ./create_pet_tf_record --data_dir=/home/user/pet \
         --output_dir=/home/user/pet/output
+
+Records are written with utils.tf_record so that neither tensorflow nor
+object_detection has to be imported. Run it as a module from the dags folder:
+    python -m export_labeled_dataset_and_create_tf_record.create_tf_record ...
 """
+
 import argparse
 import hashlib
 import io
 import logging
 import os
-import random
 import re
 import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-from lxml import etree
+import numpy as np
 import PIL.Image
-import tensorflow as tf
-
-from object_detection.utils import dataset_util
-from object_detection.utils import label_map_util
 
+from export_labeled_dataset_and_create_tf_record import annotation_index
+from utils import label_map, tf_record
 
 FLAGS = None
 
+TRAIN_FRACTION = 0.95
 
-def dict_to_tf_example(data, label_map_dict, image_subdirectory, ignore_difficult_instances=False):
-    """Convert XML derived dict to tf.Example proto.
-    Notice that this function normalizes the bounding box coordinates provided
-    by the raw data.
+# Bump when index_row_to_tf_example output changes to invalidate the serialized example cache
+EXAMPLE_CACHE_VERSION = "3"
+
+
+def read_examples_list(path):
+    """Read list of training or validation examples.
+    The file is assumed to contain a single example per line where the first
+    token in the line is an identifier that allows us to find the image and
+    annotation xml for that example.
     Args:
-      data: dict holding PASCAL XML fields for a single image (obtained by
-        running dataset_util.recursive_parse_xml_to_dict)
-      label_map_dict: A map from string label names to integers ids.
+      path: absolute path to examples list file.
+    Returns:
+      list of example identifiers (strings).
+    """
+    with open(path) as fid:
+        lines = fid.readlines()
+    return [line.strip().split(" ")[0] for line in lines]
+
+
+def index_row_to_tf_example(
+    filename, width, height, boxes, labels, classes_text, image_subdirectory
+):
+    """Convert an annotation index row to tf.Example proto.
+    Args:
+      filename: Image filename.
+      width: Image width from the annotation.
+      height: Image height from the annotation.
+      boxes: Normalized boxes of the image as a (N, 4) array of xmin, ymin, xmax, ymax.
+      labels: Label map ids of the boxes.
+      classes_text: Class names of the boxes as bytes.
       image_subdirectory: String specifying subdirectory within the
         Pascal dataset directory holding the actual image data.
-      ignore_difficult_instances: Whether to skip difficult instances in the
-        dataset  (default: False).
     Returns:
       example: The converted tf.Example.
     Raises:
-      ValueError: if the image pointed to by data['filename'] is not a valid JPEG
+      ValueError: if the image pointed to by filename is not a valid JPEG
     """
-    img_path = os.path.join(image_subdirectory, data["filename"])
-    with tf.gfile.GFile(img_path, "rb") as fid:
+    img_path = os.path.join(image_subdirectory, filename)
+    with open(img_path, "rb") as fid:
         encoded_jpg = fid.read()
     encoded_jpg_io = io.BytesIO(encoded_jpg)
     image = PIL.Image.open(encoded_jpg_io)
@@ -68,90 +93,290 @@ def dict_to_tf_example(data, label_map_dict, image_subdirectory, ignore_difficul
         raise ValueError("Image format not JPEG")
     key = hashlib.sha256(encoded_jpg).hexdigest()
 
-    width = int(data["size"]["width"])
-    height = int(data["size"]["height"])
-
-    xmin = []
-    ymin = []
-    xmax = []
-    ymax = []
-    classes = []
-    classes_text = []
-    truncated = []
-    poses = []
-    difficult_obj = []
-    try:
-        for obj in data["object"]:
-            difficult_obj.append(int(0))
-
-            xmin.append(float(obj["bndbox"]["xmin"]) / width)
-            ymin.append(float(obj["bndbox"]["ymin"]) / height)
-            xmax.append(float(obj["bndbox"]["xmax"]) / width)
-            ymax.append(float(obj["bndbox"]["ymax"]) / height)
-
-            class_name = obj["name"]
-            classes_text.append(class_name.encode("utf8"))
-            classes.append(label_map_dict[class_name])
-            truncated.append(int(0))
-            poses.append("Unspecified".encode("utf8"))
-    except KeyError as e:
-        print(img_path)
-        return None
+    num_boxes = len(labels)
 
-    example = tf.train.Example(
-        features=tf.train.Features(
+    example = tf_record.Example(
+        features=tf_record.Features(
             feature={
-                "image/height": dataset_util.int64_feature(height),
-                "image/width": dataset_util.int64_feature(width),
-                "image/filename": dataset_util.bytes_feature(data["filename"].encode("utf8")),
-                "image/source_id": dataset_util.bytes_feature(data["filename"].encode("utf8")),
-                "image/key/sha256": dataset_util.bytes_feature(key.encode("utf8")),
-                "image/encoded": dataset_util.bytes_feature(encoded_jpg),
-                "image/format": dataset_util.bytes_feature("jpeg".encode("utf8")),
-                "image/object/bbox/xmin": dataset_util.float_list_feature(xmin),
-                "image/object/bbox/xmax": dataset_util.float_list_feature(xmax),
-                "image/object/bbox/ymin": dataset_util.float_list_feature(ymin),
-                "image/object/bbox/ymax": dataset_util.float_list_feature(ymax),
-                "image/object/class/text": dataset_util.bytes_list_feature(classes_text),
-                "image/object/class/label": dataset_util.int64_list_feature(classes),
-                "image/object/difficult": dataset_util.int64_list_feature(difficult_obj),
-                "image/object/truncated": dataset_util.int64_list_feature(truncated),
-                "image/object/view": dataset_util.bytes_list_feature(poses),
+                "image/height": tf_record.int64_feature(int(height)),
+                "image/width": tf_record.int64_feature(int(width)),
+                "image/filename": tf_record.bytes_feature(filename.encode("utf8")),
+                "image/source_id": tf_record.bytes_feature(filename.encode("utf8")),
+                "image/key/sha256": tf_record.bytes_feature(key.encode("utf8")),
+                "image/encoded": tf_record.bytes_feature(encoded_jpg),
+                "image/format": tf_record.bytes_feature("jpeg".encode("utf8")),
+                "image/object/bbox/xmin": tf_record.float_list_feature(boxes[:, 0].tolist()),
+                "image/object/bbox/xmax": tf_record.float_list_feature(boxes[:, 2].tolist()),
+                "image/object/bbox/ymin": tf_record.float_list_feature(boxes[:, 1].tolist()),
+                "image/object/bbox/ymax": tf_record.float_list_feature(boxes[:, 3].tolist()),
+                "image/object/class/text": tf_record.bytes_list_feature(classes_text),
+                "image/object/class/label": tf_record.int64_list_feature(labels.tolist()),
+                "image/object/difficult": tf_record.int64_list_feature([0] * num_boxes),
+                "image/object/truncated": tf_record.int64_list_feature([0] * num_boxes),
+                "image/object/view": tf_record.bytes_list_feature(
+                    ["Unspecified".encode("utf8")] * num_boxes
+                ),
             }
         )
     )
     return example
 
 
-def create_tf_record(output_filename, label_map_dict, annotations_dir, image_dir, examples):
-    """Creates a TFRecord file from examples.
+def get_convertible_rows(index, box_label_ids, examples):
+    """Returns the index rows of the examples which can be converted: examples with at
+    least one box and only classes found in the label map.
+    Args:
+      index: Annotation index.
+      box_label_ids: Label map id of every box of the index, -1 when unknown.
+      examples: Example ids to convert, the index may hold more examples.
+    Returns:
+      Array of index rows.
+    """
+    examples = set(examples)
+    listed = np.array(
+        [example_id.decode("utf8") in examples for example_id in index["example_ids"]], dtype=bool
+    )
+    box_counts = np.diff(index["box_offsets"])
+    unknown_counts = np.bincount(
+        annotation_index.get_box_example_rows(index)[box_label_ids < 0],
+        minlength=len(listed),
+    )
+    convertible = listed & (box_counts > 0) & (unknown_counts == 0)
+    if convertible.sum() < listed.sum():
+        logging.warning(
+            "Ignoring %d examples without boxes or with classes missing from the label map.",
+            int(listed.sum() - convertible.sum()),
+        )
+    return np.flatnonzero(convertible)
+
+
+def get_file_sha256(file_path):
+    """Returns the SHA-256 hex digest of a file."""
+    with open(file_path, "rb") as fid:
+        return hashlib.sha256(fid.read()).hexdigest()
+
+
+def write_cache_entry(cache_path, content):
+    """Atomically writes a cache entry, workers may write the same entry concurrently."""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as fid:
+        fid.write(content)
+    os.replace(temporary_path, cache_path)
+
+
+def read_cache_entry(cache_path):
+    """Reads a cache entry and marks it as used by the current run, None on a miss."""
+    if not os.path.exists(cache_path):
+        return None
+    os.utime(cache_path)
+    with open(cache_path, "rb") as fid:
+        return fid.read()
+
+
+def get_cached_image_sha256(cache_dir, img_path):
+    """Returns the SHA-256 of an image, memoized by path, size and modification time
+    so that unchanged images are not read again."""
+    stat = os.stat(img_path)
+    memo_key = hashlib.sha1(
+        f"{os.path.abspath(img_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf8")
+    ).hexdigest()
+    memo_path = os.path.join(cache_dir, "images", memo_key)
+
+    image_sha256 = read_cache_entry(memo_path)
+    if image_sha256 is not None:
+        return image_sha256.decode("utf8")
+
+    image_sha256 = get_file_sha256(img_path)
+    write_cache_entry(memo_path, image_sha256.encode("utf8"))
+    return image_sha256
+
+
+def get_example_cache_path(cache_dir, xml_sha256, image_sha256, label_map_sha256):
+    """Returns the cache path of a serialized example keyed by its annotation,
+    image and label map hashes."""
+    key = hashlib.sha256(
+        ":".join([EXAMPLE_CACHE_VERSION, xml_sha256, image_sha256, label_map_sha256]).encode("utf8")
+    ).hexdigest()
+    return os.path.join(cache_dir, "examples", key[:2], f"{key}.example")
+
+
+def prune_cache(cache_dir, used_since):
+    """Removes the cache entries which were not used since the given timestamp."""
+    pruned_entries = 0
+    for root, _, filenames in os.walk(cache_dir):
+        for filename in filenames:
+            entry_path = os.path.join(root, filename)
+            if os.path.getmtime(entry_path) < used_since:
+                os.remove(entry_path)
+                pruned_entries += 1
+    logging.info(f"Pruned {pruned_entries} unused cache entries from {cache_dir}")
+
+
+def create_tf_record(
+    output_filename,
+    label_map_dict,
+    index_file,
+    image_dir,
+    rows,
+    cache_dir=None,
+    label_map_sha256=None,
+    compression_type=None,
+):
+    """Creates a TFRecord file from annotation index rows and its sidecar index
+    (see tf_record.TFRecordWriter).
     Args:
       output_filename: Path to where output file is saved.
       label_map_dict: The label map dictionary.
-      annotations_dir: Directory where annotation files are stored.
+      index_file: Annotation index file built by annotation_index.build_annotation_index.
       image_dir: Directory where image files are stored.
-      examples: Examples to parse and save to tf record.
+      rows: Index rows of the examples to save to tf record.
+      cache_dir: Serialized example cache directory, None to disable the cache.
+      label_map_sha256: SHA-256 of the label map file, required with cache_dir.
+      compression_type: None, "GZIP" or "ZLIB".
+    Returns:
+      The number of examples written.
     """
-    writer = tf.io.TFRecordWriter(output_filename)
-    for idx, example in enumerate(examples):
+    index = annotation_index.load_annotation_index(index_file)
+    box_offsets = index["box_offsets"]
+    normalized_boxes = annotation_index.get_normalized_boxes(index)
+    box_label_ids = annotation_index.get_box_label_ids(index, label_map_dict)
+    class_names = [bytes(class_name) for class_name in index["class_names"]]
+
+    written_examples = 0
+    cache_hits = 0
+    writer = tf_record.TFRecordWriter(output_filename, compression_type, write_index=True)
+    for idx, row in enumerate(rows):
         if idx % 100 == 0:
-            logging.info("On image %d of %d", idx, len(examples))
-        path = os.path.join(annotations_dir, example + ".xml")
+            logging.info("On image %d of %d", idx, len(rows))
+        filename = index["filenames"][row].decode("utf8")
 
-        if not os.path.exists(path):
-            logging.warning("Could not find %s, ignoring example.", path)
-            continue
-        with tf.gfile.GFile(path, "r") as fid:
-            xml_str = fid.read()
-        xml = etree.fromstring(xml_str)
-        data = dataset_util.recursive_parse_xml_to_dict(xml)["annotation"]
+        cache_path = None
+        if cache_dir is not None:
+            img_path = os.path.join(image_dir, filename)
+            cache_path = get_example_cache_path(
+                cache_dir,
+                index["xml_sha256"][row].tobytes().hex(),
+                get_cached_image_sha256(cache_dir, img_path),
+                label_map_sha256,
+            )
+            serialized_example = read_cache_entry(cache_path)
+            if serialized_example is not None:
+                writer.write(serialized_example)
+                written_examples += 1
+                cache_hits += 1
+                continue
 
-        tf_example = dict_to_tf_example(data, label_map_dict, image_dir)
+        box_slice = slice(box_offsets[row], box_offsets[row + 1])
+        tf_example = index_row_to_tf_example(
+            filename,
+            index["widths"][row],
+            index["heights"][row],
+            normalized_boxes[box_slice],
+            box_label_ids[box_slice],
+            [class_names[class_index] for class_index in index["box_classes"][box_slice]],
+            image_dir,
+        )
 
-        if tf_example != None:
-            writer.write(tf_example.SerializeToString())
+        # Deterministic serialization keeps feature map order stable between runs
+        serialized_example = tf_example.SerializeToString(deterministic=True)
+        if cache_path is not None:
+            write_cache_entry(cache_path, serialized_example)
+        writer.write(serialized_example)
+        written_examples += 1
     writer.close()
-    logging.info(f"TF Record generated : {output_filename}")
+    logging.info(
+        f"TF Record generated : {output_filename} ({cache_hits}/{written_examples} cached examples)"
+    )
+
+    return written_examples
+
+
+def get_example_hash(example_id):
+    """Returns the SHA-256 digest of an example id. The first 8 bytes drive the
+    train/val split and the next 8 bytes the shard assignment."""
+    return hashlib.sha256(example_id.encode("utf8")).digest()
+
+
+def is_train_example(example_id, train_fraction=TRAIN_FRACTION):
+    """Deterministic train/val partition of an example computed from the hash of its id.
+    Adding or removing examples never moves an existing example to the other split, and
+    since the hash is uniform every class is split with the same expected ratio."""
+    split_value = int.from_bytes(get_example_hash(example_id)[:8], "big") / 2**64
+    return split_value < train_fraction
+
+
+def get_example_shard(example_id, num_shards):
+    """Deterministic shard of an example computed from the hash of its id, so that
+    new examples only change the shards they are assigned to."""
+    return int.from_bytes(get_example_hash(example_id)[8:16], "big") % num_shards
+
+
+def create_sharded_tf_record(
+    output_dir,
+    name,
+    label_map_dict,
+    index_file,
+    image_dir,
+    examples,
+    num_shards,
+    workers,
+    cache_dir=None,
+    label_map_sha256=None,
+    compression_type=None,
+):
+    """Creates a sharded TFRecord from annotation index rows using a process pool.
+    Examples are assigned to the shards by the hash of their id and every worker
+    writes its own shard.
+    Args:
+      output_dir: Directory where the shards are saved.
+      name: Name of the record, used as the shard filename prefix.
+      label_map_dict: The label map dictionary.
+      index_file: Annotation index file built by annotation_index.build_annotation_index.
+      image_dir: Directory where image files are stored.
+      examples: Dictionary of example ids to index rows to save to tf record.
+      num_shards: Number of shards to write.
+      workers: Number of worker processes.
+      cache_dir: Serialized example cache directory, None to disable the cache.
+      label_map_sha256: SHA-256 of the label map file, required with cache_dir.
+      compression_type: None, "GZIP" or "ZLIB".
+    Returns:
+      The list of shard paths.
+    """
+    # The shard count is not capped by the example count to keep the assignment stable
+    num_shards = max(1, num_shards)
+    shard_rows = [[] for _ in range(num_shards)]
+    for example in sorted(examples):
+        shard_rows[get_example_shard(example, num_shards)].append(examples[example])
+
+    # Shards of a previous run may have a different count
+    tf_record.remove_shards(output_dir, name)
+
+    shard_paths = [
+        tf_record.get_shard_path(output_dir, name, shard_index, num_shards)
+        for shard_index in range(num_shards)
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                create_tf_record,
+                shard_path,
+                label_map_dict,
+                index_file,
+                image_dir,
+                shard_rows[shard_index],
+                cache_dir,
+                label_map_sha256,
+                compression_type,
+            )
+            for shard_index, shard_path in enumerate(shard_paths)
+        ]
+        written_examples = sum(future.result() for future in futures)
+
+    logging.info(f"{written_examples} examples written to {num_shards} shards of {name}")
+
+    return shard_paths
 
 
 def parse_args():
@@ -168,6 +393,41 @@ def parse_args():
     )
     parser.add_argument("--output_dir", type=str, required=True, help="Path to output directory.")
     parser.add_argument("--dataset_name", type=str, required=True, help="Dataset name")
+    parser.add_argument(
+        "--num_shards", type=int, default=1, help="Number of shards per train and val record."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes writing the shards.",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="Path to the serialized example cache directory, the cache is disabled if not set.",
+    )
+    parser.add_argument(
+        "--annotation_index",
+        type=str,
+        default=None,
+        help="Path to the annotation index file, defaults to <dataset_name>_annotations.index "
+        "in the output directory.",
+    )
+    parser.add_argument(
+        "--compression",
+        type=str,
+        default=None,
+        choices=["GZIP", "ZLIB"],
+        help="Record compression, uncompressed if not set. The object detection API 1.13 "
+        "input reader only reads uncompressed records.",
+    )
+    parser.add_argument(
+        "--reuse_annotation_index",
+        action="store_true",
+        help="Load the annotation index file if it exists instead of parsing the annotations.",
+    )
 
     return parser
 
@@ -175,7 +435,7 @@ def parse_args():
 def main(_):
     home = os.path.expanduser("~")
 
-    label_map_dict = label_map_util.get_label_map_dict(FLAGS.label_map_file)
+    label_map_dict = label_map.get_label_map_dict(FLAGS.label_map_file)
 
     logging.info("Reading from dataset.")
     image_dir = FLAGS.image_dir
@@ -183,30 +443,71 @@ def main(_):
     output_dir = FLAGS.output_dir
     dataset_name = FLAGS.dataset_name
     examples_path = FLAGS.trainval_file
-    examples_list = dataset_util.read_examples_list(examples_path)
+    examples_list = read_examples_list(examples_path)
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    # Every annotation is parsed once into a columnar index shared by the shard writers
+    index_file = FLAGS.annotation_index or os.path.join(
+        output_dir, f"{dataset_name}_annotations.index"
+    )
+    if FLAGS.reuse_annotation_index and os.path.exists(index_file):
+        # i.g: the index built by validate_dataset for the unfiltered example list
+        index = annotation_index.load_annotation_index(index_file)
+    else:
+        index = annotation_index.build_annotation_index(
+            annotations_dir, examples_list, index_file, FLAGS.workers
+        )
+    rows = get_convertible_rows(
+        index, annotation_index.get_box_label_ids(index, label_map_dict), examples_list
+    )
 
     # Test images are not included in the downloaded data set, so we shall perform
-    # our own split.
-    random.seed(42)
-    random.shuffle(examples_list)
-    num_examples = len(examples_list)
-    num_train = int(0.95 * num_examples)
-    train_examples = examples_list[:num_train]
-    val_examples = examples_list[num_train:]
+    # our own split. The split is a function of each example id so that it stays
+    # stable when the dataset grows.
+    train_examples = {}
+    val_examples = {}
+    for row in rows:
+        example = index["example_ids"][row].decode("utf8")
+        if is_train_example(example):
+            train_examples[example] = row
+        else:
+            val_examples[example] = row
     logging.info("%d training and %d validation examples.", len(train_examples), len(val_examples))
 
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    train_output_path = os.path.join(output_dir, f"{dataset_name}_train.record")
-    val_output_path = os.path.join(output_dir, f"{dataset_name}_val.record")
+    label_map_sha256 = get_file_sha256(FLAGS.label_map_file)
+    run_started_at = time.time()
+
     # label_map_output_path = os.path.join(output_dir, "label_map.pbtxt")
-    create_tf_record(train_output_path, label_map_dict, annotations_dir, image_dir, train_examples)
-    create_tf_record(val_output_path, label_map_dict, annotations_dir, image_dir, val_examples)
+    for name, examples in [
+        (f"{dataset_name}_train", train_examples),
+        (f"{dataset_name}_val", val_examples),
+    ]:
+        create_sharded_tf_record(
+            output_dir,
+            name,
+            label_map_dict,
+            index_file,
+            image_dir,
+            examples,
+            FLAGS.num_shards,
+            FLAGS.workers,
+            FLAGS.cache_dir,
+            label_map_sha256,
+            FLAGS.compression,
+        )
+
+    if FLAGS.cache_dir is not None:
+        # One second margin for file systems with a coarse modification time
+        prune_cache(FLAGS.cache_dir, run_started_at - 1)
 
     # shutil.copy(FLAGS.label_map_file, label_map_output_path)
 
 
 if __name__ == "__main__":
+    # Run by a BashOperator, the progress is only in its log if INFO records are emitted
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
     parser = parse_args()
     FLAGS, unparsed = parser.parse_known_args()
-    tf.compat.v1.app.run(main=main)
+    main(unparsed)
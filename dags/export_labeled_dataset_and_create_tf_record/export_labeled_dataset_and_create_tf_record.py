@@ -1,14 +1,30 @@
 import json
+import logging
 import os
 import shutil
+import threading
 import time
+import urllib.error
+import urllib.parse
 import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from xml.etree import ElementTree as ET
 
+import PIL.Image
 from graphqlclient import GraphQLClient
 
 from utils import file_ops
 
+EXPORT_READ_CHUNK_SIZE = 64 * 1024
+DEFAULT_IMAGE_EXTENSION = ".jpg"
+LABELS_PAGE_SIZE = 100
+
+# How the image of a label record was made available, see __resolve_image
+IMAGE_CONVERTED = "converted"
+IMAGE_LOCAL = "local"
+IMAGE_DOWNLOADED = "downloaded"
+
 
 def __get_client(api_url, api_key):
     api_token = "Bearer " + api_key
@@ -63,7 +79,25 @@ def __get_export_url(client, project_id):
     return res["data"]["exportLabels"]
 
 
-def generate_project_labels(api_url, api_key, project_name):
+def generate_project_labels(api_url, api_key, project_name, output_folder):
+    """generate_project_labels
+
+    Trigger the Labelbox export of a project, only needed by the full export of
+    fetch_project_labels: once the project has a cursor, the updated labels are paged instead
+
+    :param api_url: Labelbox api url
+    :type api_url: str
+    :param api_key: Labelbox api key
+    :type api_key: str
+    :param project_name: Labelbox project name
+    :type project_name: str
+    :param output_folder: Labelbox data directory
+    :type output_folder: str
+    """
+    if __read_cursor(__get_cursor_file(output_folder, project_name)) is not None:
+        logging.info(f"Project {project_name} has a cursor, its labels are fetched incrementally")
+        return
+
     client = __get_client(api_url, api_key)
     project_id = __get_specific_project_id(client, project_name)
     export_job = __get_export_url(client, project_id)
@@ -71,38 +105,638 @@ def generate_project_labels(api_url, api_key, project_name):
         print("Export Generating...")
 
 
+def __get_labels_updated_since(client, project_id, updated_since, page_start, skip, first):
+    res_str = client.execute(
+        """
+    query GetLabelsUpdatedSince($project_id: ID!, $updated_since: DateTime!, $page_start: DateTime!, $skip: Int!, $first: PageSize!){
+      project(where:{
+        id: $project_id
+      }){
+        labels(skip: $skip, first: $first, orderBy: updatedAt_ASC, where:{
+          updatedAt_gt: $updated_since
+          updatedAt_gte: $page_start
+        }){
+          id
+          label
+          createdAt
+          updatedAt
+          dataRow{
+            id
+            rowData
+            externalId
+          }
+        }
+      }
+    }
+    """,
+        {
+            "project_id": project_id,
+            "updated_since": updated_since,
+            "page_start": page_start,
+            "skip": skip,
+            "first": first,
+        },
+    )
+    res = json.loads(res_str)
+    return res["data"]["project"]["labels"]
+
+
+def __write_labels_updated_since(client, project_id, updated_since, json_file):
+    """__write_labels_updated_since
+
+    Page through the labels updated after the cursor, by update time, and write them to disk
+    using the same record format as a Labelbox export.
+
+    Pages start at the update time of the last label written and skip the labels of that
+    time already written, instead of skipping a number of labels from the start. A label
+    updated during the fetch moves after the last page, where it is written again with its
+    new content, rather than shifting the pages and making another label be skipped
+
+    :param client: GraphQL client
+    :type client: GraphQLClient
+    :param project_id: Labelbox project id
+    :type project_id: str
+    :param updated_since: Last label update time already converted
+    :type updated_since: str
+    :param json_file: Output JSON file path
+    :type json_file: str
+    :return: Number of labels written
+    :rtype: int
+    """
+    label_count = 0
+    page_start = updated_since
+    page_skip = 0
+    with open(json_file, "w", encoding="utf-8") as outfile:
+        outfile.write("[")
+        while True:
+            labels = __get_labels_updated_since(
+                client, project_id, updated_since, page_start, page_skip, LABELS_PAGE_SIZE
+            )
+            for label in labels:
+                record = {
+                    "ID": label["id"],
+                    "DataRow ID": label["dataRow"]["id"],
+                    "Labeled Data": label["dataRow"]["rowData"],
+                    "External ID": label["dataRow"]["externalId"],
+                    "Label": json.loads(label["label"]) if label["label"] != "Skip" else "Skip",
+                    "Created At": label["createdAt"],
+                    "Updated At": label["updatedAt"],
+                }
+                if label_count > 0:
+                    outfile.write(",")
+                json.dump(record, outfile, ensure_ascii=False)
+                label_count += 1
+
+            if len(labels) < LABELS_PAGE_SIZE:
+                break
+
+            last_updated_at = labels[-1]["updatedAt"]
+            last_updated_at_count = sum(
+                1 for label in labels if label["updatedAt"] == last_updated_at
+            )
+            if last_updated_at == page_start:
+                # The whole page has the same update time as the previous one
+                page_skip += last_updated_at_count
+            else:
+                page_start = last_updated_at
+                page_skip = last_updated_at_count
+        outfile.write("]")
+
+    return label_count
+
+
+def __get_cursor_file(labelbox_folder, project_name):
+    return os.path.join(labelbox_folder, "cursor", f"{project_name}.json")
+
+
+def __read_cursor(cursor_file):
+    """__read_cursor
+
+    Read the export cursor of a project. The cursor holds the last label update time
+    and the ids of the labels already converted
+
+    :param cursor_file: Cursor file path
+    :type cursor_file: str
+    :return: Cursor or None when the project has never been converted
+    :rtype: dict
+    """
+    if not file_ops.file_exist(cursor_file):
+        return None
+
+    with open(cursor_file, "r") as infile:
+        return json.load(infile)
+
+
+def __write_cursor(cursor_file, cursor):
+    file_ops.folder_exist_or_create(os.path.dirname(cursor_file))
+
+    temporary_file = f"{cursor_file}.tmp"
+    with open(temporary_file, "w") as outfile:
+        json.dump(cursor, outfile)
+    os.replace(temporary_file, cursor_file)
+
+
 def fetch_project_labels(api_url, api_key, project_name, output_folder):
+    """fetch_project_labels
+
+    Fetch the labels of a project. The first run downloads the full export, following runs
+    only fetch the labels updated since the project cursor. Delete the cursor file to force
+    a full export (i.g: labels were deleted from Labelbox)
+
+    :param api_url: Labelbox api url
+    :type api_url: str
+    :param api_key: Labelbox api key
+    :type api_key: str
+    :param project_name: Labelbox project name
+    :type project_name: str
+    :param output_folder: Labelbox data directory
+    :type output_folder: str
+    """
     client = __get_client(api_url, api_key)
     project_id = __get_specific_project_id(client, project_name)
+    cursor = __read_cursor(__get_cursor_file(output_folder, project_name))
+
+    folder = os.path.join(output_folder, "input", project_name)
+    file_ops.folder_exist_or_create(folder)
+
+    json_file = f"{folder}/{project_name}.json"
+    if os.path.exists(json_file):
+        os.remove(json_file)
+
+    if cursor is not None:
+        print(f"Fetching labels updated since {cursor['updated_at']} .....")
+        label_count = __write_labels_updated_since(
+            client, project_id, cursor["updated_at"], json_file
+        )
+        logging.info(f"Fetched {label_count} new or updated labels of project {project_name}")
+        return
+
     export_job = __get_export_url(client, project_id)
     print("Fetching payload .....")
 
-    with urllib.request.urlopen(export_job["downloadUrl"]) as url:
-        labels = json.loads(url.read().decode())
-        print(labels)
-        folder = os.path.join(output_folder, "input", project_name)
-        output_folder = os.path.join(output_folder, "output", project_name)
+    with urllib.request.urlopen(export_job["downloadUrl"]) as response:
+        # The export is streamed to disk as is, it will be parsed one record at a time
+        # by the VOC converter
+        with open(json_file, "wb") as f:
+            shutil.copyfileobj(response, f, EXPORT_READ_CHUNK_SIZE)
+
 
-        if os.path.exists(folder):
-            shutil.rmtree(folder)
-        os.makedirs(folder)
+def __iter_export_records(export_file, chunk_size=EXPORT_READ_CHUNK_SIZE):
+    """__iter_export_records
 
-        if os.path.exists(output_folder):
-            shutil.rmtree(output_folder)
-        os.makedirs(output_folder)
+    Lazily parse a Labelbox export file (a JSON array) and yield one label record at a time
+    so that the whole export never has to be loaded in memory
 
-        json_file = f"{folder}/{project_name}.json"
-        if os.path.exists(json_file):
-            os.remove(json_file)
+    :param export_file: Labelbox export JSON file path
+    :type export_file: str
+    :param chunk_size: Number of characters read from the file at once
+    :type chunk_size: int
+    :raises ValueError: The export file does not contain a JSON array
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    array_opened = False
+    eof = False
+
+    with open(export_file, "r", encoding="utf-8") as infile:
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+
+            if position == len(buffer):
+                if eof:
+                    return
+                buffer = infile.read(chunk_size)
+                position = 0
+                eof = not buffer
+                continue
+
+            if not array_opened:
+                if buffer[position] != "[":
+                    raise ValueError(f"Labelbox export {export_file} must contain a JSON array")
+                array_opened = True
+                position += 1
+                continue
+
+            if buffer[position] == "]":
+                return
+
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The current record is split between two chunks
+                if eof:
+                    raise
+                chunk = infile.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            yield record
+
+
+def __get_label_boxes(label):
+    """__get_label_boxes
+
+    Yield every bounding box of a Labelbox label payload. Both the objects format
+    (bbox) and the legacy format (class name mapped to a list of point geometries) are supported
+
+    :param label: Labelbox label payload
+    :type label: dict
+    :return: Tuples of (class_name, xmin, ymin, xmax, ymax)
+    :rtype: generator
+    """
+    if not isinstance(label, dict):
+        # Skipped labels are exported as the "Skip" string
+        return
+
+    if "objects" in label:
+        for obj in label["objects"]:
+            if "bbox" in obj:
+                bbox = obj["bbox"]
+                yield (
+                    obj["title"],
+                    bbox["left"],
+                    bbox["top"],
+                    bbox["left"] + bbox["width"],
+                    bbox["top"] + bbox["height"],
+                )
+            elif "polygon" in obj:
+                xs = [point["x"] for point in obj["polygon"]]
+                ys = [point["y"] for point in obj["polygon"]]
+                yield obj["title"], min(xs), min(ys), max(xs), max(ys)
+        return
+
+    for class_name, shapes in label.items():
+        if not isinstance(shapes, list):
+            continue
+        for shape in shapes:
+            points = shape.get("geometry", []) if isinstance(shape, dict) else shape
+            if not points:
+                continue
+            xs = [point["x"] for point in points]
+            ys = [point["y"] for point in points]
+            yield class_name, min(xs), min(ys), max(xs), max(ys)
+
+
+def __get_image_filename(record):
+    """__get_image_filename
+
+    Build the local image filename of a label record from its data row id
+
+    :param record: Labelbox label record
+    :type record: dict
+    :return: Image filename
+    :rtype: str
+    """
+    image_url = record["Labeled Data"]
+    extension = os.path.splitext(urllib.parse.urlparse(image_url).path)[1]
+    image_id = record.get("DataRow ID") or record["ID"]
 
-        with open(json_file, "w", encoding="utf-8") as f:
-            json.dump(labels, f, ensure_ascii=False, indent=4)
+    return f"{image_id}{extension or DEFAULT_IMAGE_EXTENSION}"
+
+
+def __download_image(image_url, image_path):
+    """__download_image
+
+    Download an image to disk. The file is written to a temporary path first so that
+    an interrupted download never leaves a truncated image behind
+
+    :param image_url: Image url
+    :type image_url: str
+    :param image_path: Destination image path
+    :type image_path: str
+    :return: Destination image path
+    :rtype: str
+    """
+    temporary_path = f"{image_path}.part"
+    with urllib.request.urlopen(image_url) as response:
+        with open(temporary_path, "wb") as outfile:
+            shutil.copyfileobj(response, outfile, EXPORT_READ_CHUNK_SIZE)
+    os.replace(temporary_path, image_path)
+
+    return image_path
+
+
+def __get_remote_md5(image_url):
+    """__get_remote_md5
+
+    Get the MD5 digest advertised by Google Cloud Storage for an image without downloading it
+
+    :param image_url: Image url
+    :type image_url: str
+    :return: Base64 encoded MD5 digest or None when the server does not provide it
+    :rtype: str
+    """
+    request = urllib.request.Request(image_url, method="HEAD")
+    with urllib.request.urlopen(request) as response:
+        for header in response.headers.get_all("x-goog-hash") or []:
+            for digest in header.split(","):
+                algorithm, _, value = digest.strip().partition("=")
+                if algorithm == "md5":
+                    return value
+
+    return None
+
+
+def __resolve_image(image_url, image_path, local_images_folder):
+    """__resolve_image
+
+    Resolve an image locally first: when the frame extracted in the images folder still matches
+    the uploaded object it is linked (or copied) instead of being downloaded again
+
+    :param image_url: Image url
+    :type image_url: str
+    :param image_path: Destination image path
+    :type image_path: str
+    :param local_images_folder: Local images directory, None to always download
+    :type local_images_folder: str
+    :return: Tuple of (destination image path, IMAGE_CONVERTED, IMAGE_LOCAL or IMAGE_DOWNLOADED)
+    :rtype: tuple
+    """
+    if file_ops.file_exist(image_path):
+        # Converted by a previous run, the image of a data row never changes
+        return image_path, IMAGE_CONVERTED
+
+    if local_images_folder is not None:
+        local_image_path = file_ops.gcs_path_to_local_path(local_images_folder, image_url)
+
+        if file_ops.file_exist(local_image_path):
+            try:
+                remote_md5 = __get_remote_md5(image_url)
+            except (urllib.error.URLError, ValueError):
+                remote_md5 = None
+
+            if remote_md5 is not None and remote_md5 == file_ops.get_file_md5(local_image_path):
+                file_ops.stage_file(local_image_path, image_path)
+                return image_path, IMAGE_LOCAL
+
+            logging.warning(f"Local image {local_image_path} does not match {image_url}")
+
+    return __download_image(image_url, image_path), IMAGE_DOWNLOADED
+
+
+def __write_voc_annotation(record, boxes, image_future, annotation_folder):
+    """__write_voc_annotation
+
+    Write the Pascal VOC annotation of a label record once its image is available
+
+    :param record: Labelbox label record
+    :type record: dict
+    :param boxes: Bounding boxes of the record as (class_name, xmin, ymin, xmax, ymax)
+    :type boxes: list
+    :param image_future: Future resolving to the local image path and how it was resolved
+    :type image_future: concurrent.futures.Future
+    :param annotation_folder: VOC annotation directory
+    :type annotation_folder: str
+    """
+    image_path, _ = image_future.result()
+    with PIL.Image.open(image_path) as image:
+        width, height = image.size
+        depth = len(image.getbands())
+
+    annotation = ET.Element("annotation")
+    ET.SubElement(annotation, "folder").text = "images"
+    ET.SubElement(annotation, "filename").text = os.path.basename(image_path)
+    source = ET.SubElement(annotation, "source")
+    ET.SubElement(source, "database").text = "Unknown"
+    size = ET.SubElement(annotation, "size")
+    ET.SubElement(size, "width").text = str(width)
+    ET.SubElement(size, "height").text = str(height)
+    ET.SubElement(size, "depth").text = str(depth)
+    ET.SubElement(annotation, "segmented").text = "0"
+
+    for class_name, xmin, ymin, xmax, ymax in boxes:
+        obj = ET.SubElement(annotation, "object")
+        ET.SubElement(obj, "name").text = class_name
+        ET.SubElement(obj, "pose").text = "Unspecified"
+        ET.SubElement(obj, "truncated").text = "0"
+        ET.SubElement(obj, "difficult").text = "0"
+        bndbox = ET.SubElement(obj, "bndbox")
+        ET.SubElement(bndbox, "xmin").text = str(int(round(xmin)))
+        ET.SubElement(bndbox, "ymin").text = str(int(round(ymin)))
+        ET.SubElement(bndbox, "xmax").text = str(int(round(xmax)))
+        ET.SubElement(bndbox, "ymax").text = str(int(round(ymax)))
+
+    # Replaced and never rewritten in place since annotations may be hardlinked by DAG 5
+    annotation_file = os.path.join(annotation_folder, f"{record['ID']}.xml")
+    ET.ElementTree(annotation).write(f"{annotation_file}.part")
+    os.replace(f"{annotation_file}.part", annotation_file)
+
+
+def __remove_stale_files(folder, file_ext, filenames_to_keep):
+    removed_files = 0
+    for file_path in file_ops.get_files_in_directory(folder, file_ext):
+        if file_ops.get_filename(file_path) not in filenames_to_keep:
+            os.remove(file_path)
+            removed_files += 1
+
+    return removed_files
+
+
+def __convert_export_to_voc(
+    project_name,
+    labelbox_folder,
+    local_images_folder,
+    image_executor,
+    xml_executor,
+    max_pending_records,
+):
+    """__convert_export_to_voc
+
+    Stream a project export and merge it into the project Pascal VOC output using the
+    given executors. Every referenced image is fetched only once.
+
+    Without a cursor the export is a full one: the output is rebuilt and files of labels
+    absent from the export are removed. With a cursor the export only holds new or updated
+    labels and only their annotations are rewritten. The cursor is saved once the
+    conversion succeeded
+
+    :param project_name: Labelbox project name
+    :type project_name: str
+    :param labelbox_folder: Labelbox data directory (contains input and output folders)
+    :type labelbox_folder: str
+    :param local_images_folder: Local images directory looked up before downloading an image
+    :type local_images_folder: str
+    :param image_executor: Executor used to fetch images
+    :type image_executor: concurrent.futures.Executor
+    :param xml_executor: Executor used to write VOC annotations
+    :type xml_executor: concurrent.futures.Executor
+    :param max_pending_records: Maximum number of records being converted at once
+    :type max_pending_records: int
+    :return: Conversion summary
+    :rtype: dict
+    """
+    export_file = os.path.join(labelbox_folder, "input", project_name, f"{project_name}.json")
+    annotation_folder = os.path.join(labelbox_folder, "output", project_name)
+    image_folder = os.path.join(annotation_folder, "images")
+    file_ops.folder_exist_or_create(image_folder)
+
+    cursor_file = __get_cursor_file(labelbox_folder, project_name)
+    cursor = __read_cursor(cursor_file)
+    full_export = cursor is None
+    if full_export:
+        cursor = {"updated_at": "", "labels": {}}
+
+    pending_records = threading.BoundedSemaphore(max_pending_records)
+    image_futures = {}
+    xml_futures = {}
+    skipped_records = 0
+    new_records = 0
+    removed_annotations = 0
+    converted_labels = {}
+
+    for record in __iter_export_records(export_file):
+        label_id = record["ID"]
+        updated_at = record.get("Updated At") or record.get("Created At") or ""
+        cursor["updated_at"] = max(cursor["updated_at"], updated_at)
+
+        # A label updated while the export was fetched is in it twice, the last one wins
+        previous_xml_future = xml_futures.pop(label_id, None)
+        if previous_xml_future is not None:
+            previous_xml_future.result()
+
+        boxes = list(__get_label_boxes(record.get("Label")))
+        if not boxes:
+            skipped_records += 1
+            annotation_file = os.path.join(annotation_folder, f"{label_id}.xml")
+            converted = label_id in cursor["labels"] or label_id in converted_labels
+            if converted and file_ops.file_exist(annotation_file):
+                os.remove(annotation_file)
+                removed_annotations += 1
+            cursor["labels"].pop(label_id, None)
+            converted_labels.pop(label_id, None)
+            continue
+
+        if label_id not in cursor["labels"] and label_id not in converted_labels:
+            new_records += 1
+        converted_labels[label_id] = updated_at
+
+        image_url = record["Labeled Data"]
+        image_future = image_futures.get(image_url)
+        if image_future is None:
+            image_path = os.path.join(image_folder, __get_image_filename(record))
+            image_future = image_executor.submit(
+                __resolve_image, image_url, image_path, local_images_folder
+            )
+            image_futures[image_url] = image_future
+
+        pending_records.acquire()
+        xml_future = xml_executor.submit(
+            __write_voc_annotation, record, boxes, image_future, annotation_folder
+        )
+        xml_future.add_done_callback(lambda _: pending_records.release())
+        xml_futures[label_id] = xml_future
+
+    for xml_future in xml_futures.values():
+        xml_future.result()
+
+    if full_export:
+        removed_annotations += __remove_stale_files(
+            annotation_folder, "*.xml", {f"{label_id}.xml" for label_id in converted_labels}
+        )
+        __remove_stale_files(
+            image_folder,
+            "*.*",
+            {os.path.basename(future.result()[0]) for future in image_futures.values()},
+        )
+
+    cursor["labels"].update(converted_labels)
+    __write_cursor(cursor_file, cursor)
+
+    # Images already converted by a previous run were neither looked up nor downloaded,
+    # the ratio only covers the images fetched by this run
+    image_sources = Counter(future.result()[1] for future in image_futures.values())
+    local_image_hits = image_sources[IMAGE_LOCAL]
+    fetched_images = local_image_hits + image_sources[IMAGE_DOWNLOADED]
+    local_image_hit_ratio = local_image_hits / fetched_images if fetched_images else 0.0
+
+    logging.info(
+        f"Converted {len(xml_futures)} labels ({new_records} new, {len(image_futures)} images) "
+        f"of project {project_name} to Pascal VOC, {removed_annotations} annotations removed, "
+        f"{skipped_records} labels without boxes skipped"
+    )
+    logging.info(
+        f"Local image hit ratio for project {project_name}: {local_image_hit_ratio:.2%} "
+        f"({local_image_hits}/{fetched_images}, "
+        f"{image_sources[IMAGE_CONVERTED]} images already converted)"
+    )
+
+    return {
+        "full_export": full_export,
+        "annotations": len(xml_futures),
+        "new_annotations": new_records,
+        "removed_annotations": removed_annotations,
+        "images": len(image_futures),
+        "converted_images": image_sources[IMAGE_CONVERTED],
+        "downloaded_images": image_sources[IMAGE_DOWNLOADED],
+        "local_image_hits": local_image_hits,
+        "local_image_hit_ratio": local_image_hit_ratio,
+        "skipped": skipped_records,
+    }
+
+
+def convert_projects_labels_to_voc(
+    project_names,
+    labelbox_folder,
+    local_images_folder=None,
+    max_image_downloads=16,
+    max_xml_writers=4,
+    max_pending_records=256,
+):
+    """convert_projects_labels_to_voc
+
+    Convert the Labelbox exports of several projects to Pascal VOC annotations and images
+    in parallel. Image downloads and annotation writes of all projects share bounded pools
+
+    :param project_names: Labelbox project names
+    :type project_names: list
+    :param labelbox_folder: Labelbox data directory (contains input and output folders)
+    :type labelbox_folder: str
+    :param local_images_folder: Local images directory looked up before downloading an image,
+        defaults to None (always download)
+    :type local_images_folder: str, optional
+    :param max_image_downloads: Maximum number of concurrent image downloads
+    :type max_image_downloads: int
+    :param max_xml_writers: Number of threads writing VOC annotations
+    :type max_xml_writers: int
+    :param max_pending_records: Maximum number of records being converted at once per project
+    :type max_pending_records: int
+    :return: Conversion summary per project
+    :rtype: dict
+    """
+    image_executor = ThreadPoolExecutor(max_workers=max_image_downloads)
+    xml_executor = ThreadPoolExecutor(max_workers=max_xml_writers)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(project_names))) as project_executor:
+            project_futures = {
+                project_name: project_executor.submit(
+                    __convert_export_to_voc,
+                    project_name,
+                    labelbox_folder,
+                    local_images_folder,
+                    image_executor,
+                    xml_executor,
+                    max_pending_records,
+                )
+                for project_name in project_names
+            }
+
+            return {
+                project_name: project_future.result()
+                for project_name, project_future in project_futures.items()
+            }
+    finally:
+        image_executor.shutdown()
+        xml_executor.shutdown()
 
 
 def generate_trainval_file(annotation_dir, output_dir, output_file):
-    if os.path.exists(output_dir):
-        shutil.rmtree(output_dir)
-    os.makedirs(output_dir)
+    # The output directory is not wiped since it also holds the previously generated records
+    file_ops.folder_exist_or_create(output_dir)
 
     trainval_file_path = os.path.join(output_dir, f"{output_file}.txt")
     xml_files = file_ops.get_files_in_directory(annotation_dir, "*.xml")
@@ -1,44 +1,36 @@
-import json
 import logging
 import os
 from datetime import datetime, timedelta
 
 from airflow import DAG
-from airflow.hooks.base_hook import BaseHook
-from airflow.models import Variable
 from airflow.operators.bash_operator import BashOperator
-from airflow.operators.docker_operator import DockerOperator
 from airflow.operators.dummy_operator import DummyOperator
 from airflow.operators.python_operator import PythonOperator
 
 from export_labeled_dataset_and_create_tf_record import export_labeled_dataset_and_create_tf_record
-from utils import file_ops, slack
-
-HOST_ROOT_FOLDER = os.environ["HOST_ROOT_FOLDER"]
-HOST_DATA_FOLDER = HOST_ROOT_FOLDER + "/data/"
-HOST_LABELBOX_FOLDER = HOST_DATA_FOLDER + "labelbox/"
-HOST_LABELBOX_INPUT_FOLDER = HOST_LABELBOX_FOLDER + "input/"
-HOST_LABELBOX_OUTPUT_FOLDER = HOST_LABELBOX_FOLDER + "/output/"
-
+from utils import airflow_config, file_ops, slack, tf_record_verifier
 
 BASE_AIRFLOW_FOLDER = "/usr/local/airflow/"
 AIRFLOW_DATA_FOLDER = os.path.join(BASE_AIRFLOW_FOLDER, "data")
 
 AIRFLOW_CURRENT_DAG_FOLDER = os.path.dirname(os.path.realpath(__file__))
+AIRFLOW_DAGS_FOLDER = os.path.dirname(AIRFLOW_CURRENT_DAG_FOLDER)
+AIRFLOW_IMAGE_FOLDER = os.path.join(AIRFLOW_DATA_FOLDER, "images")
 AIRFLOW_LABELBOX_FOLDER = os.path.join(AIRFLOW_DATA_FOLDER, "labelbox")
 AIRFLOW_LABELBOX_OUTPUT_FOLDER = os.path.join(AIRFLOW_LABELBOX_FOLDER, "output")
 AIRFLOW_TF_RECORD_FOLDER = os.path.join(AIRFLOW_DATA_FOLDER, "tfrecord")
 
+TF_RECORD_SHARD_COUNT = 8
+
 
-labelbox_api_url = BaseHook.get_connection("labelbox").host
-labelbox_api_key = BaseHook.get_connection("labelbox").password
-slack_webhook_token = BaseHook.get_connection("slack").password
+labelbox_api_url = airflow_config.get_connection("labelbox").host
+labelbox_api_key = airflow_config.get_connection("labelbox").password
 
-ontology_front = json.loads(Variable.get("ontology_front"))
-ontology_bottom = json.loads(Variable.get("ontology_bottom"))
+ontology_front = airflow_config.get_variable("ontology_front", deserialize_json=True)
+ontology_bottom = airflow_config.get_variable("ontology_bottom", deserialize_json=True)
 
 # TODO: Document this since it could be an issues
-export_project_name = Variable.get("labelbox_export_project_list").split(",")
+export_project_name = airflow_config.get_variable("labelbox_export_project_list").split(",")
 
 front_cam_object_list = [tool["name"] for tool in ontology_front["tools"]]
 
@@ -74,6 +66,20 @@ def get_proper_label_list(project_name):
         raise ValueError("Possible values are front or bottom")
 
 
+# All projects are converted in the same process, image downloads and annotation writes
+# share bounded pools. Images still present in the images folder are not downloaded again
+convert_labelbox_exports_to_voc = PythonOperator(
+    task_id="convert_labelbox_exports_to_voc",
+    python_callable=export_labeled_dataset_and_create_tf_record.convert_projects_labels_to_voc,
+    op_kwargs={
+        "project_names": export_project_name,
+        "labelbox_folder": AIRFLOW_LABELBOX_FOLDER,
+        "local_images_folder": AIRFLOW_IMAGE_FOLDER,
+    },
+    trigger_rule="all_success",
+    dag=dag,
+)
+
 for index, project_name in enumerate(export_project_name):
 
     generate_project_label_extract_from_task = PythonOperator(
@@ -83,6 +89,7 @@ for index, project_name in enumerate(export_project_name):
             "api_url": labelbox_api_url,
             "api_key": labelbox_api_key,
             "project_name": project_name,
+            "output_folder": AIRFLOW_LABELBOX_FOLDER,
         },
         trigger_rule="all_success",
         dag=dag,
@@ -101,29 +108,9 @@ for index, project_name in enumerate(export_project_name):
         dag=dag,
     )
 
-    input_folder = HOST_LABELBOX_INPUT_FOLDER + project_name
-    output_folder = HOST_LABELBOX_OUTPUT_FOLDER + project_name
-
-    # TODO : Rename input since it is ambiguous
-    extract_labeled_data_from_labelbox = DockerOperator(
-        task_id="extract_labeled_data_from_labelbox_" + project_name,
-        image="soniaauvets/labelbox-exporter:1.1.0",
-        force_pull=True,
-        auto_remove=True,
-        command=f"python main.py /input/{project_name}.json /output",
-        api_version="1.37",
-        docker_url="unix://var/run/docker.sock",
-        volumes=[f"{input_folder}:/input", f"{output_folder}:/output"],
-        network_mode="bridge",
-        provide_context=True,
-        trigger_rule="all_success",
-        dag=dag,
-    )
-
     voc_annotation_extract_dir = os.path.join(AIRFLOW_LABELBOX_OUTPUT_FOLDER, project_name)
     voc_image_extract_dir = os.path.join(AIRFLOW_LABELBOX_OUTPUT_FOLDER, project_name, "images")
 
-    # TODO:Validate voc data (Image + draw bbox)
     trainval_dir = os.path.join(AIRFLOW_TF_RECORD_FOLDER, project_name)
     labelmap_dir = os.path.join(AIRFLOW_TF_RECORD_FOLDER, project_name)
 
@@ -154,11 +141,33 @@ for index, project_name in enumerate(export_project_name):
     trainval_file = os.path.join(trainval_dir, f"trainval_{project_name}")
     labelmap_file = os.path.join(trainval_dir, f"label_map_{project_name}")
     tfrecord_output_dir = os.path.join(AIRFLOW_TF_RECORD_FOLDER, project_name)
+    tfrecord_cache_dir = os.path.join(tfrecord_output_dir, "cache")
+    validation_dir = os.path.join(tfrecord_output_dir, "validation")
+    annotation_index_file = os.path.join(validation_dir, "annotations.index")
 
-    create_tf_record_command = f"python {AIRFLOW_CURRENT_DAG_FOLDER}/create_tf_record.py --annotation_dir={voc_annotation_extract_dir} --image_dir={voc_image_extract_dir} --label_map_file={labelmap_file}.pbtxt --trainval_file={trainval_file}.txt --output_dir={tfrecord_output_dir} --dataset_name={project_name}"
+    # Run as a module from the dags folder so that the utils package can be imported
+    validate_dataset_command = f"cd {AIRFLOW_DAGS_FOLDER} && python -m export_labeled_dataset_and_create_tf_record.validate_dataset --annotation_dir={voc_annotation_extract_dir} --image_dir={voc_image_extract_dir} --label_map_file={labelmap_file}.pbtxt --trainval_file={trainval_file}.txt --output_dir={validation_dir} --annotation_index={annotation_index_file}"
+
+    validate_dataset = BashOperator(
+        task_id="validate_dataset_" + project_name, bash_command=validate_dataset_command, dag=dag
+    )
+
+    # Only the examples which passed validation are converted, reusing the validation index
+    create_tf_record_command = f"cd {AIRFLOW_DAGS_FOLDER} && python -m export_labeled_dataset_and_create_tf_record.create_tf_record --annotation_dir={voc_annotation_extract_dir} --image_dir={voc_image_extract_dir} --label_map_file={labelmap_file}.pbtxt --trainval_file={validation_dir}/trainval.txt --output_dir={tfrecord_output_dir} --dataset_name={project_name} --num_shards={TF_RECORD_SHARD_COUNT} --cache_dir={tfrecord_cache_dir} --annotation_index={annotation_index_file} --reuse_annotation_index"
 
     create_tf_record = BashOperator(
         task_id="create_tf_record_" + project_name, bash_command=create_tf_record_command, dag=dag
     )
 
-    generate_project_label_extract_from_task >> fetch_labels_from_project_task >> extract_labeled_data_from_labelbox >> create_trainval_file >> create_labelmap_file >> create_tf_record
+    verify_tf_record = PythonOperator(
+        task_id="verify_tf_record_" + project_name,
+        python_callable=tf_record_verifier.verify_tf_records,
+        op_kwargs={
+            "record_folder": tfrecord_output_dir,
+            "record_pattern": f"{project_name}_*.record",
+        },
+        trigger_rule="all_success",
+        dag=dag,
+    )
+
+    generate_project_label_extract_from_task >> fetch_labels_from_project_task >> convert_labelbox_exports_to_voc >> create_trainval_file >> create_labelmap_file >> validate_dataset >> create_tf_record >> verify_tf_record
@@ -0,0 +1,282 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+from xml.etree import ElementTree as ET
+
+import PIL.Image
+
+from export_labeled_dataset_and_create_tf_record import (
+    export_labeled_dataset_and_create_tf_record as export,
+)
+
+# Module level, private names are not mangled here
+resolve_image = export.__resolve_image
+iter_export_records = export.__iter_export_records
+read_cursor = export.__read_cursor
+write_cursor = export.__write_cursor
+get_cursor_file = export.__get_cursor_file
+write_labels_updated_since = export.__write_labels_updated_since
+convert_export_to_voc = export.__convert_export_to_voc
+
+IMAGE_CONTENT = b"frame"
+
+
+class ImageRequestHandler(BaseHTTPRequestHandler):
+    def send_image_headers(self):
+        md5 = base64.b64encode(hashlib.md5(IMAGE_CONTENT).digest()).decode("ascii")
+        self.send_response(200)
+        self.send_header("x-goog-hash", f"crc32c=AAAAAA==, md5={md5}")
+        self.send_header("Content-Length", str(len(IMAGE_CONTENT)))
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.send_image_headers()
+
+    def do_GET(self):
+        self.send_image_headers()
+        self.wfile.write(IMAGE_CONTENT)
+
+    def log_message(self, *args):
+        pass
+
+
+class ResolveImageTest(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), ImageRequestHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.image_url = f"http://127.0.0.1:{self.server.server_port}/bucket/dataset/frame.jpg"
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.temp_dir.name, "frame.jpg")
+        self.local_images_folder = os.path.join(self.temp_dir.name, "images")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def test_downloaded_without_local_image(self):
+        self.assertEqual(
+            resolve_image(self.image_url, self.image_path, self.local_images_folder),
+            (self.image_path, export.IMAGE_DOWNLOADED),
+        )
+        with open(self.image_path, "rb") as infile:
+            self.assertEqual(infile.read(), IMAGE_CONTENT)
+
+    def test_matching_local_image(self):
+        os.makedirs(os.path.join(self.local_images_folder, "dataset"))
+        with open(os.path.join(self.local_images_folder, "dataset", "frame.jpg"), "wb") as outfile:
+            outfile.write(IMAGE_CONTENT)
+
+        self.assertEqual(
+            resolve_image(self.image_url, self.image_path, self.local_images_folder),
+            (self.image_path, export.IMAGE_LOCAL),
+        )
+
+    def test_converted_image_is_not_a_local_hit(self):
+        with open(self.image_path, "wb") as outfile:
+            outfile.write(IMAGE_CONTENT)
+
+        self.assertEqual(
+            resolve_image(self.image_url, self.image_path, self.local_images_folder),
+            (self.image_path, export.IMAGE_CONVERTED),
+        )
+
+
+class IterExportRecordsTest(unittest.TestCase):
+    def test_records_split_between_chunks(self):
+        records = [
+            {"ID": "a", "Label": {"objects": []}, "External ID": "frame [1], copy"},
+            {"ID": "b", "Label": "Skip", "External ID": "{]"},
+            {"ID": "c", "Label": {"car": [{"geometry": [{"x": 1, "y": 2}]}]}},
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            export_file = os.path.join(temp_dir, "export.json")
+            with open(export_file, "w") as outfile:
+                outfile.write(" \n" + json.dumps(records, indent=2))
+
+            self.assertEqual(list(iter_export_records(export_file, chunk_size=5)), records)
+
+            with open(export_file, "w") as outfile:
+                outfile.write("[ ]")
+            self.assertEqual(list(iter_export_records(export_file, chunk_size=5)), [])
+
+    def test_not_an_array_raises(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            export_file = os.path.join(temp_dir, "export.json")
+            with open(export_file, "w") as outfile:
+                json.dump({"ID": "a"}, outfile)
+
+            with self.assertRaises(ValueError):
+                list(iter_export_records(export_file))
+
+
+class CursorTest(unittest.TestCase):
+    def test_write_and_read_cursor(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cursor_file = get_cursor_file(temp_dir, "project")
+            self.assertIsNone(read_cursor(cursor_file))
+
+            cursor = {"updated_at": "2020-01-02T00:00:00Z", "labels": {"a": "2020-01-01"}}
+            write_cursor(cursor_file, cursor)
+
+            self.assertEqual(read_cursor(cursor_file), cursor)
+            self.assertEqual(os.listdir(os.path.dirname(cursor_file)), ["project.json"])
+
+    def test_export_is_only_generated_without_cursor(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            client = mock.Mock()
+            client.execute.side_effect = [
+                json.dumps({"data": {"projects": [{"id": "id", "name": "project"}]}}),
+                json.dumps({"data": {"exportLabels": {"shouldPoll": False}}}),
+            ]
+            with mock.patch.object(export, "__get_client", return_value=client):
+                export.generate_project_labels("url", "key", "project", temp_dir)
+                self.assertIn("exportLabels", client.execute.call_args[0][0])
+
+                write_cursor(get_cursor_file(temp_dir, "project"), {"updated_at": "t0"})
+                client.reset_mock()
+                export.generate_project_labels("url", "key", "project", temp_dir)
+                client.execute.assert_not_called()
+
+
+class FakeLabelboxClient:
+    """Serves the labels query from a list of labels, like the Labelbox API"""
+
+    def __init__(self, labels, on_page=None):
+        self.labels = labels
+        self.on_page = on_page
+        self.queries = []
+
+    def execute(self, query, variables):
+        self.queries.append((query, variables))
+        labels = sorted(
+            (
+                label
+                for label in self.labels
+                if label["updatedAt"] > variables["updated_since"]
+                and label["updatedAt"] >= variables["page_start"]
+            ),
+            key=lambda label: label["updatedAt"],
+        )
+        page = labels[variables["skip"] : variables["skip"] + variables["first"]]
+        if self.on_page is not None:
+            self.on_page(len(self.queries))
+        return json.dumps({"data": {"project": {"labels": page}}})
+
+
+def create_label(label_id, updated_at):
+    return {
+        "id": label_id,
+        "label": "Skip",
+        "createdAt": "2020-01-01",
+        "updatedAt": updated_at,
+        "dataRow": {"id": f"row_{label_id}", "rowData": "gs://bucket/a/b.jpg", "externalId": "b"},
+    }
+
+
+class LabelsUpdatedSinceTest(unittest.TestCase):
+    def write_labels(self, client):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            json_file = os.path.join(temp_dir, "labels.json")
+            with mock.patch.object(export, "LABELS_PAGE_SIZE", 2):
+                label_count = write_labels_updated_since(client, "project", "t0", json_file)
+            records = list(iter_export_records(json_file))
+
+        self.assertEqual(label_count, len(records))
+        return [record["ID"] for record in records]
+
+    def test_pages_by_update_time(self):
+        client = FakeLabelboxClient(
+            [
+                create_label("a", "t1"),
+                create_label("b", "t2"),
+                create_label("c", "t2"),
+                create_label("d", "t2"),
+                create_label("e", "t3"),
+                create_label("old", "t0"),
+            ]
+        )
+
+        self.assertEqual(self.write_labels(client), ["a", "b", "c", "d", "e"])
+        self.assertIn("orderBy: updatedAt_ASC", client.queries[0][0])
+        self.assertEqual(
+            [(variables["page_start"], variables["skip"]) for _, variables in client.queries],
+            [("t0", 0), ("t2", 1), ("t2", 3)],
+        )
+
+    def test_label_updated_during_the_fetch_is_not_skipped(self):
+        labels = [create_label(label_id, f"t{index}") for index, label_id in enumerate("abcde", 1)]
+
+        def update_first_label(page_count):
+            if page_count == 1:
+                labels[0]["updatedAt"] = "t9"
+
+        client = FakeLabelboxClient(labels, update_first_label)
+
+        self.assertEqual(self.write_labels(client), ["a", "b", "c", "d", "e", "a"])
+
+
+class ConvertExportToVocTest(unittest.TestCase):
+    def create_record(self, label_id, updated_at, left):
+        label = {
+            "objects": [{"title": "car", "bbox": {"left": left, "top": 2, "width": 3, "height": 4}}]
+        }
+        return {
+            "ID": label_id,
+            "DataRow ID": "row",
+            "Labeled Data": "https://storage.googleapis.com/bucket/dataset/frame.jpg",
+            "Label": label if left is not None else "Skip",
+            "Updated At": updated_at,
+        }
+
+    def test_updates_are_merged_into_the_cursor(self):
+        with tempfile.TemporaryDirectory() as labelbox_folder:
+            annotation_folder = os.path.join(labelbox_folder, "output", "project")
+            os.makedirs(os.path.join(annotation_folder, "images"))
+            os.makedirs(os.path.join(labelbox_folder, "input", "project"))
+            # Converted by a previous run, the image is not fetched again
+            PIL.Image.new("RGB", (16, 8)).save(os.path.join(annotation_folder, "images", "row.jpg"))
+            open(os.path.join(annotation_folder, "gone.xml"), "w").close()
+
+            cursor_file = get_cursor_file(labelbox_folder, "project")
+            write_cursor(cursor_file, {"updated_at": "t1", "labels": {"old": "t0", "gone": "t1"}})
+
+            records = [
+                self.create_record("new", "t2", 1),
+                self.create_record("gone", "t3", None),
+                self.create_record("new", "t4", 5),
+            ]
+            with open(
+                os.path.join(labelbox_folder, "input", "project", "project.json"), "w"
+            ) as outfile:
+                json.dump(records, outfile)
+
+            with ThreadPoolExecutor(2) as image_executor, ThreadPoolExecutor(2) as xml_executor:
+                summary = convert_export_to_voc(
+                    "project", labelbox_folder, None, image_executor, xml_executor, 4
+                )
+
+            self.assertEqual(
+                read_cursor(cursor_file), {"updated_at": "t4", "labels": {"old": "t0", "new": "t4"}}
+            )
+            self.assertFalse(summary["full_export"])
+            self.assertEqual(summary["new_annotations"], 1)
+            self.assertEqual(summary["removed_annotations"], 1)
+            self.assertEqual(summary["converted_images"], 1)
+            self.assertEqual(summary["local_image_hit_ratio"], 0.0)
+            self.assertEqual(sorted(os.listdir(annotation_folder)), ["images", "new.xml"])
+
+            annotation = ET.parse(os.path.join(annotation_folder, "new.xml"))
+            self.assertEqual(annotation.find("object/bndbox/xmin").text, "5")
+            self.assertEqual(annotation.find("size/width").text, "16")
+
+
+if __name__ == "__main__":
+    unittest.main()
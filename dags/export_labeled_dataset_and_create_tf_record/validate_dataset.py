@@ -0,0 +1,356 @@
+"""
+Validate a Pascal VOC dataset before creating its TFRecords.
+
+All the annotations are checked at once on the columnar annotation index: box bounds,
+degenerate boxes, classes against the label map and the annotation image size against
+the size read from the JPEG header. Run it as a module from the dags folder:
+    python -m export_labeled_dataset_and_create_tf_record.validate_dataset ...
+
+It writes a report (per-class histogram and rejection list) and the list of valid
+examples to give to create_tf_record.
+"""
+
+import argparse
+import json
+import logging
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from export_labeled_dataset_and_create_tf_record import annotation_index
+from utils import label_map
+
+FLAGS = None
+
+JPEG_SOI_MARKER = b"\xff\xd8"
+# Start of frame markers holding the image size, DHT (C4), JPG (C8) and DAC (CC) excluded
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Markers without a length field
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+IMAGE_MISSING = -1
+IMAGE_NOT_JPEG = -2
+
+EXAMPLE_REJECTION_REASONS = [
+    "missing_image",
+    "not_jpeg",
+    "image_size_mismatch",
+    "invalid_image_size",
+    "no_boxes",
+    "unknown_class",
+    "invalid_box_coordinates",
+    "box_out_of_bounds",
+    "degenerate_box",
+]
+
+
+def get_jpeg_size(image_path):
+    """get_jpeg_size
+
+    Read the size of a JPEG image from its start of frame segment without decoding it
+
+    :param image_path: Image path
+    :type image_path: str
+    :return: Tuple of (width, height), (IMAGE_MISSING, 0) if the file does not exist
+             and (IMAGE_NOT_JPEG, 0) if it is not a valid JPEG
+    :rtype: tuple
+    """
+    try:
+        infile = open(image_path, "rb")
+    except FileNotFoundError:
+        return IMAGE_MISSING, 0
+
+    with infile:
+        if infile.read(2) != JPEG_SOI_MARKER:
+            return IMAGE_NOT_JPEG, 0
+
+        while True:
+            marker = infile.read(2)
+            if len(marker) != 2 or marker[0] != 0xFF:
+                return IMAGE_NOT_JPEG, 0
+            # Fill bytes may precede a marker
+            while marker[1] == 0xFF:
+                marker = marker[1:] + infile.read(1)
+                if len(marker) != 2:
+                    return IMAGE_NOT_JPEG, 0
+            if marker[1] in JPEG_STANDALONE_MARKERS:
+                continue
+
+            segment_length_bytes = infile.read(2)
+            if len(segment_length_bytes) != 2:
+                return IMAGE_NOT_JPEG, 0
+            (segment_length,) = struct.unpack(">H", segment_length_bytes)
+
+            if marker[1] in JPEG_SOF_MARKERS:
+                frame_header = infile.read(5)
+                if len(frame_header) != 5:
+                    return IMAGE_NOT_JPEG, 0
+                _, height, width = struct.unpack(">BHH", frame_header)
+                return width, height
+
+            infile.seek(segment_length - 2, os.SEEK_CUR)
+
+
+def get_image_sizes(image_dir, filenames, workers=None):
+    """get_image_sizes
+
+    Probe the JPEG header of every image with a thread pool
+
+    :param image_dir: Image directory
+    :type image_dir: str
+    :param filenames: Image filenames
+    :type filenames: list
+    :param workers: Number of threads, defaults to the executor default
+    :type workers: int, optional
+    :return: Array of (width, height), see get_jpeg_size for the error values
+    :rtype: numpy.ndarray
+    """
+    image_paths = [os.path.join(image_dir, filename) for filename in filenames]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        sizes = list(executor.map(get_jpeg_size, image_paths))
+
+    return np.array(sizes, dtype=np.int64).reshape(-1, 2)
+
+
+def get_rejection_mask(index, box_label_ids, image_sizes):
+    """get_rejection_mask
+
+    Run every check on all the examples of the index at once
+
+    :param index: Annotation index
+    :type index: dict
+    :param box_label_ids: Label map id of every box, -1 when unknown
+    :type box_label_ids: numpy.ndarray
+    :param image_sizes: Image (width, height) of every example from get_image_sizes
+    :type image_sizes: numpy.ndarray
+    :return: Boolean array of shape (examples, len(EXAMPLE_REJECTION_REASONS))
+    :rtype: numpy.ndarray
+    """
+    num_examples = len(index["example_ids"])
+    widths = index["widths"].astype(np.int64)
+    heights = index["heights"].astype(np.int64)
+
+    boxes = index["boxes"]
+    box_example_rows = annotation_index.get_box_example_rows(index)
+    box_widths = widths[box_example_rows]
+    box_heights = heights[box_example_rows]
+
+    invalid_coordinates = ~np.isfinite(boxes).all(axis=1)
+    with np.errstate(invalid="ignore"):
+        out_of_bounds = (
+            (boxes[:, 0] < 0)
+            | (boxes[:, 1] < 0)
+            | (boxes[:, 2] > box_widths)
+            | (boxes[:, 3] > box_heights)
+        )
+        degenerate = (boxes[:, 2] <= boxes[:, 0]) | (boxes[:, 3] <= boxes[:, 1])
+
+    def any_box(box_mask):
+        return np.bincount(box_example_rows[box_mask], minlength=num_examples) > 0
+
+    image_found = image_sizes[:, 0] >= 0
+    reasons = {
+        "missing_image": image_sizes[:, 0] == IMAGE_MISSING,
+        "not_jpeg": image_sizes[:, 0] == IMAGE_NOT_JPEG,
+        "image_size_mismatch": image_found
+        & ((image_sizes[:, 0] != widths) | (image_sizes[:, 1] != heights)),
+        "invalid_image_size": (widths <= 0) | (heights <= 0),
+        "no_boxes": np.diff(index["box_offsets"]) == 0,
+        "unknown_class": any_box(box_label_ids < 0),
+        "invalid_box_coordinates": any_box(invalid_coordinates),
+        "box_out_of_bounds": any_box(out_of_bounds & ~invalid_coordinates),
+        "degenerate_box": any_box(degenerate & ~invalid_coordinates),
+    }
+
+    return np.stack([reasons[reason] for reason in EXAMPLE_REJECTION_REASONS], axis=1)
+
+
+def get_class_histogram(index, box_label_ids, label_map_dict, rows):
+    """get_class_histogram
+
+    :param index: Annotation index
+    :type index: dict
+    :param box_label_ids: Label map id of every box, -1 when unknown
+    :type box_label_ids: numpy.ndarray
+    :param label_map_dict: A map from label names to ids
+    :type label_map_dict: dict
+    :param rows: Index rows to count
+    :type rows: numpy.ndarray
+    :return: Number of boxes and images of every label map class
+    :rtype: dict
+    """
+    selected_examples = np.zeros(len(index["example_ids"]), dtype=bool)
+    selected_examples[rows] = True
+    box_example_rows = annotation_index.get_box_example_rows(index)
+    selected_boxes = selected_examples[box_example_rows] & (box_label_ids >= 0)
+
+    label_ids = box_label_ids[selected_boxes]
+    max_label_id = max(list(label_map_dict.values()) + [0])
+    box_counts = np.bincount(label_ids, minlength=max_label_id + 1)
+    # Unique (example, label) pairs give the number of images containing every label
+    image_label_ids = np.unique(
+        np.stack([box_example_rows[selected_boxes], label_ids], axis=1), axis=0
+    )[:, 1]
+    image_counts = np.bincount(image_label_ids, minlength=max_label_id + 1)
+
+    return {
+        name: {"boxes": int(box_counts[label_id]), "images": int(image_counts[label_id])}
+        for name, label_id in sorted(label_map_dict.items(), key=lambda item: item[1])
+    }
+
+
+def validate_dataset(
+    annotation_dir,
+    image_dir,
+    label_map_file,
+    trainval_file,
+    output_dir,
+    index_file=None,
+    workers=None,
+):
+    """validate_dataset
+
+    Validate the examples of a trainval file and write, in output_dir:
+    trainval.txt with the valid examples, report.json with the per-class histogram and
+    the rejection list, and the annotation index (annotations.index by default)
+
+    :param annotation_dir: Annotation directory
+    :type annotation_dir: str
+    :param image_dir: Image directory
+    :type image_dir: str
+    :param label_map_file: Label map file path
+    :type label_map_file: str
+    :param trainval_file: File listing the examples to validate
+    :type trainval_file: str
+    :param output_dir: Output directory
+    :type output_dir: str
+    :param index_file: Annotation index file path, defaults to annotations.index in output_dir
+    :type index_file: str, optional
+    :param workers: Number of annotation parsing processes and image probing threads
+    :type workers: int, optional
+    :raises ValueError: No example is valid
+    :return: The report
+    :rtype: dict
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    index_file = index_file or os.path.join(output_dir, "annotations.index")
+
+    with open(trainval_file) as infile:
+        examples = [line.strip().split(" ")[0] for line in infile if line.strip()]
+
+    label_map_dict = label_map.get_label_map_dict(label_map_file)
+    index = annotation_index.build_annotation_index(annotation_dir, examples, index_file, workers)
+    box_label_ids = annotation_index.get_box_label_ids(index, label_map_dict)
+    example_ids = [example_id.decode("utf8") for example_id in index["example_ids"]]
+    image_sizes = get_image_sizes(
+        image_dir, [filename.decode("utf8") for filename in index["filenames"]], workers
+    )
+
+    rejection_mask = get_rejection_mask(index, box_label_ids, image_sizes)
+    rejected = rejection_mask.any(axis=1)
+    valid_rows = np.flatnonzero(~rejected)
+
+    indexed_examples = set(example_ids)
+    rejections = [
+        {"example": example, "reasons": ["missing_annotation"]}
+        for example in examples
+        if example not in indexed_examples
+    ]
+    for row in np.flatnonzero(rejected):
+        rejections.append(
+            {
+                "example": example_ids[row],
+                "reasons": [
+                    reason
+                    for reason, is_rejected in zip(EXAMPLE_REJECTION_REASONS, rejection_mask[row])
+                    if is_rejected
+                ],
+            }
+        )
+
+    report = {
+        "examples": len(examples),
+        "valid_examples": len(valid_rows),
+        "rejected_examples": len(rejections),
+        "rejections_by_reason": {
+            reason: int(count)
+            for reason, count in zip(EXAMPLE_REJECTION_REASONS, rejection_mask.sum(axis=0))
+        },
+        "classes": get_class_histogram(index, box_label_ids, label_map_dict, valid_rows),
+        "rejections": rejections,
+    }
+    report["rejections_by_reason"]["missing_annotation"] = len(examples) - len(example_ids)
+
+    with open(os.path.join(output_dir, "trainval.txt"), "w") as outfile:
+        outfile.writelines(f"{example_ids[row]}\n" for row in valid_rows)
+
+    with open(os.path.join(output_dir, "report.json"), "w") as outfile:
+        json.dump(report, outfile, indent=2)
+
+    logging.info(
+        f"{len(valid_rows)} valid and {len(rejections)} rejected examples: "
+        f"{report['rejections_by_reason']}"
+    )
+    logging.info(f"Boxes and images per class: {report['classes']}")
+
+    if len(valid_rows) == 0:
+        raise ValueError(f"No valid example in {trainval_file}")
+
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--label_map_file", type=str, required=True, help="Path to label_map.pbtxt file."
+    )
+    parser.add_argument("--image_dir", type=str, required=True, help="Path to images directory.")
+    parser.add_argument(
+        "--annotation_dir", type=str, required=True, help="Path to annotation directory."
+    )
+    parser.add_argument(
+        "--trainval_file", type=str, required=True, help="Path to trainval.txt file."
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        required=True,
+        help="Path to the directory of the valid example list, report and annotation index.",
+    )
+    parser.add_argument(
+        "--annotation_index",
+        type=str,
+        default=None,
+        help="Path to the annotation index file, defaults to annotations.index in the output "
+        "directory.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes parsing annotations and threads reading image headers.",
+    )
+
+    return parser
+
+
+def main(_):
+    validate_dataset(
+        FLAGS.annotation_dir,
+        FLAGS.image_dir,
+        FLAGS.label_map_file,
+        FLAGS.trainval_file,
+        FLAGS.output_dir,
+        FLAGS.annotation_index,
+        FLAGS.workers,
+    )
+
+
+if __name__ == "__main__":
+    # Run by a BashOperator, the progress is only in its log if INFO records are emitted
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = parse_args()
+    FLAGS, unparsed = parser.parse_known_args()
+    main(unparsed)
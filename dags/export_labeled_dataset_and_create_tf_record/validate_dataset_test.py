@@ -0,0 +1,158 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import PIL.Image
+
+from export_labeled_dataset_and_create_tf_record import validate_dataset
+
+VALID_BOX = [10, 10, 50, 50]
+
+
+def create_index(examples):
+    """Annotation index of (width, height, boxes) examples, see annotation_index"""
+    boxes = [box for _, _, example_boxes in examples for box in example_boxes]
+    return {
+        "example_ids": np.array([str(row).encode("utf8") for row in range(len(examples))]),
+        "widths": np.array([width for width, _, _ in examples], dtype=np.int32),
+        "heights": np.array([height for _, height, _ in examples], dtype=np.int32),
+        "box_offsets": np.cumsum([0] + [len(example_boxes) for _, _, example_boxes in examples]),
+        "boxes": np.array(boxes, dtype=np.float32).reshape(-1, 4),
+    }
+
+
+class GetJpegSizeTest(unittest.TestCase):
+    def test_baseline_and_progressive_jpeg(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for progressive in [False, True]:
+                image_path = os.path.join(temp_dir, f"image_{progressive}.jpg")
+                PIL.Image.new("RGB", (64, 48)).save(image_path, progressive=progressive)
+
+                self.assertEqual(validate_dataset.get_jpeg_size(image_path), (64, 48))
+
+    def test_not_a_jpeg(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image_path = os.path.join(temp_dir, "image.jpg")
+            PIL.Image.new("RGB", (64, 48)).save(image_path, format="PNG")
+            self.assertEqual(
+                validate_dataset.get_jpeg_size(image_path), (validate_dataset.IMAGE_NOT_JPEG, 0)
+            )
+
+            # Truncated before the start of frame
+            with open(image_path, "wb") as outfile:
+                outfile.write(b"\xff\xd8\xff\xe0\x00\x10JFIF")
+            self.assertEqual(
+                validate_dataset.get_jpeg_size(image_path), (validate_dataset.IMAGE_NOT_JPEG, 0)
+            )
+
+            self.assertEqual(
+                validate_dataset.get_jpeg_size(os.path.join(temp_dir, "missing.jpg")),
+                (validate_dataset.IMAGE_MISSING, 0),
+            )
+
+
+class RejectionTest(unittest.TestCase):
+    def test_every_rejection_reason(self):
+        # (width, height, boxes, box label ids, image size, expected reasons)
+        examples = [
+            (100, 100, [VALID_BOX], [1], (100, 100), []),
+            (100, 100, [VALID_BOX], [1], (validate_dataset.IMAGE_MISSING, 0), ["missing_image"]),
+            (100, 100, [VALID_BOX], [1], (validate_dataset.IMAGE_NOT_JPEG, 0), ["not_jpeg"]),
+            (100, 100, [VALID_BOX], [1], (50, 100), ["image_size_mismatch"]),
+            (0, 100, [VALID_BOX], [1], (0, 100), ["invalid_image_size", "box_out_of_bounds"]),
+            (100, 100, [], [], (100, 100), ["no_boxes"]),
+            (100, 100, [VALID_BOX], [-1], (100, 100), ["unknown_class"]),
+            (100, 100, [[10, np.nan, 50, 50]], [1], (100, 100), ["invalid_box_coordinates"]),
+            (100, 100, [[10, 10, 150, 50]], [1], (100, 100), ["box_out_of_bounds"]),
+            (100, 100, [[50, 10, 50, 50]], [1], (100, 100), ["degenerate_box"]),
+        ]
+        index = create_index([(width, height, boxes) for width, height, boxes, *_ in examples])
+        box_label_ids = np.array(
+            [label_id for example in examples for label_id in example[3]], dtype=np.int64
+        )
+        image_sizes = np.array([example[4] for example in examples], dtype=np.int64)
+
+        rejection_mask = validate_dataset.get_rejection_mask(index, box_label_ids, image_sizes)
+
+        self.assertEqual(
+            set(validate_dataset.EXAMPLE_REJECTION_REASONS),
+            {reason for example in examples for reason in example[5]},
+        )
+        for row, example in enumerate(examples):
+            reasons = [
+                reason
+                for reason, is_rejected in zip(
+                    validate_dataset.EXAMPLE_REJECTION_REASONS, rejection_mask[row]
+                )
+                if is_rejected
+            ]
+            self.assertEqual(reasons, example[5], f"row {row}")
+
+    def test_class_histogram(self):
+        index = create_index(
+            [
+                (100, 100, [VALID_BOX, VALID_BOX, VALID_BOX, VALID_BOX]),
+                (100, 100, [VALID_BOX]),
+                (100, 100, [VALID_BOX]),
+            ]
+        )
+        box_label_ids = np.array([1, 1, 2, -1, 1, 2])
+
+        histogram = validate_dataset.get_class_histogram(
+            index, box_label_ids, {"car": 1, "bus": 2, "truck": 3}, np.array([0, 1])
+        )
+
+        self.assertEqual(
+            histogram,
+            {
+                "car": {"boxes": 3, "images": 2},
+                "bus": {"boxes": 1, "images": 1},
+                "truck": {"boxes": 0, "images": 0},
+            },
+        )
+
+
+class ValidateDatasetTest(unittest.TestCase):
+    def test_no_valid_example_raises(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            annotation_dir = os.path.join(temp_dir, "annotations")
+            image_dir = os.path.join(temp_dir, "images")
+            output_dir = os.path.join(temp_dir, "output")
+            os.makedirs(annotation_dir)
+            os.makedirs(image_dir)
+
+            with open(os.path.join(annotation_dir, "a.xml"), "w") as outfile:
+                outfile.write(
+                    "<annotation><filename>a.jpg</filename>"
+                    "<size><width>64</width><height>48</height></size>"
+                    "<object><name>car</name><bndbox><xmin>1</xmin><ymin>1</ymin>"
+                    "<xmax>10</xmax><ymax>10</ymax></bndbox></object></annotation>"
+                )
+            label_map_file = os.path.join(temp_dir, "label_map.pbtxt")
+            with open(label_map_file, "w") as outfile:
+                outfile.write("item { id: 1 name: 'car' }")
+            trainval_file = os.path.join(temp_dir, "trainval.txt")
+            with open(trainval_file, "w") as outfile:
+                outfile.write("a\nmissing\n")
+
+            with self.assertRaises(ValueError):
+                validate_dataset.validate_dataset(
+                    annotation_dir, image_dir, label_map_file, trainval_file, output_dir, workers=1
+                )
+
+            with open(os.path.join(output_dir, "report.json")) as infile:
+                report = json.load(infile)
+            self.assertEqual(report["valid_examples"], 0)
+            self.assertEqual(
+                report["rejections"],
+                [
+                    {"example": "missing", "reasons": ["missing_annotation"]},
+                    {"example": "a", "reasons": ["missing_image"]},
+                ],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,7 +13,6 @@ from airflow.operators.python_operator import PythonOperator, BranchPythonOperat
 from airflow.contrib.sensors.file_sensor import FileSensor
 from airflow.operators.slack_operator import SlackAPIPostOperator
 from airflow.models import Variable
-from airflow.hooks.base_hook import BaseHook
 
 from extract_img_from_ros_bag import extract_img_from_ros_bag
 from utils import file_ops
@@ -30,7 +29,6 @@ HOST_DIR_IMAGE_FOLDER = HOST_ROOT_FOLDER + BASE_DATA_FOLDER + "images"
 BAG_EXTENSION = ".bag"
 TOPICS = ["/provider_vision/Front_GigE/compressed", "/provider_vision/Bottom_GigE/compressed"]
 
-slack_webhook_token = BaseHook.get_connection("slack").password
 
 
 default_args = {
@@ -0,0 +1,173 @@
+"""
+Catalog of the tensorflow model zoo models.
+
+The model zoo markdown page is only downloaded and parsed again when it changed since the
+last refresh (ETag / Last-Modified conditional request). The catalog is persisted as compact
+JSON and loaded once per process into a dict keyed by model name. The parsing and HTTP
+dependencies are only imported by the refresh, the DAG file imports this module.
+"""
+
+import functools
+import json
+import logging
+import os
+import re
+from collections import namedtuple
+
+CATALOG_VERSION = 1
+MODEL_ZOO_DOWNLOAD_URL = "http://download.tensorflow.org/models/object_detection/"
+REQUEST_TIMEOUT = 60
+
+Model = namedtuple(
+    "Model",
+    ["model_name", "model_release_date", "model_folder_name", "model_file_name", "model_url"],
+)
+
+
+def __parse_model_zoo_markdown(markdown):
+    """__parse_model_zoo_markdown
+
+    :param markdown: Model zoo markdown page
+    :type markdown: str
+    :return: Model fields, without the name, by model name. The first link of a model is kept
+    :rtype: dict
+    """
+    import mistune
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(mistune.markdown(markdown), "html.parser")
+
+    models = {}
+    for link in soup.find_all("a"):
+        model_url = link.attrs.get("href", "")
+        if MODEL_ZOO_DOWNLOAD_URL not in model_url:
+            continue
+
+        model_name = link.text.replace("☆", "").strip()
+        model_file_name = model_url.split("/")[-1]
+        model_folder_name = os.path.splitext(os.path.splitext(model_file_name)[0])[0]
+        release_date_match = re.search(r"\d{4}_\d{2}_\d{2}", model_file_name)
+        model_release_date = release_date_match.group() if release_date_match else None
+
+        models.setdefault(
+            model_name, [model_release_date, model_folder_name, model_file_name, model_url]
+        )
+
+    return models
+
+
+def __read_catalog_file(catalog_file):
+    try:
+        with open(catalog_file) as infile:
+            catalog = json.load(infile)
+    except (IOError, ValueError):
+        return None
+    return catalog if catalog.get("version") == CATALOG_VERSION else None
+
+
+def refresh_catalog(url, catalog_file, timeout=REQUEST_TIMEOUT):
+    """refresh_catalog
+
+    Download and parse the model zoo page if it changed since the catalog was saved
+
+    :param url: Model zoo markdown page url
+    :type url: str
+    :param catalog_file: Catalog JSON file path
+    :type catalog_file: str
+    :param timeout: Request timeout in seconds
+    :type timeout: float, optional
+    :raises requests.exceptions.RequestException: The page could not be downloaded and
+        there is no saved catalog
+    :return: The catalog was updated
+    :rtype: bool
+    """
+    import requests
+
+    catalog = __read_catalog_file(catalog_file)
+
+    headers = {}
+    if catalog is not None and catalog["url"] == url:
+        if catalog["etag"]:
+            headers["If-None-Match"] = catalog["etag"]
+        if catalog["last_modified"]:
+            headers["If-Modified-Since"] = catalog["last_modified"]
+
+    try:
+        response = requests.get(url, headers=headers, allow_redirects=True, timeout=timeout)
+        response.raise_for_status()
+    except requests.exceptions.RequestException:
+        if catalog is None:
+            raise
+        logging.exception(f"Could not refresh the model catalog from {url}, keeping {catalog_file}")
+        return False
+
+    if response.status_code == 304:
+        logging.info(f"Model zoo page {url} did not change, keeping {catalog_file}")
+        return False
+
+    catalog = {
+        "version": CATALOG_VERSION,
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "models": __parse_model_zoo_markdown(response.text),
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(catalog_file)), exist_ok=True)
+    temp_file = f"{catalog_file}.tmp"
+    with open(temp_file, "w") as outfile:
+        json.dump(catalog, outfile, separators=(",", ":"))
+    os.replace(temp_file, catalog_file)
+
+    logging.info(f"Saved {len(catalog['models'])} models of {url} to {catalog_file}")
+
+    return True
+
+
+@functools.lru_cache(maxsize=4)
+def __load_catalog(catalog_file, modification_time):
+    catalog = __read_catalog_file(catalog_file)
+    if catalog is None:
+        raise ValueError(f"{catalog_file} is not a valid model catalog, refresh it first")
+
+    return {
+        model_name: Model(model_name, *model_fields)
+        for model_name, model_fields in catalog["models"].items()
+    }
+
+
+def load_catalog(catalog_file):
+    """load_catalog
+
+    Load the catalog, read once per process until the file changes
+
+    :param catalog_file: Catalog JSON file path
+    :type catalog_file: str
+    :raises ValueError: The catalog file is missing or not valid
+    :return: Models by name
+    :rtype: dict
+    """
+    try:
+        modification_time = os.stat(catalog_file).st_mtime_ns
+    except FileNotFoundError:
+        raise ValueError(f"{catalog_file} does not exist, refresh the model catalog first")
+
+    return __load_catalog(catalog_file, modification_time)
+
+
+def get_model(catalog_file, model_name):
+    """get_model
+
+    :param catalog_file: Catalog JSON file path
+    :type catalog_file: str
+    :param model_name: Model name, as written in the model zoo page
+    :type model_name: str
+    :raises ValueError: The model is not in the catalog
+    :return: The model
+    :rtype: Model
+    """
+    model = load_catalog(catalog_file).get(model_name)
+    if model is None:
+        raise ValueError(f"Model {model_name} does not exist in the tensorflow model zoo")
+
+    return model
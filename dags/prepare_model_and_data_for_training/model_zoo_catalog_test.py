@@ -0,0 +1,148 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import requests
+
+from prepare_model_and_data_for_training import model_zoo_catalog
+
+# Module level, private names are not mangled here
+parse_model_zoo_markdown = model_zoo_catalog.__parse_model_zoo_markdown
+
+DOWNLOAD_URL = model_zoo_catalog.MODEL_ZOO_DOWNLOAD_URL
+MARKDOWN = f"""| Model name | Speed (ms) |
+| --- | --- |
+| [ssd_mobilenet_v1_coco]({DOWNLOAD_URL}ssd_mobilenet_v1_coco_2018_01_28.tar.gz) | 30 |
+| [ssd_mobilenet_v1_coco]({DOWNLOAD_URL}ssd_mobilenet_v1_coco_2017_11_17.tar.gz) | 30 |
+| [faster_rcnn_nas ☆]({DOWNLOAD_URL}faster_rcnn_nas_coco.tar.gz) | 1833 |
+
+See the [detection API](https://github.com/tensorflow/models) for the other models.
+"""
+ETAG = '"model-zoo-v1"'
+LAST_MODIFIED = "Mon, 06 Jan 2020 00:00:00 GMT"
+
+
+class ModelZooRequestHandler(BaseHTTPRequestHandler):
+    status = 200
+    request_headers = []
+
+    def do_GET(self):
+        self.request_headers.append(dict(self.headers))
+        if self.status != 200:
+            self.send_response(self.status)
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        content = MARKDOWN.encode("utf8")
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.send_header("Content-Type", "text/markdown; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class ParseModelZooMarkdownTest(unittest.TestCase):
+    def test_first_link_wins(self):
+        self.assertEqual(
+            parse_model_zoo_markdown(MARKDOWN),
+            {
+                "ssd_mobilenet_v1_coco": [
+                    "2018_01_28",
+                    "ssd_mobilenet_v1_coco_2018_01_28",
+                    "ssd_mobilenet_v1_coco_2018_01_28.tar.gz",
+                    f"{DOWNLOAD_URL}ssd_mobilenet_v1_coco_2018_01_28.tar.gz",
+                ],
+                "faster_rcnn_nas": [
+                    None,
+                    "faster_rcnn_nas_coco",
+                    "faster_rcnn_nas_coco.tar.gz",
+                    f"{DOWNLOAD_URL}faster_rcnn_nas_coco.tar.gz",
+                ],
+            },
+        )
+
+
+class RefreshCatalogTest(unittest.TestCase):
+    def setUp(self):
+        ModelZooRequestHandler.status = 200
+        ModelZooRequestHandler.request_headers = []
+        self.server = HTTPServer(("127.0.0.1", 0), ModelZooRequestHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/detection_model_zoo.md"
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.catalog_file = os.path.join(self.temp_dir.name, "catalog", "models.json")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def read_catalog(self):
+        with open(self.catalog_file) as infile:
+            return json.load(infile)
+
+    def test_not_modified_page_keeps_the_catalog(self):
+        self.assertTrue(model_zoo_catalog.refresh_catalog(self.url, self.catalog_file))
+        catalog = self.read_catalog()
+        self.assertEqual(catalog["etag"], ETAG)
+        self.assertEqual(catalog["last_modified"], LAST_MODIFIED)
+        self.assertEqual(
+            model_zoo_catalog.get_model(self.catalog_file, "faster_rcnn_nas").model_folder_name,
+            "faster_rcnn_nas_coco",
+        )
+
+        self.assertFalse(model_zoo_catalog.refresh_catalog(self.url, self.catalog_file))
+
+        first_headers, second_headers = ModelZooRequestHandler.request_headers
+        self.assertNotIn("If-None-Match", first_headers)
+        self.assertEqual(second_headers["If-None-Match"], ETAG)
+        self.assertEqual(second_headers["If-Modified-Since"], LAST_MODIFIED)
+        self.assertEqual(self.read_catalog(), catalog)
+
+    def test_request_failure_keeps_the_catalog(self):
+        ModelZooRequestHandler.status = 500
+        with self.assertRaises(requests.exceptions.RequestException):
+            model_zoo_catalog.refresh_catalog(self.url, self.catalog_file)
+        self.assertFalse(os.path.exists(self.catalog_file))
+
+        ModelZooRequestHandler.status = 200
+        model_zoo_catalog.refresh_catalog(self.url, self.catalog_file)
+        catalog = self.read_catalog()
+
+        ModelZooRequestHandler.status = 500
+        with self.assertLogs(level="ERROR"):
+            self.assertFalse(model_zoo_catalog.refresh_catalog(self.url, self.catalog_file))
+        self.assertEqual(self.read_catalog(), catalog)
+
+    def test_other_url_or_version_is_refreshed(self):
+        model_zoo_catalog.refresh_catalog(self.url, self.catalog_file)
+        catalog = self.read_catalog()
+
+        for outdated_catalog in [
+            {**catalog, "url": f"{self.url}?branch=master", "models": {}},
+            {**catalog, "version": model_zoo_catalog.CATALOG_VERSION - 1, "models": {}},
+        ]:
+            with self.subTest(catalog=outdated_catalog):
+                with open(self.catalog_file, "w") as outfile:
+                    json.dump(outdated_catalog, outfile)
+
+                self.assertTrue(model_zoo_catalog.refresh_catalog(self.url, self.catalog_file))
+
+                self.assertNotIn("If-None-Match", ModelZooRequestHandler.request_headers[-1])
+                self.assertEqual(self.read_catalog(), catalog)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Rendering and validation of the training pipeline.config files.
+
+The model config templates saved in the Airflow variables hold placeholders (NUM_CLASSES,
+LABEL_MAP_PATH, ...). A template is split on the placeholders once, with a single compiled
+regex, then every config is rendered by joining its parts with the placeholder values. A
+rendered config is rejected when it still holds a placeholder or when it can not be parsed
+as an object detection TrainEvalPipelineConfig, before anything is sent to training.
+"""
+
+import functools
+import re
+
+PLACEHOLDERS = [
+    "NUM_CLASSES",
+    "PRE_TRAINED_MODEL_CHECKPOINT_PATH",
+    "LABEL_MAP_PATH",
+    "TRAIN_TF_RECORD_PATH",
+    "VAL_TF_RECORD_PATH",
+    "TRAINING_BATCH_SIZE",
+    "TRAINING_EPOCH_COUNT",
+]
+
+
+def compile_placeholder_regex(placeholders):
+    """compile_placeholder_regex
+
+    :param placeholders: Placeholder names
+    :type placeholders: list
+    :return: Regex matching the placeholders, longest first so that a placeholder is never
+        matched by one of its prefixes. The group keeps the placeholders in the parts
+        returned by split
+    :rtype: re.Pattern
+    """
+    return re.compile(
+        "({})".format("|".join(map(re.escape, sorted(placeholders, key=len, reverse=True))))
+    )
+
+
+PLACEHOLDER_REGEX = compile_placeholder_regex(PLACEHOLDERS)
+# Unknown placeholders left in quoted strings and templates which were not rendered by Airflow
+LEFTOVER_PLACEHOLDER_REGEX = re.compile(r"\"[A-Z][A-Z0-9]*(?:_[A-Z0-9]+)+\"|\{\{.*?\}\}|\{%.*?%\}")
+
+
+@functools.lru_cache(maxsize=64)
+def compile_template(template):
+    """compile_template
+
+    :param template: Model config template
+    :type template: str
+    :return: Literal parts of the template, with the placeholders at the odd indexes
+    :rtype: tuple
+    """
+    return tuple(PLACEHOLDER_REGEX.split(template))
+
+
+def render_config(template, values):
+    """render_config
+
+    :param template: Model config template
+    :type template: str
+    :param values: Value of every placeholder used by the template
+    :type values: dict
+    :raises KeyError: A placeholder of the template has no value
+    :return: Rendered config
+    :rtype: str
+    """
+    parts = list(compile_template(template))
+    for index in range(1, len(parts), 2):
+        parts[index] = str(values[parts[index]])
+    return "".join(parts)
+
+
+def get_leftover_placeholders(config):
+    """get_leftover_placeholders
+
+    :param config: Rendered config
+    :type config: str
+    :return: Quoted UPPER_SNAKE strings and Jinja templates left in the config
+    :rtype: list
+    """
+    return [match.group() for match in LEFTOVER_PLACEHOLDER_REGEX.finditer(config)]
+
+
+def get_config_errors(config):
+    """get_config_errors
+
+    :param config: Rendered config
+    :type config: str
+    :return: Leftover placeholders and protobuf parsing errors, empty if the config is valid
+    :rtype: list
+    """
+    from google.protobuf import text_format
+    from object_detection.protos import pipeline_pb2
+
+    errors = [f"Leftover placeholder {leftover}" for leftover in get_leftover_placeholders(config)]
+
+    try:
+        text_format.Merge(config, pipeline_pb2.TrainEvalPipelineConfig())
+    except text_format.ParseError as error:
+        errors.append(f"Invalid TrainEvalPipelineConfig: {error}")
+
+    return errors
@@ -0,0 +1,78 @@
+import importlib.util
+import unittest
+
+from prepare_model_and_data_for_training import pipeline_config
+
+TEMPLATE = """model { ssd { num_classes: NUM_CLASSES } }
+train_config {
+  batch_size: TRAINING_BATCH_SIZE
+  num_steps: TRAINING_EPOCH_COUNT
+  fine_tune_checkpoint: "PRE_TRAINED_MODEL_CHECKPOINT_PATH/model.ckpt"
+}
+train_input_reader {
+  label_map_path: "LABEL_MAP_PATH"
+  tf_record_input_reader { input_path: "TRAIN_TF_RECORD_PATH" }
+}
+"""
+VALUES = {
+    "NUM_CLASSES": 3,
+    "TRAINING_BATCH_SIZE": 24,
+    "TRAINING_EPOCH_COUNT": 2000,
+    "PRE_TRAINED_MODEL_CHECKPOINT_PATH": "gs://bucket/model/base",
+    "LABEL_MAP_PATH": "gs://bucket/data/labelmap.pbtxt",
+    "TRAIN_TF_RECORD_PATH": "gs://bucket/data/train/*.record",
+}
+
+
+class PipelineConfigTest(unittest.TestCase):
+    def test_longest_placeholder_first(self):
+        regex = pipeline_config.compile_placeholder_regex(["PATH", "LABEL_MAP", "LABEL_MAP_PATH"])
+
+        self.assertEqual(
+            regex.split("LABEL_MAP_PATH: LABEL_MAP/PATH"),
+            ["", "LABEL_MAP_PATH", ": ", "LABEL_MAP", "/", "PATH", ""],
+        )
+
+    def test_render_config(self):
+        config = pipeline_config.render_config(TEMPLATE, VALUES)
+
+        self.assertIn("num_classes: 3 }", config)
+        self.assertIn('fine_tune_checkpoint: "gs://bucket/model/base/model.ckpt"', config)
+        self.assertIn('label_map_path: "gs://bucket/data/labelmap.pbtxt"', config)
+        self.assertEqual(pipeline_config.get_leftover_placeholders(config), [])
+
+    def test_missing_value_raises(self):
+        values = dict(VALUES)
+        del values["LABEL_MAP_PATH"]
+
+        with self.assertRaises(KeyError):
+            pipeline_config.render_config(TEMPLATE, values)
+
+    def test_leftover_placeholders(self):
+        config = pipeline_config.render_config(
+            TEMPLATE.replace("TRAIN_TF_RECORD_PATH", "TEST_TF_RECORD_PATH")
+            + 'eval_input_reader { label_map_path: "{{ var.value.label_map_path }}" }\n'
+            + 'eval_config { metrics_set: "coco_detection_metrics" num_examples: 8 }\n',
+            VALUES,
+        )
+
+        self.assertEqual(
+            pipeline_config.get_leftover_placeholders(config),
+            ['"TEST_TF_RECORD_PATH"', "{{ var.value.label_map_path }}"],
+        )
+
+    @unittest.skipIf(
+        importlib.util.find_spec("object_detection") is None,
+        "The object detection API is not installed",
+    )
+    def test_config_errors(self):
+        self.assertEqual(
+            pipeline_config.get_config_errors(pipeline_config.render_config(TEMPLATE, VALUES)), []
+        )
+        errors = pipeline_config.get_config_errors(TEMPLATE)
+        self.assertIn('Leftover placeholder "LABEL_MAP_PATH"', errors)
+        self.assertTrue(errors[-1].startswith("Invalid TrainEvalPipelineConfig"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,209 +1,150 @@
-import filecmp
 import glob
 import json
 import logging
 import os
-import re
 import shutil
+import subprocess
 import tarfile
+from concurrent.futures import ThreadPoolExecutor
 
-import pandas as pd
-import requests
-
-import mistune
-from bs4 import BeautifulSoup
-from utils import file_ops
+# The DAG file imports this module on every scheduler parse, dependencies which are slow
+# to import (requests, protobuf) are imported in the callables using them
+from prepare_model_and_data_for_training import model_zoo_catalog, pipeline_config
+from utils import file_ops, label_map, repo_queue
 
 logging.getLogger().setLevel(logging.INFO)
 
 
-def __parse_downloaded_model_file_list_response(response):
-    """__parse_downloaded_model_file_list_response
-
-    Utility function which parse model csv file and download
-    model from tensorflow model zoo
-
-    :param response: A request response
-    :type response: request.Response
-    :return: A dataframe that contains model release information
-    :rtype: pandas.Dataframe
-    """
-    html = mistune.markdown(response.text)
-    soup = BeautifulSoup(html)
-    link_nodes = soup.find_all("a")
-
-    data = []
-    for link in link_nodes:
-        if "http://download.tensorflow.org/models/object_detection/" in link.attrs["href"]:
-            model_name = link.text
-            model_name = model_name.replace("☆", "")
-            model_name = model_name.strip()
-
-            model_url = link.attrs["href"]
-            model_file_name = model_url.split("/")[-1]
-            model_folder_name = os.path.splitext(os.path.basename(model_file_name))[0]
-            model_folder_name = os.path.splitext(os.path.basename(model_folder_name))[0]
-            try:
-                model_release_date = re.search(r"\d{4}_\d{2}_\d{2}", model_file_name).group()
-            except:
-                model_release_date = None
-
-            data.append(
-                (model_release_date, model_folder_name, model_file_name, model_url, model_name)
-            )
-
-    logging.info(f"Parsed all model data from the webpage {response.url}")
-
-    return pd.DataFrame(
-        data,
-        columns=[
-            "model_release_date",
-            "model_folder_name",
-            "model_file_name",
-            "model_url",
-            "model_name",
-        ],
-    )
-
-
-def validate_reference_model_list_exist_or_create(
-    base_model_csv, positive_downstream, negative_downstream
+def download_and_extract_base_model(
+    model_catalog_file, base_model_folder, required_base_models=None, workers=4
 ):
-    """validate_reference_model_list_exist_or_create
-
-    A simple function to handle airflow BranchyPythonOperator downstream
-
-    :param base_model_csv: A CSV file which contains models informations
-    :type base_model_csv: CSV file path
-    :param positive_downstream: Positive Downstream task name
-    :type positive_downstream: str
-    :param negative_downstream: Negative Downstream task name
-    :type negative_downstream: str
-    :return: Downstream task name
-    :rtype: str
-    """
-
-    if file_ops.file_exist(base_model_csv):
-        return positive_downstream
-    else:
-        return negative_downstream
-
-
-def download_reference_model_list_as_csv(url, base_model_csv):
-    """download_reference_model_list_as_csv
-
-    A utility function to download all the requested model
-    from tensorflow model zoo
-
-    :param url: Url of the model list
-    :type url: str
-    :param base_model_csv: CSV file path
-    :type base_model_csv: str
-    """
-    try:
-        response = requests.get(url, allow_redirects=True)
-        new_models_reference_df = __parse_downloaded_model_file_list_response(response)
-        new_models_reference_df.to_csv(base_model_csv)
-        logging.info("Model list data saved to csv file")
-    except requests.exceptions.RequestException as e:
-        logging.error(f"An error occurred while downloading the file from {url}")
-
-
-def download_and_extract_base_model(base_model_csv, base_model_folder, required_base_models=None):
     """download_and_extract_base_model
 
-     Utility function which handle model tar file download and extraction
+     Utility function which handle model tar file download and extraction. Missing models
+     are downloaded concurrently and extracted while downloading, interrupted downloads
+     are resumed on the next run
 
-    :param base_model_csv: CSV file path
-    :type base_model_csv: str
+    :param model_catalog_file: Model zoo catalog file path
+    :type model_catalog_file: str
     :param base_model_folder: Base model folder directory
     :type base_model_folder: str
     :param required_base_models: A list of required base model, defaults to None
     :type required_base_models: list, optional
+    :param workers: Number of concurrent downloads, defaults to 4
+    :type workers: int, optional
+    :raises ValueError: A model could not be downloaded
     """
 
-    models_df = pd.read_csv(base_model_csv)
-    models_subset = models_df[["model_folder_name", "model_file_name", "model_url", "model_name"]]
+    catalog = model_zoo_catalog.load_catalog(model_catalog_file)
 
     if required_base_models is not None:
-        models_subset = models_subset[models_df.model_name.isin(required_base_models)]
+        models = [catalog[name] for name in required_base_models if name in catalog]
+    else:
+        models = list(catalog.values())
 
-    models = [tuple(x) for x in models_subset.values]
     subfolders = file_ops.get_subfolders_names_in_directory(base_model_folder)
 
-    for model_folder_name, model_file_name, model_url, model_name in models:
-        if not model_folder_name in subfolders:
-            logging.info(f"Model {model_folder_name} not found ")
-            os.mkdir(os.path.join(base_model_folder, model_folder_name))
-            try:
-                response = requests.get(model_url, stream=True)
-                logging.info(f"Downloading {model_url} .....")
-                if response.status_code == 200:
-                    tar_file = os.path.join(base_model_folder, model_file_name)
-                    with open(tar_file, "wb") as f:
-                        f.write(response.raw.read())
-
-                    logging.info(f"Extracting {tar_file} .....")
-                    shutil.unpack_archive(tar_file, os.path.join(base_model_folder))
-                    os.remove(tar_file)
-            except requests.exceptions.RequestException as e:
-                logging.error(f"An error occurred while downloading the file from {model_url}")
-        else:
-            logging.info("All base models are already present")
+    missing_models = [model for model in models if model.model_folder_name not in subfolders]
+    if not missing_models:
+        logging.info("All base models are already present")
+        return
+
+    from utils import http_download
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                http_download.download_and_extract_tar,
+                model.model_url,
+                os.path.join(base_model_folder, model.model_file_name),
+                base_model_folder,
+            ): model.model_name
+            for model in missing_models
+        }
+
+    failed_models = []
+    for future, model_name in futures.items():
+        try:
+            future.result()
+        # requests exceptions are IOError subclasses
+        except (IOError, tarfile.TarError) as e:
+            logging.error(f"An error occurred while downloading the model {model_name}: {e}")
+            failed_models.append(model_name)
+
+    if failed_models:
+        raise ValueError(f"Base models {failed_models} could not be downloaded")
+
+    logging.info(f"Base models {[model.model_name for model in missing_models]} downloaded")
 
 
 def compare_label_map_file(base_tf_record_folder, video_source):
     """compare_label_map_file
 
-    A utility funcction to compare content of base model csv file
-    and current parsed content from tensorflow model zoo url
+    A utility function to validate that all the labeled projects of a video source have the
+    same label map. The label maps are compared as sets of (id, name) classes, so whitespace
+    and item order do not matter
 
     :param base_tf_record_folder: TF record directory
     :type base_tf_record_folder: str
     :param video_source: Current video source
     :type video_source: str
+    :raises ValueError: A label map does not have the same classes as the first one
     :return: Does match or not
     :rtype: Boolean
     """
 
-    subfolders = file_ops.get_directory_subfolders_subset(base_tf_record_folder, video_source)
-
-    if len(subfolders) > 1:
-        label_maps = []
-        for subfolder in subfolders:
-            label_maps.append(glob.glob(subfolder + "*.pbtxt")[0])
-        reference_label_map = label_maps[0]
-        labelmap_match = True
-        for label_map in label_maps:
-            print(label_map)
-            logging.info(f"Reference File: {reference_label_map}")
-            if filecmp.cmp(label_map, reference_label_map):
-                print(f"[ MATCH ] | LabelMap:{label_map} ")
-            else:
-                print(f"[ FAILED ] | LabelMap:{label_map} ")
-                labelmap_match = False
-
-        return labelmap_match
-    else:
-        logging.warn(f"There were not enough dataset to compare i.g : Less than two")
+    subfolders = sorted(
+        file_ops.get_directory_subfolders_subset(base_tf_record_folder, video_source)
+    )
+
+    label_map_files = []
+    for subfolder in subfolders:
+        subfolder_label_maps = sorted(glob.glob(os.path.join(subfolder, "*.pbtxt")))
+        if subfolder_label_maps:
+            label_map_files.append(subfolder_label_maps[0])
+        else:
+            logging.warning(f"No label map in {subfolder}")
 
+    if len(label_map_files) < 2:
+        logging.warning(f"There were not enough label maps to compare for {video_source}")
+        return True
 
-def validate_requested_model_exist_in_model_zoo_list(base_models_csv, required_base_models):
+    report = label_map.compare_label_maps(label_map_files)
+    logging.info(
+        f"Reference label map: {report['reference']} | sha256: {report['digest']} | "
+        f"{len(label_map_files) - len(report['mismatches'])}/{len(label_map_files)} match"
+    )
+
+    for label_map_file, difference in report["mismatches"].items():
+        logging.error(
+            f"[ FAILED ] | LabelMap: {label_map_file} | missing: {difference['missing']} | "
+            f"extra: {difference['extra']}"
+        )
+
+    if report["mismatches"]:
+        raise ValueError(
+            f"{len(report['mismatches'])} label maps of {video_source} do not match "
+            f"{report['reference']}"
+        )
+
+    return True
+
+
+def validate_requested_model_exist_in_model_zoo_list(model_catalog_file, required_base_models):
     """validate_requested_model_exist_in_model_zoo_list
 
     A utility function to validate if a requested model is currently
     available from tensorflow model zoo
 
-    :param base_models_csv: Model CSV file path
-    :type base_models_csv: str
+    :param model_catalog_file: Model zoo catalog file path
+    :type model_catalog_file: str
     :param required_base_models: A list of required models
     :type required_base_models: list
     :raises ValueError: Required model list is empty error
     :raises ValueError: Required model does not exist in tensorflow model zoo list
     """
 
-    df = pd.read_csv(base_models_csv)
-    available_models = df["model_name"].unique()
+    available_models = model_zoo_catalog.load_catalog(model_catalog_file)
 
     if len(required_base_models) <= 0:
         raise ValueError(
@@ -213,7 +154,7 @@ def validate_requested_model_exist_in_model_zoo_list(base_models_csv, required_b
     for required_model in required_base_models:
         if required_model not in available_models:
             raise ValueError(
-                "Required model {required_model} does not exist in the official tensorflow model zoo"
+                f"Required model {required_model} does not exist in the official tensorflow model zoo"
             )
     logging.info("All required model exist in the official tensorflow model zoo reference list")
 
@@ -247,7 +188,97 @@ def create_training_folder(model_training_folder):
     logging.info("Temporary training folder created")
 
 
-def copy_images_to_output(labelbox_output_folder, output_folder, video_source):
+def __get_data_folder_status(repo_folder, data_folder):
+    """__get_data_folder_status
+
+    :param repo_folder: Git repository directory
+    :type repo_folder: str
+    :param data_folder: Directory in the repository
+    :type data_folder: str
+    :return: Paths of the directory which are neither committed to git nor outputs of a
+        committed .dvc file, .dvc files of the outputs, relative to repo_folder
+    :rtype: tuple
+    """
+    # -z: paths relative to the repository root and never quoted
+    status = subprocess.run(
+        ["git", "status", "--porcelain", "-z", "--ignored", "--", data_folder],
+        cwd=repo_folder,
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    ).stdout
+
+    unrecoverable_paths = []
+    dvc_files = []
+    for entry in filter(None, status.split("\0")):
+        state, path = entry[:2], entry[3:]
+        # Ignored paths are DVC outputs when their .dvc file is committed, i.e. clean
+        dvc_file = path.rstrip("/") + ".dvc"
+        if state == "!!" and os.path.isfile(os.path.join(repo_folder, dvc_file)):
+            dvc_files.append(dvc_file)
+        else:
+            unrecoverable_paths.append(path)
+
+    return unrecoverable_paths, dvc_files
+
+
+def link_dataset_to_model_repo_folder(repo_folder, dataset_repo_folder, model_repo_folder):
+    """link_dataset_to_model_repo_folder
+
+    A utility function to point the model repo data folder to the dataset shared by all
+    the models of a video source, through a relative symlink tracked by git. A data folder
+    staged per model before datasets were shared is removed from git, it must only hold
+    committed files and unmodified DVC outputs
+
+    :param repo_folder: Model repository directory
+    :type repo_folder: str
+    :param dataset_repo_folder: Model repo dataset directory of the video source
+    :type dataset_repo_folder: str
+    :param model_repo_folder: Model repo directory
+    :type model_repo_folder: str
+    :raises ValueError: The data folder holds files which would be lost
+    """
+    model_repo_data_folder = os.path.join(model_repo_folder, "data")
+    dataset_repo_data_folder = os.path.relpath(
+        os.path.join(dataset_repo_folder, "data"), model_repo_folder
+    )
+
+    with repo_queue.repo_lock(repo_folder):
+        if os.path.islink(model_repo_data_folder):
+            os.remove(model_repo_data_folder)
+        elif os.path.isdir(model_repo_data_folder):
+            unrecoverable_paths, dvc_files = __get_data_folder_status(
+                repo_folder, os.path.relpath(model_repo_data_folder, repo_folder)
+            )
+            if unrecoverable_paths:
+                raise ValueError(
+                    f"{model_repo_data_folder} holds files which are not committed to git or"
+                    f" DVC, commit or move them: {unrecoverable_paths}"
+                )
+            # dvc status -q exits with 1 when outputs differ from their .dvc file
+            if dvc_files and subprocess.run(
+                ["dvc", "status", "-q"] + dvc_files, cwd=repo_folder
+            ).returncode:
+                raise ValueError(
+                    f"{model_repo_data_folder} holds DVC outputs modified since their .dvc"
+                    f" file was committed, commit or move them: {dvc_files}"
+                )
+
+            # The outputs stay in the DVC cache and remote, their .dvc files in git history
+            repo_queue.run_commands(
+                ["git rm -r -q --ignore-unmatch data", "rm -rf data"], model_repo_folder
+            )
+
+        os.symlink(dataset_repo_data_folder, model_repo_data_folder)
+
+    logging.info(
+        f"Model repo data folder {model_repo_data_folder} linked to {dataset_repo_data_folder}"
+    )
+
+
+def copy_images_to_output(
+    labelbox_output_folder, output_folder, video_source, methods=file_ops.STAGING_METHODS
+):
     """copy_images_to_output
 
     A utility function to copy images from multiple labelbox output project
@@ -259,6 +290,8 @@ def copy_images_to_output(labelbox_output_folder, output_folder, video_source):
     :type output_folder: str
     :param video_source: Current video source
     :type video_source: str
+    :param methods: Staging methods allowed, see file_ops.stage_file
+    :type methods: list
     """
     filtered_subfolders = file_ops.get_directory_subfolders_subset(
         labelbox_output_folder, video_source
@@ -272,7 +305,7 @@ def copy_images_to_output(labelbox_output_folder, output_folder, video_source):
         ]
 
         folder = subfolders[0]
-        file_ops.copy_files_from_folder(folder, output_folder)
+        file_ops.copy_files_from_folder(folder, output_folder, methods=methods)
 
 
 def copy_labelbox_output_images_to_training_folder(
@@ -312,7 +345,10 @@ def copy_labelbox_output_images_to_model_repo_folder(
     """
     file_ops.folder_exist_or_create(model_repo_images_folder)
 
-    copy_images_to_output(labelbox_output_folder, model_repo_images_folder, video_source)
+    # Never hardlinked into the DVC managed repo
+    copy_images_to_output(
+        labelbox_output_folder, model_repo_images_folder, video_source, file_ops.REPO_STAGING_METHODS
+    )
 
     logging.info("Images copied to model repo image folder")
 
@@ -333,17 +369,26 @@ def copy_labelbox_output_annotations_to_model_repo_folder(
     """
     file_ops.folder_exist_or_create(model_repo_annotations_folder)
 
-    copy_images_to_output(labelbox_output_folder, model_repo_annotations_folder, video_source)
+    # Never hardlinked into the DVC managed repo
+    copy_images_to_output(
+        labelbox_output_folder, model_repo_annotations_folder, video_source, file_ops.REPO_STAGING_METHODS
+    )
 
     logging.info("Annotations copied to model repo annotations folder")
 
 
 def copy_tf_records_to_training_folder(
-    tf_records_folder, model_training_tf_records_folder, video_source,
+    tf_records_folder,
+    model_training_tf_records_folder,
+    video_source,
+    num_train_shards=10,
+    num_val_shards=2,
+    workers=None,
 ):
     """copy_tf_records_to_training_folder
 
-    A utility function to copy tf records to training folder
+    A utility function to merge the tf records of every project of a video source
+    into evenly sized and interleaved shards in the training folder
 
     :param tf_records_folder: TF record directory path
     :type tf_records_folder: str
@@ -351,7 +396,15 @@ def copy_tf_records_to_training_folder(
     :type model_training_tf_records_folder: str
     :param video_source: Current Video Source
     :type video_source: str
+    :param num_train_shards: Number of train shards, defaults to 10
+    :type num_train_shards: int, optional
+    :param num_val_shards: Number of val shards, defaults to 2
+    :type num_val_shards: int, optional
+    :param workers: Number of processes writing the shards, defaults to the cpu count
+    :type workers: int, optional
     """
+    from utils import tf_record
+
     training_tf_records_train_folder = f"{model_training_tf_records_folder}/train"
     training_tf_records_val_folder = f"{model_training_tf_records_folder}/val"
 
@@ -365,16 +418,19 @@ def copy_tf_records_to_training_folder(
     tf_record_val_files = []
     for subfolder in subfolders:
         labelmap_files.extend(glob.glob(subfolder + "/*.pbtxt"))
-        tf_record_train_files.extend(glob.glob(subfolder + "/*_train.record"))
-        tf_record_val_files.extend(glob.glob(subfolder + "/*_val.record"))
-
-    for tf_record in tf_record_train_files:
-        shutil.copy2(tf_record, training_tf_records_train_folder)
-        logging.info(f"Copied {tf_record} to {training_tf_records_train_folder}")
-
-    for tf_record in tf_record_val_files:
-        shutil.copy2(tf_record, training_tf_records_val_folder)
-        logging.info(f"Copied {tf_record} to {training_tf_records_val_folder}")
+        tf_record_train_files.extend(glob.glob(subfolder + "/*_train*.record"))
+        tf_record_val_files.extend(glob.glob(subfolder + "/*_val*.record"))
+
+    for input_files, output_folder, name, num_shards in [
+        (tf_record_train_files, training_tf_records_train_folder, "train", num_train_shards),
+        (tf_record_val_files, training_tf_records_val_folder, "val", num_val_shards),
+    ]:
+        tf_record.merge_tf_records(
+            input_files, output_folder, f"{video_source}_{name}", num_shards, workers
+        )
+        logging.info(
+            f"Merged {len(input_files)} tf records into {num_shards} shards in {output_folder}"
+        )
 
     labelmap_file = f"{model_training_tf_records_folder}/labelmap.pbtxt"
     with open(labelmap_file, "w") as outfile:
@@ -383,7 +439,7 @@ def copy_tf_records_to_training_folder(
                 outfile.write(line)
         logging.info(f"Copied {labelmap_file} to {model_training_tf_records_folder}")
 
-    logging.info("Completed copy of all tf records file to temporary training tf records folder")
+    logging.info("Completed merge of all tf records file to temporary training tf records folder")
 
 
 def copy_tf_records_to_model_repo(tf_records_folder, model_repo_tf_records_folder, video_source):
@@ -413,16 +469,18 @@ def copy_tf_records_to_model_repo(tf_records_folder, model_repo_tf_records_folde
     for subfolder in subfolders:
         labelmap_files.extend(glob.glob(subfolder + "/*.pbtxt"))
         trainval_files.extend(glob.glob(subfolder + "/*.txt"))
-        tf_record_train_files.extend(glob.glob(subfolder + "/*_train.record"))
-        tf_record_val_files.extend(glob.glob(subfolder + "/*_val.record"))
-
-    for tf_record in tf_record_train_files:
-        shutil.copy2(tf_record, model_repo_tf_record_train_folder)
-        logging.info(f"Copied {tf_record} to {model_repo_tf_record_train_folder}")
-
-    for tf_record in tf_record_val_files:
-        shutil.copy2(tf_record, model_repo_tf_records_val_folder)
-        logging.info(f"Copied {tf_record} to {model_repo_tf_records_val_folder}")
+        tf_record_train_files.extend(glob.glob(subfolder + "/*_train*.record"))
+        tf_record_val_files.extend(glob.glob(subfolder + "/*_val*.record"))
+
+    # Never hardlinked into the DVC managed repo
+    file_ops.stage_files(
+        tf_record_train_files,
+        model_repo_tf_record_train_folder,
+        methods=file_ops.REPO_STAGING_METHODS,
+    )
+    file_ops.stage_files(
+        tf_record_val_files, model_repo_tf_records_val_folder, methods=file_ops.REPO_STAGING_METHODS
+    )
 
     labelmap_file = f"{model_repo_tf_records_folder}/labelmap.pbtxt"
     with open(labelmap_file, "w") as outfile:
@@ -442,7 +500,7 @@ def copy_tf_records_to_model_repo(tf_records_folder, model_repo_tf_records_folde
 
 
 def copy_base_model_to_training_folder(
-    base_model, base_model_csv, base_model_folder, model_training_base_model_folder
+    base_model, model_catalog_file, base_model_folder, model_training_base_model_folder
 ):
     """copy_base_model_to_training_folder
 
@@ -450,18 +508,16 @@ def copy_base_model_to_training_folder(
 
     :param base_model: Base model name
     :type base_model: str
-    :param base_model_csv: Base model CSV file path
-    :type base_model_csv: str
+    :param model_catalog_file: Model zoo catalog file path
+    :type model_catalog_file: str
     :param base_model_folder: Base model download directory
     :type base_model_folder: str
     :param model_training_base_model_folder: Base model training directory
     :type model_training_base_model_folder: str
     """
-    base_models_df = pd.read_csv(base_model_csv)
-
-    model_df = base_models_df.loc[base_models_df["model_name"] == base_model]
-
-    base_model_folder_name = model_df.iloc[0]["model_folder_name"]
+    base_model_folder_name = model_zoo_catalog.get_model(
+        model_catalog_file, base_model
+    ).model_folder_name
 
     model_folder = os.path.join(base_model_folder, base_model_folder_name)
 
@@ -479,7 +535,7 @@ def copy_base_model_to_training_folder(
 
 
 def copy_base_model_to_model_repo_folder(
-    base_model, base_model_csv, base_model_folder, model_repo_base_model_folder
+    base_model, model_catalog_file, base_model_folder, model_repo_base_model_folder
 ):
     """copy_base_model_to_model_repo_folder
 
@@ -487,24 +543,25 @@ def copy_base_model_to_model_repo_folder(
 
     :param base_model: Base model name
     :type base_model: str
-    :param base_model_csv: Base model CSV file path
-    :type base_model_csv: str
+    :param model_catalog_file: Model zoo catalog file path
+    :type model_catalog_file: str
     :param base_model_folder: Base model download directory
     :type base_model_folder: str
     :param model_repo_base_model_folder: Model repo base model directory
     :type model_repo_base_model_folder: str
     """
-    base_models_df = pd.read_csv(base_model_csv)
-
-    model_df = base_models_df.loc[base_models_df["model_name"] == base_model]
-
-    base_model_folder_name = model_df.iloc[0]["model_folder_name"]
+    base_model_folder_name = model_zoo_catalog.get_model(
+        model_catalog_file, base_model
+    ).model_folder_name
 
     model_folder = os.path.join(base_model_folder, base_model_folder_name)
 
     file_ops.folder_exist_or_create(model_repo_base_model_folder)
 
-    file_ops.copy_files_from_folder(model_folder, model_repo_base_model_folder)
+    # Never hardlinked into the DVC managed repo
+    file_ops.copy_files_from_folder(
+        model_folder, model_repo_base_model_folder, methods=file_ops.REPO_STAGING_METHODS
+    )
 
     pipeline_file = os.path.join(model_repo_base_model_folder, "pipeline.config")
 
@@ -515,30 +572,22 @@ def copy_base_model_to_model_repo_folder(
     )
 
 
-def generate_model_config(
-    model_training_folder,
-    model_repo_folder,
+def get_model_config_values(
     model_folder_ts,
-    model_config_template,
+    dataset_folder_ts,
     num_classes,
     bucket_url,
     training_batch_size,
     training_epoch_count,
 ):
-    """generate_model_config
-
-    A utility function to fill in value of the template model config file
-    saved into airflow variables
+    """get_model_config_values
 
+    A utility function to get the value of every placeholder of a model config template
 
-    :param model_training_folder: Model training folder directory
-    :type model_training_folder: str
-    :param model_repo_folder: Model repo directory
-    :type model_repo_folder: str
     :param model_folder_ts: Model folder name with timestamp
     :type model_folder_ts: str
-    :param model_config_template: Model config template
-    :type model_config_template: str
+    :param dataset_folder_ts: Dataset folder name with timestamp, shared by the video source models
+    :type dataset_folder_ts: str
     :param num_classes: Number of class in the current model
     :type num_classes: str
     :param bucket_url: GCP bucket url
@@ -547,46 +596,74 @@ def generate_model_config(
     :type training_batch_size: str
     :param training_epoch_count: Training epoch count
     :type training_epoch_count: str
-    :raises error: IOError on writing file on disk
+    :return: Values by placeholder
+    :rtype: dict
+    """
+    return {
+        "NUM_CLASSES": num_classes,
+        "PRE_TRAINED_MODEL_CHECKPOINT_PATH": f"{bucket_url}/{model_folder_ts}/model/base/model.ckpt",
+        "LABEL_MAP_PATH": f"{bucket_url}/{dataset_folder_ts}/data/tf_records/labelmap.pbtxt",
+        "TRAIN_TF_RECORD_PATH": f"{bucket_url}/{dataset_folder_ts}/data/tf_records/train/*.record",
+        "VAL_TF_RECORD_PATH": f"{bucket_url}/{dataset_folder_ts}/data/tf_records/val/*.record",
+        "TRAINING_BATCH_SIZE": training_batch_size,
+        "TRAINING_EPOCH_COUNT": training_epoch_count,
+    }
+
+
+def generate_model_configs(model_configs, bucket_url):
+    """generate_model_configs
+
+    A utility function to fill in the template model configs saved into airflow variables
+    for every model. All the configs are rendered and validated before any file is written,
+    a single invalid config fails the task
+
+    :param model_configs: One dictionary per model with the model_config_template,
+        num_classes, training_batch_size, training_epoch_count, model_folder_ts,
+        dataset_folder_ts and the pipeline_config_files to write
+    :type model_configs: list
+    :param bucket_url: GCP bucket url
+    :type bucket_url: str
+    :raises ValueError: A rendered config still holds placeholders or is not valid
+    :raises IOError: A config could not be written to disk
     """
 
-    pre_trained_model_checkpoint_path = f"{bucket_url}/{model_folder_ts}/model/base/model.ckpt"
-    label_map_path = f"{bucket_url}/{model_folder_ts}/data/tf_records/labelmap.pbtxt"
-    train_tf_record_path = f"{bucket_url}/{model_folder_ts}/data/tf_records/train/*.record"
-    val_tf_record_path = f"{bucket_url}/{model_folder_ts}/data/tf_records/val/*.record"
-
-    pipeline_config_files = [
-        f"{model_training_folder}/pipeline.config",
-        f"{model_repo_folder}/pipeline.config",
-    ]
-
-    model_config_template = re.sub("NUM_CLASSES", str(num_classes), model_config_template)
-    model_config_template = re.sub(
-        "PRE_TRAINED_MODEL_CHECKPOINT_PATH",
-        pre_trained_model_checkpoint_path,
-        model_config_template,
-    )
-    model_config_template = re.sub("LABEL_MAP_PATH", label_map_path, model_config_template)
-    model_config_template = re.sub(
-        "TRAIN_TF_RECORD_PATH", train_tf_record_path, model_config_template
-    )
-    model_config_template = re.sub("VAL_TF_RECORD_PATH", val_tf_record_path, model_config_template)
-    model_config_template = re.sub(
-        "TRAINING_BATCH_SIZE", str(training_batch_size), model_config_template
-    )
-    model_config_template = re.sub(
-        "TRAINING_EPOCH_COUNT", str(training_epoch_count), model_config_template
-    )
+    rendered_configs = []
+    errors = []
+    for model_config in model_configs:
+        values = get_model_config_values(
+            model_config["model_folder_ts"],
+            model_config["dataset_folder_ts"],
+            model_config["num_classes"],
+            bucket_url,
+            model_config["training_batch_size"],
+            model_config["training_epoch_count"],
+        )
 
-    for config_file in pipeline_config_files:
         try:
-            with open(config_file, "w") as outfile:
-                outfile.write(model_config_template)
+            config = pipeline_config.render_config(model_config["model_config_template"], values)
+        except KeyError as error:
+            errors.append(f"{model_config['model_folder_ts']}: No value for placeholder {error}")
+            continue
+
+        errors.extend(
+            f"{model_config['model_folder_ts']}: {error}"
+            for error in pipeline_config.get_config_errors(config)
+        )
+        rendered_configs.append((config, model_config["pipeline_config_files"]))
+
+    if errors:
+        raise ValueError("Invalid model configs:\n" + "\n".join(errors))
+
+    for config, pipeline_config_files in rendered_configs:
+        for config_file in pipeline_config_files:
+            try:
+                with open(config_file, "w") as outfile:
+                    outfile.write(config)
+            except IOError:
+                logging.error(
+                    "An error has been raised while trying to save the model config to a file on disk"
+                )
+                raise
             logging.info(f"Model config file has been created successfully at {config_file}")
-        except IOError as error:
-            logging.error(
-                "An error has been raised while trying to save the model config to a file on disk"
-            )
-            raise e
 
-    logging.info("Generated training pipeline config file")
+    logging.info(f"Generated {len(rendered_configs)} training pipeline config files")
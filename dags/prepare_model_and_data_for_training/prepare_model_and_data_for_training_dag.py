@@ -2,25 +2,43 @@ import os
 from datetime import datetime
 
 from airflow import DAG
-from airflow.hooks.base_hook import BaseHook
-from airflow.models import Variable
 from airflow.operators.dummy_operator import DummyOperator
 from airflow.operators.bash_operator import BashOperator
-from airflow.operators.python_operator import BranchPythonOperator, PythonOperator
+from airflow.operators.python_operator import PythonOperator
 
-from prepare_model_and_data_for_training import prepare_model_and_data_for_training
-from utils import file_ops, slack
+from prepare_model_and_data_for_training import model_zoo_catalog, prepare_model_and_data_for_training
+from utils import airflow_config, file_ops, repo_queue, slack, task_checkpoint, tf_record_verifier
 
 AIRFLOW_ROOT_FOLDER = "/usr/local/airflow/"
 DATA_FOLDER = os.path.join(AIRFLOW_ROOT_FOLDER, "data")
 MODELS_FOLDER = os.path.join(DATA_FOLDER, "models", "base")
-MODELS_CSV_FILE = os.path.join(DATA_FOLDER, "models", "model_list.csv")
+MODELS_CATALOG_FILE = os.path.join(DATA_FOLDER, "models", "model_catalog.json")
 TRAINING_FOLDER = os.path.join(DATA_FOLDER, "training")
 LABELBOX_FOLDER = os.path.join(DATA_FOLDER, "labelbox")
 LABELBOX_OUTPUT_FOLDER = os.path.join(LABELBOX_FOLDER, "output")
 TF_RECORD_FOLDER = os.path.join(DATA_FOLDER, "tfrecord")
 DVC_FOLDER = os.path.join(DATA_FOLDER, "dvc")
 MODEL_REPO_FOLDER = os.path.join(DVC_FOLDER, "deep-detector-model")
+MODEL_REPO_DATASETS_FOLDER = os.path.join(MODEL_REPO_FOLDER, "datasets")
+# Outside of the model repo but on the same file system so that DVC links files instead of copying
+DVC_CACHE_FOLDER = os.path.join(DVC_FOLDER, "cache")
+DVC_CACHE_TYPE = "reflink,hardlink,symlink"
+DVC_PUSH_JOBS = 32
+# Completion markers of the staging and tracking tasks, see task_checkpoint
+CHECKPOINT_FOLDER = os.path.join(DATA_FOLDER, "checkpoints", "prepare_model_and_data_for_training")
+
+TRAINING_TF_RECORD_TRAIN_SHARD_COUNT = 10
+TRAINING_TF_RECORD_VAL_SHARD_COUNT = 2
+BASE_MODEL_DOWNLOAD_WORKERS = 4
+
+# Tracked by DVC as directories, relative to the dataset and model folders of the model repo
+DATASET_DVC_PATHS = [
+    "data/images",
+    "data/annotations/xmls",
+    "data/tf_records/train",
+    "data/tf_records/val",
+]
+MODEL_DVC_PATHS = ["model/base"]
 
 default_args = {
     "owner": "airflow",
@@ -35,30 +53,64 @@ default_args = {
 
 
 # Variables
-tensorflow_model_zoo_markdown_url = Variable.get("tensorflow_model_zoo_markdown_url")
-required_base_models = Variable.get("tensorflow_model_zoo_models").split(",")
-video_feed_sources = Variable.get("video_feed_sources").split(",")
+required_base_models = airflow_config.get_variable("tensorflow_model_zoo_models").split(",")
+video_feed_sources = airflow_config.get_variable("video_feed_sources").split(",")
 
-gcp_base_bucket_url = f"gs://{Variable.get('bucket_name')}-training"
-gcp_base_dvc_bucket_url = f"gs://{Variable.get('bucket_name')}-dvc/"
+gcp_base_bucket_url = f"gs://{airflow_config.get_variable('bucket_name')}-training"
+gcp_base_dvc_bucket_url = f"gs://{airflow_config.get_variable('bucket_name')}-dvc/"
 
-model_repo_dvc_remote_name = BaseHook.get_connection("model_repo_dvc").host
-model_repo_git_remote_url = BaseHook.get_connection("model_repo_git").host
+model_repo_dvc_remote_name = airflow_config.get_connection("model_repo_dvc").host
+model_repo_git_remote_url = airflow_config.get_connection("model_repo_git").host
 
 
 upload_tasks = []
 
 
 # DAG Specific Methods
+# The model config variables are only used in templated fields, resolved when the tasks run
 def get_proper_model_config(video_source, model_name):
     model_config_variable = f"model_config_{video_source}_{model_name}"
-    return Variable.get(model_config_variable)
+    return airflow_config.get_variable_template(model_config_variable)
 
 
 def get_object_class_count(video_source):
     onthology_name = f"ontology_{video_source}"
-    onthology = Variable.get(onthology_name, deserialize_json=True)
-    return len(onthology["tools"])
+    return f"{{{{ var.json['{onthology_name}'].tools | length }}}}"
+
+
+def get_dvc_tracking_commands(dvc_paths, git_paths, commit_message):
+    # One dvc add hashes all the directories, files unchanged since the last run are
+    # skipped through the DVC state database. .dvc files left inside them by the per
+    # file tracking of previous runs would overlap with the directory outputs
+    dvc_paths = " ".join(dvc_paths)
+    return [
+        f"find {dvc_paths} -name '*.dvc' -delete",
+        f"dvc add {dvc_paths}",
+        f"git add -A {' '.join(git_paths)}",
+        f"git diff --cached --quiet || git commit -m '{commit_message}'",
+    ]
+
+
+def get_model_repo_sparse_folders(video_sources, base_models):
+    # Relative to the model repo, see the dataset and model folders of the tasks below
+    datasets_folder = os.path.relpath(MODEL_REPO_DATASETS_FOLDER, MODEL_REPO_FOLDER)
+
+    sparse_folders = [".dvc"]
+    for video_source in video_sources:
+        sparse_folders.append(f"{datasets_folder}/{video_source}")
+        sparse_folders.extend(f"{video_source}_{base_model}" for base_model in base_models)
+
+    return sparse_folders
+
+
+def get_checkpoint_kwargs(task_id, inputs, outputs=()):
+    # The task is skipped when its inputs, arguments and outputs did not change since it
+    # last succeeded, retries and new runs do not copy or track the same files again
+    return {
+        "checkpoint_file": os.path.join(CHECKPOINT_FOLDER, f"{task_id}.json"),
+        "checkpoint_inputs": list(inputs),
+        "checkpoint_outputs": list(outputs),
+    }
 
 
 dag = DAG(
@@ -70,68 +122,71 @@ dag = DAG(
 
 start_task = DummyOperator(task_id="start_task", dag=dag)
 join_task_1 = DummyOperator(task_id="join_task_1", dag=dag)
-join_task_2 = DummyOperator(task_id="join_task_2", dag=dag)
 join_task_3 = DummyOperator(task_id="join_task_3", dag=dag)
-join_task_4 = DummyOperator(task_id="join_task_4", dag=dag)
-join_task_5 = DummyOperator(task_id="join_task_5", dag=dag)
 
-validate_reference_model_list_exist_or_create = BranchPythonOperator(
-    task_id="validate_reference_model_list_exist",
-    python_callable=prepare_model_and_data_for_training.validate_reference_model_list_exist_or_create,
+# Conditional request, the model zoo page is only parsed again when it changed
+refresh_model_zoo_catalog = PythonOperator(
+    task_id="refresh_model_zoo_catalog",
+    python_callable=model_zoo_catalog.refresh_catalog,
     op_kwargs={
-        "base_model_csv": MODELS_CSV_FILE,
-        "positive_downstream": "validate_base_model_exist_or_download",
-        "negative_downstream": "download_reference_model_list_as_csv",
+        "url": airflow_config.get_variable_template("tensorflow_model_zoo_markdown_url"),
+        "catalog_file": MODELS_CATALOG_FILE,
     },
     dag=dag,
 )
 
-download_reference_model_list_as_csv = PythonOperator(
-    task_id="download_reference_model_list_as_csv",
-    python_callable=prepare_model_and_data_for_training.download_reference_model_list_as_csv,
-    op_kwargs={"url": tensorflow_model_zoo_markdown_url, "base_model_csv": MODELS_CSV_FILE},
-    dag=dag,
-)
-
 
 validate_base_model_exist_or_download = PythonOperator(
     task_id="validate_base_model_exist_or_download",
     python_callable=prepare_model_and_data_for_training.download_and_extract_base_model,
     op_kwargs={
-        "base_model_csv": MODELS_CSV_FILE,
+        "model_catalog_file": MODELS_CATALOG_FILE,
         "base_model_folder": MODELS_FOLDER,
         "required_base_models": required_base_models,
+        "workers": BASE_MODEL_DOWNLOAD_WORKERS,
     },
-    trigger_rule="none_failed",
     dag=dag,
 )
 
 validate_requested_model_exist_in_model_zoo_list = PythonOperator(
     task_id="validate_requested_model_exist_in_model_zoo_list",
     python_callable=prepare_model_and_data_for_training.validate_requested_model_exist_in_model_zoo_list,
-    op_kwargs={"base_models_csv": MODELS_CSV_FILE, "required_base_models": required_base_models,},
+    op_kwargs={
+        "model_catalog_file": MODELS_CATALOG_FILE,
+        "required_base_models": required_base_models,
+    },
     dag=dag,
 )
 
-validate_deep_detector_model_repo_exist_or_clone = BashOperator(
+# Shallow clone with only the DVC config and the folders of the trained video sources and
+# models checked out, the other models of the repo are not downloaded
+validate_deep_detector_model_repo_exist_or_clone = PythonOperator(
     task_id="validate_deep_detector_model_repo_exist_or_clone",
-    bash_command="[ -d '{{params.model_repo_folder}}' ] || git clone -v {{params.model_repo_url}} {{params.model_repo_folder}}",
-    params={"model_repo_folder": MODEL_REPO_FOLDER, "model_repo_url": model_repo_git_remote_url,},
-    provide_context=True,
+    python_callable=repo_queue.clone_or_update_sparse,
+    op_kwargs={
+        "repo_url": model_repo_git_remote_url,
+        "repo_folder": MODEL_REPO_FOLDER,
+        "sparse_folders": get_model_repo_sparse_folders(video_feed_sources, required_base_models),
+    },
     dag=dag,
 )
 
-validate_deep_detector_dvc_remote_credential_present_or_add = BashOperator(
+# The cache settings are local to this machine. Linked cache files are protected (read only)
+# since they share their inode with the staged workspace files
+validate_deep_detector_dvc_remote_credential_present_or_add = PythonOperator(
     task_id="validate_deep_detector_dvc_remote_credential_present_or_add",
-    bash_command="\
-        [ -s '{{params.model_repo_folder}}/.dvc/config' ] || cd {{params.model_repo_folder}} && \
-        dvc init && \
-        dvc remote add {{params.model_repo_dvc_remote_name}} {{params.dvc_remote_url}} --default && \
-        cat {{params.model_repo_folder}}/.dvc/config",
-    params={
-        "model_repo_folder": MODEL_REPO_FOLDER,
-        "model_repo_dvc_remote_name": model_repo_dvc_remote_name,
-        "dvc_remote_url": gcp_base_dvc_bucket_url,
+    python_callable=repo_queue.run_repo_commands,
+    op_kwargs={
+        "repo_folder": MODEL_REPO_FOLDER,
+        "commands": [
+            f"[ -s .dvc/config ] || (dvc init && dvc remote add {model_repo_dvc_remote_name} {gcp_base_dvc_bucket_url} --default)",
+            f"mkdir -p {DVC_CACHE_FOLDER}",
+            f"[ ! -d .dvc/cache ] || (cp -rl .dvc/cache/. {DVC_CACHE_FOLDER} && rm -rf .dvc/cache)",
+            f"dvc config --local cache.dir {DVC_CACHE_FOLDER}",
+            f"dvc config --local cache.type {DVC_CACHE_TYPE}",
+            "dvc config --local cache.protected true",
+            "cat .dvc/config .dvc/config.local",
+        ],
     },
     dag=dag,
 )
@@ -156,49 +211,225 @@ create_dvc_data_bucket = BashOperator(
 
 
 # This task is declared before since it will be added after dynamic tasks
-upload_data_to_dvc_repo_and_git = BashOperator(
+upload_data_to_dvc_repo_and_git = PythonOperator(
     task_id=f"upload_data_to_dvc_repo_and_git",
-    bash_command="cd {{params.model_repo_folder}} && \
-                          git push && \
-                          dvc push",
-    params={"model_repo_folder": MODEL_REPO_FOLDER},
+    python_callable=repo_queue.run_repo_commands,
+    op_kwargs={
+        "repo_folder": MODEL_REPO_FOLDER,
+        # dvc status -q exits with 1 when the remote is missing some cache files
+        "commands": ["git push", f"dvc status -c -q || dvc push -j {DVC_PUSH_JOBS}"],
+    },
     dag=dag,
 )
 
 
-# Add sleep duration list to delay task (dvc lock file)
-sleeps = [item * 20 for item in range(1, len(video_feed_sources) * len(required_base_models))]
+# This task is declared before since it will be added after dynamic tasks. Every model
+# config is rendered and validated in this single task, the configs are templated fields
+model_configs = []
+generate_model_configs = PythonOperator(
+    task_id="generate_model_configs",
+    python_callable=prepare_model_and_data_for_training.generate_model_configs,
+    op_kwargs={"model_configs": model_configs, "bucket_url": gcp_base_bucket_url},
+    dag=dag,
+)
+
+# git and DVC operations on the model repo are serialized by repo_queue, they run in the
+# order the repo lock is released instead of being delayed to avoid the DVC lock file
+execution_date = "{{ts_nodash}}"
+
+for video_source in video_feed_sources:
+    # The dataset of a video source is staged once and shared by all its models: the
+    # training folder holds it in {source}_dataset_{ts} and the model repo in datasets/{source}
+    dataset_folder = f"{video_source}_dataset"
+    dataset_folder_with_ts = f"{dataset_folder}_{execution_date}"
+
+    dataset_training_folder = f"{TRAINING_FOLDER}/{dataset_folder_with_ts}"
+    dataset_training_images_folder = f"{dataset_training_folder}/data/images"
+    dataset_training_tf_records_folder = f"{dataset_training_folder}/data/tf_records"
+
+    dataset_repo_folder = f"{MODEL_REPO_DATASETS_FOLDER}/{video_source}"
+    dataset_repo_images_folder = f"{dataset_repo_folder}/data/images"
+    dataset_repo_annotations_folder = f"{dataset_repo_folder}/data/annotations/xmls"
+    dataset_repo_tf_records_folder = f"{dataset_repo_folder}/data/tf_records"
+    dataset_repo_dvc_paths = [f"{dataset_repo_folder}/{path}" for path in DATASET_DVC_PATHS]
+
+    labelbox_output_inputs = [f"{LABELBOX_OUTPUT_FOLDER}/{video_source}*"]
+    # Only the staged files, the example cache and validation folders of the tf record
+    # folders hold one file per example and their cache entries are touched by every run
+    tf_record_inputs = [
+        f"{TF_RECORD_FOLDER}/{video_source}*/*.{extension}"
+        for extension in ["record", "pbtxt", "txt"]
+    ]
 
-for idx1, video_source in enumerate(video_feed_sources):
     validate_labelmap_file_content_are_the_same = PythonOperator(
         task_id=f"check_labelmap_file_content_are_the_same_" + video_source,
         python_callable=prepare_model_and_data_for_training.compare_label_map_file,
         op_kwargs={"base_tf_record_folder": TF_RECORD_FOLDER, "video_source": video_source},
         dag=dag,
     )
-    for idx2, base_model in enumerate(required_base_models):
 
-        sleep_duration = sleeps[idx1 + idx2]
-        execution_date = "{{ts_nodash}}"
+    create_dataset_training_folder = PythonOperator(
+        task_id=f"create_dataset_training_folder_{video_source}",
+        python_callable=prepare_model_and_data_for_training.create_training_folder,
+        op_kwargs={"model_training_folder": dataset_training_folder},
+        dag=dag,
+    )
+
+    copy_labelbox_output_images_to_training_folder = PythonOperator(
+        task_id=f"copy_labelbox_output_images_to_training_folder_{video_source}",
+        python_callable=task_checkpoint.checkpointed(
+            prepare_model_and_data_for_training.copy_labelbox_output_images_to_training_folder
+        ),
+        op_kwargs={
+            **get_checkpoint_kwargs(
+                f"copy_labelbox_output_images_to_training_folder_{video_source}",
+                labelbox_output_inputs,
+                [dataset_training_images_folder],
+            ),
+            "labelbox_output_folder": LABELBOX_OUTPUT_FOLDER,
+            "model_training_images_folder": dataset_training_images_folder,
+            "video_source": video_source,
+        },
+        dag=dag,
+    )
+
+    copy_labelbox_output_images_to_model_repo_folder = PythonOperator(
+        task_id=f"copy_labelbox_output_images_to_model_repo_folder_{video_source}",
+        python_callable=task_checkpoint.checkpointed(
+            prepare_model_and_data_for_training.copy_labelbox_output_images_to_model_repo_folder
+        ),
+        op_kwargs={
+            **get_checkpoint_kwargs(
+                f"copy_labelbox_output_images_to_model_repo_folder_{video_source}",
+                labelbox_output_inputs,
+                [dataset_repo_images_folder],
+            ),
+            "labelbox_output_folder": LABELBOX_OUTPUT_FOLDER,
+            "model_repo_images_folder": dataset_repo_images_folder,
+            "video_source": video_source,
+        },
+        dag=dag,
+    )
+
+    copy_labelbox_output_annotations_to_model_repo_folder = PythonOperator(
+        task_id=f"copy_labelbox_output_annotations_to_model_repo_folder_{video_source}",
+        python_callable=task_checkpoint.checkpointed(
+            prepare_model_and_data_for_training.copy_labelbox_output_annotations_to_model_repo_folder
+        ),
+        op_kwargs={
+            **get_checkpoint_kwargs(
+                f"copy_labelbox_output_annotations_to_model_repo_folder_{video_source}",
+                labelbox_output_inputs,
+                [dataset_repo_annotations_folder],
+            ),
+            "labelbox_output_folder": LABELBOX_OUTPUT_FOLDER,
+            "model_repo_annotations_folder": dataset_repo_annotations_folder,
+            "video_source": video_source,
+        },
+        dag=dag,
+    )
+
+    copy_tf_records_to_training_folder = PythonOperator(
+        task_id=f"copy_tf_records_to_training_folder_{video_source}",
+        python_callable=task_checkpoint.checkpointed(
+            prepare_model_and_data_for_training.copy_tf_records_to_training_folder
+        ),
+        op_kwargs={
+            **get_checkpoint_kwargs(
+                f"copy_tf_records_to_training_folder_{video_source}",
+                tf_record_inputs,
+                [dataset_training_tf_records_folder],
+            ),
+            "tf_records_folder": TF_RECORD_FOLDER,
+            "model_training_tf_records_folder": dataset_training_tf_records_folder,
+            "video_source": video_source,
+            "num_train_shards": TRAINING_TF_RECORD_TRAIN_SHARD_COUNT,
+            "num_val_shards": TRAINING_TF_RECORD_VAL_SHARD_COUNT,
+        },
+        dag=dag,
+    )
+
+    verify_tf_records_in_training_folder = PythonOperator(
+        task_id=f"verify_tf_records_in_training_folder_{video_source}",
+        python_callable=tf_record_verifier.verify_tf_records,
+        op_kwargs={
+            "record_folder": dataset_training_tf_records_folder,
+            "record_pattern": "*/*.record",
+        },
+        dag=dag,
+    )
+
+    copy_tf_records_to_model_repo_folder = PythonOperator(
+        task_id=f"copy_tf_records_to_model_repo_folder_{video_source}",
+        python_callable=task_checkpoint.checkpointed(
+            prepare_model_and_data_for_training.copy_tf_records_to_model_repo
+        ),
+        op_kwargs={
+            **get_checkpoint_kwargs(
+                f"copy_tf_records_to_model_repo_folder_{video_source}",
+                tf_record_inputs,
+                [dataset_repo_tf_records_folder],
+            ),
+            "tf_records_folder": TF_RECORD_FOLDER,
+            "model_repo_tf_records_folder": dataset_repo_tf_records_folder,
+            "video_source": video_source,
+        },
+        dag=dag,
+    )
+
+    add_dataset_to_repo_through_dvc = PythonOperator(
+        task_id=f"add_dataset_to_repo_through_dvc_{video_source}",
+        python_callable=task_checkpoint.checkpointed(repo_queue.run_repo_commands),
+        op_kwargs={
+            **get_checkpoint_kwargs(
+                f"add_dataset_to_repo_through_dvc_{video_source}",
+                dataset_repo_dvc_paths,
+                [f"{path}.dvc" for path in dataset_repo_dvc_paths],
+            ),
+            "repo_folder": MODEL_REPO_FOLDER,
+            "working_folder": dataset_repo_folder,
+            "commands": get_dvc_tracking_commands(
+                DATASET_DVC_PATHS, ["data"], f"Add dataset to {dataset_folder}"
+            ),
+        },
+        dag=dag,
+    )
+
+    upload_dataset_folder_to_gcp_bucket = BashOperator(
+        task_id=f"upload_dataset_folder_to_gcp_bucket_{video_source}",
+        bash_command="gsutil -m cp -r {{params.dataset_training_folder}}_{{ts_nodash}}  {{params.bucket_url}}_{{ts_nodash}}",
+        provide_context=True,
+        params={
+            "dataset_training_folder": f"{TRAINING_FOLDER}/{dataset_folder}",
+            "bucket_url": f"{gcp_base_bucket_url}/{dataset_folder}",
+        },
+        dag=dag,
+    )
+
+    validate_requested_model_exist_in_model_zoo_list >> validate_deep_detector_model_repo_exist_or_clone >> validate_deep_detector_dvc_remote_credential_present_or_add >> validate_labelmap_file_content_are_the_same
+
+    validate_labelmap_file_content_are_the_same >> create_dataset_training_folder >> copy_labelbox_output_images_to_training_folder >> copy_labelbox_output_images_to_model_repo_folder >> copy_labelbox_output_annotations_to_model_repo_folder >> copy_tf_records_to_training_folder >> verify_tf_records_in_training_folder >> copy_tf_records_to_model_repo_folder >> add_dataset_to_repo_through_dvc >> join_task_1
+
+    upload_tasks.append(upload_dataset_folder_to_gcp_bucket)
+
+    for base_model in required_base_models:
 
         model_folder = f"{video_source}_{base_model}"
         model_folder_with_ts = f"{model_folder}_{execution_date}"
 
         model_training_folder = f"{TRAINING_FOLDER}/{model_folder_with_ts}"
-        model_training_images_folder = f"{model_training_folder}/data/images"
-        model_training_tf_records_folder = f"{model_training_folder}/data/tf_records"
         model_training_base_model_folder = f"{model_training_folder}/model/base"
 
         model_repo_folder = f"{MODEL_REPO_FOLDER}/{model_folder}"
-        model_repo_images_folder = f"{model_repo_folder}/data/images"
-        model_repo_annotations_folder = f"{model_repo_folder}/data/annotations/xmls"
-        model_repo_tf_records_folder = f"{model_repo_folder}/data/tf_records"
         model_repo_base_model_folder = f"{model_repo_folder}/model/base"
+        model_repo_dvc_paths = [f"{model_repo_folder}/{path}" for path in MODEL_DVC_PATHS]
 
-        model_config_training_epoch_count = Variable.get(
+        base_model_inputs = [MODELS_CATALOG_FILE, MODELS_FOLDER]
+
+        model_config_training_epoch_count = airflow_config.get_variable_template(
             f"model_config_{video_source}_{base_model}_training_epoch_count"
         )
-        model_config_training_batch_size = Variable.get(
+        model_config_training_batch_size = airflow_config.get_variable_template(
             f"model_config_{video_source}_{base_model}_training_batch_size"
         )
 
@@ -216,118 +447,30 @@ for idx1, video_source in enumerate(video_feed_sources):
             dag=dag,
         )
 
-        copy_labelbox_output_images_to_training_folder = PythonOperator(
-            task_id=f"copy_labelbox_output_images_to_training_folder_{video_source}_{base_model}",
-            python_callable=prepare_model_and_data_for_training.copy_labelbox_output_images_to_training_folder,
-            op_kwargs={
-                "labelbox_output_folder": LABELBOX_OUTPUT_FOLDER,
-                "model_training_images_folder": model_training_images_folder,
-                "video_source": video_source,
-            },
-            dag=dag,
-        )
-
-        copy_labelbox_output_images_to_model_repo_folder = PythonOperator(
-            task_id=f"copy_labelbox_output_images_to_model_repo_folder_{video_source}_{base_model}",
-            python_callable=prepare_model_and_data_for_training.copy_labelbox_output_images_to_model_repo_folder,
-            op_kwargs={
-                "labelbox_output_folder": LABELBOX_OUTPUT_FOLDER,
-                "model_repo_images_folder": model_repo_images_folder,
-                "video_source": video_source,
-            },
-            dag=dag,
-        )
-
-        add_images_to_repo_through_dvc = BashOperator(
-            task_id=f"add_images_to_repo_through_dvc_{video_source}_{base_model}",
-            bash_command="sleep {{params.sleep_duration}} && \
-                          cd {{params.model_repo_folder}} && \
-                          dvc add data/images/* && \
-                          git add data/images/.gitignore data/images/*.dvc && \
-                          git commit -m 'Add images to {{params.model_folder}}'",
-            provide_context=True,
-            params={
-                "model_repo_folder": model_repo_folder,
-                "model_folder": model_folder,
-                "sleep_duration": sleep_duration,
-            },
-            dag=dag,
-        )
-
-        copy_labelbox_output_annotations_to_model_repo_folder = PythonOperator(
-            task_id=f"copy_labelbox_output_annotations_to_model_repo_folder_{video_source}_{base_model}",
-            python_callable=prepare_model_and_data_for_training.copy_labelbox_output_annotations_to_model_repo_folder,
-            op_kwargs={
-                "labelbox_output_folder": LABELBOX_OUTPUT_FOLDER,
-                "model_repo_annotations_folder": model_repo_annotations_folder,
-                "video_source": video_source,
-            },
-            dag=dag,
-        )
-
-        add_annotations_to_repo_through_dvc = BashOperator(
-            task_id=f"add_annotations_to_repo_through_dvc_{video_source}_{base_model}",
-            bash_command="sleep {{params.sleep_duration}} && \
-                          cd {{params.model_repo_folder}} && \
-                          dvc add data/annotations/xmls/* && \
-                          git add data/annotations/xmls/.gitignore data/annotations/xmls/*.dvc && \
-                          git commit -m 'Add annotations to {{params.model_folder}}'",
-            provide_context=True,
-            params={
-                "model_repo_folder": model_repo_folder,
-                "model_folder": model_folder,
-                "sleep_duration": sleep_duration,
-            },
-            dag=dag,
-        )
-
-        copy_tf_records_to_training_folder = PythonOperator(
-            task_id=f"copy_tf_records_to_training_folder_{video_source}_{base_model}",
-            python_callable=prepare_model_and_data_for_training.copy_tf_records_to_training_folder,
-            op_kwargs={
-                "tf_records_folder": TF_RECORD_FOLDER,
-                "model_training_tf_records_folder": model_training_tf_records_folder,
-                "video_source": video_source,
-            },
-            dag=dag,
-        )
-
-        copy_tf_records_to_model_repo_folder = PythonOperator(
-            task_id=f"copy_tf_records_to_model_repo_folder_{video_source}_{base_model}",
-            python_callable=prepare_model_and_data_for_training.copy_tf_records_to_model_repo,
+        link_dataset_to_model_repo_folder = PythonOperator(
+            task_id=f"link_dataset_to_model_repo_folder_{video_source}_{base_model}",
+            python_callable=prepare_model_and_data_for_training.link_dataset_to_model_repo_folder,
             op_kwargs={
-                "tf_records_folder": TF_RECORD_FOLDER,
-                "model_repo_tf_records_folder": model_repo_tf_records_folder,
-                "video_source": video_source,
-            },
-            dag=dag,
-        )
-
-        add_tf_records_to_repo_through_dvc = BashOperator(
-            task_id=f"add_tf_records_to_repo_through_dvc_{video_source}_{base_model}",
-            bash_command="sleep {{params.sleep_duration}} && \
-                          cd {{params.model_repo_folder}} && \
-                          dvc add data/tf_records/train/* && \
-                          dvc add data/tf_records/val/* && \
-                          git add data/tf_records/train/.gitignore data/tf_records/train/*.dvc && \
-                          git add data/tf_records/val/.gitignore data/tf_records/val/*.dvc && \
-                          git add data/tf_records/trainval.txt data/tf_records/labelmap.pbtxt &&\
-                          git commit -m 'Add tf-records to {{params.model_folder}}'",
-            provide_context=True,
-            params={
+                "repo_folder": MODEL_REPO_FOLDER,
+                "dataset_repo_folder": dataset_repo_folder,
                 "model_repo_folder": model_repo_folder,
-                "model_folder": model_folder,
-                "sleep_duration": sleep_duration,
             },
             dag=dag,
         )
 
         copy_base_model_to_training_folder = PythonOperator(
             task_id=f"copy_base_model_to_training_folder_{video_source}_{base_model}",
-            python_callable=prepare_model_and_data_for_training.copy_base_model_to_training_folder,
+            python_callable=task_checkpoint.checkpointed(
+                prepare_model_and_data_for_training.copy_base_model_to_training_folder
+            ),
             op_kwargs={
+                **get_checkpoint_kwargs(
+                    f"copy_base_model_to_training_folder_{video_source}_{base_model}",
+                    base_model_inputs,
+                    [model_training_base_model_folder],
+                ),
                 "base_model": base_model,
-                "base_model_csv": MODELS_CSV_FILE,
+                "model_catalog_file": MODELS_CATALOG_FILE,
                 "base_model_folder": MODELS_FOLDER,
                 "model_training_base_model_folder": model_training_base_model_folder,
             },
@@ -336,59 +479,55 @@ for idx1, video_source in enumerate(video_feed_sources):
 
         copy_base_model_to_model_repo_folder = PythonOperator(
             task_id=f"copy_base_model_to_model_repo_folder_{video_source}_{base_model}",
-            python_callable=prepare_model_and_data_for_training.copy_base_model_to_model_repo_folder,
+            python_callable=task_checkpoint.checkpointed(
+                prepare_model_and_data_for_training.copy_base_model_to_model_repo_folder
+            ),
             op_kwargs={
+                **get_checkpoint_kwargs(
+                    f"copy_base_model_to_model_repo_folder_{video_source}_{base_model}",
+                    base_model_inputs,
+                    [model_repo_base_model_folder],
+                ),
                 "base_model": base_model,
-                "base_model_csv": MODELS_CSV_FILE,
+                "model_catalog_file": MODELS_CATALOG_FILE,
                 "base_model_folder": MODELS_FOLDER,
                 "model_repo_base_model_folder": model_repo_base_model_folder,
             },
             dag=dag,
         )
 
-        add_base_model_to_repo_through_dvc = BashOperator(
-            task_id=f"add_base_model_to_repo_through_dvc_{video_source}_{base_model}",
-            bash_command="sleep {{params.sleep_duration}} && \
-                          cd {{params.model_repo_folder}} && \
-                          dvc add model/base/* && \
-                          git add model/base/.gitignore model/base/*.dvc && \
-                          git commit -m 'Add base model file to {{params.model_folder}}'",
-            provide_context=True,
-            params={
-                "model_repo_folder": model_repo_folder,
-                "model_folder": model_folder,
-                "sleep_duration": sleep_duration,
-            },
-            dag=dag,
-        )
-
-        genereate_model_config_file_to_training_and_model_repo = PythonOperator(
-            task_id=f"genereate_model_config_file_to_training_and_model_repo_{video_source}_{base_model}",
-            python_callable=prepare_model_and_data_for_training.generate_model_config,
-            op_kwargs={
-                "model_training_folder": model_training_folder,
-                "model_repo_folder": model_repo_folder,
-                "model_folder_ts": model_folder_with_ts,
+        model_configs.append(
+            {
                 "model_config_template": get_proper_model_config(video_source, base_model),
                 "num_classes": get_object_class_count(video_source),
-                "bucket_url": gcp_base_bucket_url,
                 "training_batch_size": model_config_training_batch_size,
                 "training_epoch_count": model_config_training_epoch_count,
-            },
-            dag=dag,
+                "model_folder_ts": model_folder_with_ts,
+                "dataset_folder_ts": dataset_folder_with_ts,
+                "pipeline_config_files": [
+                    f"{model_training_folder}/pipeline.config",
+                    f"{model_repo_folder}/pipeline.config",
+                ],
+            }
         )
 
-        add_model_config_to_repo_through_git = BashOperator(
-            task_id=f"add_model_config_to_repo_through_git_{video_source}_{base_model}",
-            bash_command="sleep {{params.sleep_duration }} && \
-                          cd {{params.model_repo_folder}} && \
-                          git add pipeline.config  && \
-                          git commit -m 'Add model config to {{params.model_folder}}'",
-            provide_context=True,
-            params={
-                "model_repo_folder": model_repo_folder,
-                "model_folder": model_folder,
-                "sleep_duration": sleep_duration * 1.5,
+        add_model_to_repo_through_dvc = PythonOperator(
+            task_id=f"add_model_to_repo_through_dvc_{video_source}_{base_model}",
+            python_callable=task_checkpoint.checkpointed(repo_queue.run_repo_commands),
+            op_kwargs={
+                **get_checkpoint_kwargs(
+                    f"add_model_to_repo_through_dvc_{video_source}_{base_model}",
+                    model_repo_dvc_paths
+                    + [f"{model_repo_folder}/data", f"{model_repo_folder}/pipeline.config"],
+                    [f"{path}.dvc" for path in model_repo_dvc_paths],
+                ),
+                "repo_folder": MODEL_REPO_FOLDER,
+                "working_folder": model_repo_folder,
+                "commands": get_dvc_tracking_commands(
+                    MODEL_DVC_PATHS,
+                    ["model", "data", "pipeline.config"],
+                    f"Add base model and model config to {model_folder}",
+                ),
             },
             dag=dag,
         )
@@ -403,23 +542,20 @@ for idx1, video_source in enumerate(video_feed_sources):
             dag=dag,
         )
 
-        start_task >> validate_reference_model_list_exist_or_create >> [
-            validate_base_model_exist_or_download,
-            download_reference_model_list_as_csv,
-        ]
-        download_reference_model_list_as_csv >> validate_base_model_exist_or_download >> validate_requested_model_exist_in_model_zoo_list
-        validate_requested_model_exist_in_model_zoo_list >> validate_deep_detector_model_repo_exist_or_clone >> validate_deep_detector_dvc_remote_credential_present_or_add >> validate_labelmap_file_content_are_the_same
+        join_task_1 >> validate_model_presence_in_model_repo_or_create >> create_training_folder >> link_dataset_to_model_repo_folder >> copy_base_model_to_training_folder >> copy_base_model_to_model_repo_folder >> generate_model_configs
 
-        validate_labelmap_file_content_are_the_same >> validate_model_presence_in_model_repo_or_create >> create_training_folder >> copy_labelbox_output_images_to_training_folder >> copy_labelbox_output_images_to_model_repo_folder >> add_images_to_repo_through_dvc >> join_task_1 >> copy_labelbox_output_annotations_to_model_repo_folder >> add_annotations_to_repo_through_dvc >> join_task_2 >> copy_tf_records_to_training_folder >> copy_tf_records_to_model_repo_folder >> add_tf_records_to_repo_through_dvc >> join_task_3 >> copy_base_model_to_training_folder >> copy_base_model_to_model_repo_folder >> add_base_model_to_repo_through_dvc >> join_task_4 >> genereate_model_config_file_to_training_and_model_repo >> add_model_config_to_repo_through_git >> join_task_5
+        generate_model_configs >> add_model_to_repo_through_dvc >> join_task_3
 
         upload_tasks.append(upload_training_folder_to_gcp_bucket)
 
 
+start_task >> refresh_model_zoo_catalog >> validate_base_model_exist_or_download >> validate_requested_model_exist_in_model_zoo_list
+
 # To fix parallelism error with gsutil
-if len(set(upload_tasks)) == len(required_base_models) * 2:
+if len(set(upload_tasks)) == len(video_feed_sources) * (len(required_base_models) + 1):
     for index, task in enumerate(upload_tasks):
         if index == 0:
-            join_task_5 >> create_training_data_bucket >> create_dvc_data_bucket >> task
+            join_task_3 >> create_training_data_bucket >> create_dvc_data_bucket >> task
         else:
             upload_tasks[index - 1] >> task
 
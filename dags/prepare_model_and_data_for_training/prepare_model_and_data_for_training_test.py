@@ -0,0 +1,95 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from prepare_model_and_data_for_training import prepare_model_and_data_for_training
+
+
+def run(command, cwd):
+    return subprocess.run(
+        command, shell=True, cwd=cwd, check=True, stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout
+
+
+class LinkDatasetToModelRepoFolderTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.repo_folder = self.temp_dir.name
+        self.dataset_repo_folder = os.path.join(self.repo_folder, "datasets", "video")
+        self.model_repo_folder = os.path.join(self.repo_folder, "video_model")
+        self.data_folder = os.path.join(self.model_repo_folder, "data")
+
+        os.makedirs(os.path.join(self.dataset_repo_folder, "data"))
+        os.makedirs(os.path.join(self.data_folder, "tf_records"))
+        self.write_file("datasets/video/data/labelmap.pbtxt")
+        self.write_file("video_model/data/tf_records/labelmap.pbtxt")
+        self.commit()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_file(self, path, content="content"):
+        with open(os.path.join(self.repo_folder, path), "w") as outfile:
+            outfile.write(content)
+
+    def commit(self):
+        run(
+            "git init -q && git add -A && (git diff --cached --quiet || "
+            "git -c user.name=test -c user.email=test commit -q -m data)",
+            self.repo_folder,
+        )
+
+    def link(self):
+        prepare_model_and_data_for_training.link_dataset_to_model_repo_folder(
+            self.repo_folder, self.dataset_repo_folder, self.model_repo_folder
+        )
+
+    def test_committed_data_folder_is_replaced(self):
+        self.link()
+
+        self.assertEqual(os.readlink(self.data_folder), "../datasets/video/data")
+        self.assertEqual(
+            run("git status --porcelain", self.repo_folder).split("\n")[0],
+            "D  video_model/data/tf_records/labelmap.pbtxt",
+        )
+
+        # Linking again only replaces the symlink
+        self.link()
+        self.assertEqual(os.readlink(self.data_folder), "../datasets/video/data")
+
+    def test_uncommitted_files_are_never_removed(self):
+        for path, content in [
+            ("video_model/data/tf_records/labelmap.pbtxt", "modified"),
+            ("video_model/data/trainval.txt", "untracked"),
+            ("video_model/data/.gitignore", "/images"),
+            ("video_model/data/images", "ignored, without a .dvc file"),
+        ]:
+            with self.subTest(path=path):
+                self.write_file(path, content)
+
+                with self.assertRaises(ValueError):
+                    self.link()
+
+                self.assertFalse(os.path.islink(self.data_folder))
+                with open(os.path.join(self.repo_folder, path)) as infile:
+                    self.assertEqual(infile.read(), content)
+                self.commit()
+
+    @unittest.skipIf(shutil.which("dvc") is None, "DVC is not installed")
+    def test_dvc_outputs_are_removed(self):
+        self.write_file("video_model/data/images", "image")
+        run("dvc init -q --subdir && dvc add -q data/images", self.model_repo_folder)
+        self.commit()
+
+        self.link()
+
+        self.assertEqual(os.readlink(self.data_folder), "../datasets/video/data")
+        self.assertIn(
+            "D  video_model/data/images.dvc", run("git status --porcelain", self.repo_folder)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
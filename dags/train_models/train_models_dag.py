@@ -5,13 +5,12 @@ from glob import glob
 
 from airflow import DAG
 from airflow.hooks.base_hook import BaseHook
-from airflow.models import Variable
 from airflow.operators.bash_operator import BashOperator
 from airflow.operators.dummy_operator import DummyOperator
 from airflow.operators.python_operator import PythonOperator
 
 from train_models import train_models
-from utils import file_ops, slack
+from utils import airflow_config, file_ops, slack
 
 AIRFLOW_BASE_FOLDER = "/usr/local/airflow/"
 AIRFLOW_DATA_FOLDER = os.path.join(AIRFLOW_BASE_FOLDER, "data")
@@ -21,7 +20,8 @@ TENSORFLOW_OBJECT_DETECTION_RESEARCH_FOLDER = os.environ[
     "TENSORFLOW_OBJECT_DETECTION_RESEARCH_FOLDER"
 ]
 
-GCP_ZONE = Variable.get("gcp_zone")
+# Only used in templated fields, resolved when the tasks run
+GCP_ZONE = airflow_config.get_variable_template("gcp_zone")
 
 default_args = {
     "owner": "airflow",
@@ -35,7 +35,7 @@ default_args = {
 }
 
 
-tpu_supported_models = Variable.get("tpu_training_supported_models").split(",")
+tpu_supported_models = airflow_config.get_variable("tpu_training_supported_models").split(",")
 # distributed_training = Variable.get("distributed_training")
 
 dag = DAG("6-train_model", default_args=default_args, catchup=False, schedule_interval=None)
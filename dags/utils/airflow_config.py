@@ -0,0 +1,125 @@
+"""
+Cached Airflow Variables and Connections for DAG files.
+
+Variable.get and BaseHook.get_connection run one metadata database query per call, and DAG
+files call them at import, on every scheduler parse. Here all the Variables and all the
+Connections are each loaded with a single query and kept for CACHE_TTL seconds in the
+parsing process. Environment variables (AIRFLOW_VAR_*, AIRFLOW_CONN_*) still take
+precedence, like in Airflow.
+
+Airflow 1.10 parses each DAG file in a fresh DAG file processor process, the cache does not
+outlive it: it only dedupes the lookups made while one DAG file is parsed (and those of a
+task process), several queries per file become one.
+
+Values which are only needed by tasks should rather be resolved when the task runs, through
+templates such as "{{ var.value.bucket_name }}" in templated fields.
+"""
+
+import json
+import os
+import time
+
+from airflow.exceptions import AirflowException
+from airflow.models import Connection, Variable
+from airflow.utils.db import provide_session
+
+CACHE_TTL = 30
+VARIABLE_ENV_PREFIX = "AIRFLOW_VAR_"
+CONNECTION_ENV_PREFIX = "AIRFLOW_CONN_"
+
+__cache = {"loaded_at": None, "variables": {}, "connections": {}}
+__missing = object()
+
+
+@provide_session
+def __load(session=None):
+    connections = {}
+    for connection in session.query(Connection).all():
+        # Like BaseHook.get_connection, any connection of a conn_id is used
+        connections.setdefault(connection.conn_id, connection)
+
+    __cache["variables"] = {
+        variable.key: variable.get_val() for variable in session.query(Variable).all()
+    }
+    __cache["connections"] = connections
+    __cache["loaded_at"] = time.monotonic()
+
+
+def __get_cache():
+    if __cache["loaded_at"] is None or time.monotonic() - __cache["loaded_at"] > CACHE_TTL:
+        __load()
+    return __cache
+
+
+def clear_cache():
+    """clear_cache
+
+    Reload the Variables and Connections on the next access
+    """
+    __cache["loaded_at"] = None
+
+
+def get_variable(key, default_var=__missing, deserialize_json=False):
+    """get_variable
+
+    Cached equivalent of Variable.get
+
+    :param key: Variable key
+    :type key: str
+    :param default_var: Value returned when the variable does not exist
+    :type default_var: object, optional
+    :param deserialize_json: Parse the value as JSON, defaults to False
+    :type deserialize_json: bool, optional
+    :raises KeyError: The variable does not exist and there is no default value
+    :return: Variable value
+    :rtype: str or object
+    """
+    value = os.environ.get(VARIABLE_ENV_PREFIX + key.upper())
+    if value is None:
+        value = __get_cache()["variables"].get(key)
+
+    if value is None:
+        if default_var is not __missing:
+            return default_var
+        raise KeyError(f"Variable {key} does not exist")
+
+    return json.loads(value) if deserialize_json else value
+
+
+def get_connection(conn_id):
+    """get_connection
+
+    Cached equivalent of BaseHook.get_connection
+
+    :param conn_id: Connection id
+    :type conn_id: str
+    :raises AirflowException: The connection is not defined
+    :return: The connection
+    :rtype: airflow.models.Connection
+    """
+    uri = os.environ.get(CONNECTION_ENV_PREFIX + conn_id.upper())
+    if uri:
+        return Connection(conn_id=conn_id, uri=uri)
+
+    connection = __get_cache()["connections"].get(conn_id)
+    if connection is None:
+        raise AirflowException(f"The conn_id `{conn_id}` isn't defined")
+
+    return connection
+
+
+def get_variable_template(key, deserialize_json=False):
+    """get_variable_template
+
+    Template of a variable for templated operator fields, resolved when the task runs
+    instead of when the DAG file is parsed
+
+    :param key: Variable key
+    :type key: str
+    :param deserialize_json: Parse the value as JSON, defaults to False
+    :type deserialize_json: bool, optional
+    :return: Jinja template
+    :rtype: str
+    """
+    accessor = "json" if deserialize_json else "value"
+    return f"{{{{ var.{accessor}['{key}'] }}}}"
@@ -0,0 +1,78 @@
+import os
+import time
+import unittest
+from unittest import mock
+
+from airflow.exceptions import AirflowException
+
+import airflow_config
+
+# Module level, private names are not mangled here
+cache = airflow_config.__cache
+
+
+class AirflowConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.variables = {"bucket_name": "db_bucket", "labels": '{"car": 1}'}
+        self.connections = {"labelbox": mock.sentinel.labelbox_connection}
+
+        def load():
+            cache["variables"] = dict(self.variables)
+            cache["connections"] = dict(self.connections)
+            cache["loaded_at"] = time.monotonic()
+
+        patcher = mock.patch.object(airflow_config, "__load", side_effect=load)
+        self.load = patcher.start()
+        self.addCleanup(patcher.stop)
+        airflow_config.clear_cache()
+        self.addCleanup(airflow_config.clear_cache)
+
+    def test_environment_variable_over_database(self):
+        with mock.patch.dict(os.environ, {"AIRFLOW_VAR_BUCKET_NAME": "env_bucket"}):
+            self.assertEqual(airflow_config.get_variable("bucket_name"), "env_bucket")
+
+        self.assertEqual(airflow_config.get_variable("bucket_name"), "db_bucket")
+
+    def test_missing_variable(self):
+        self.assertIsNone(airflow_config.get_variable("missing", default_var=None))
+        self.assertEqual(airflow_config.get_variable("missing", default_var="default"), "default")
+        with self.assertRaises(KeyError):
+            airflow_config.get_variable("missing")
+
+    def test_deserialize_json(self):
+        self.assertEqual(airflow_config.get_variable("labels"), '{"car": 1}')
+        self.assertEqual(airflow_config.get_variable("labels", deserialize_json=True), {"car": 1})
+        with mock.patch.dict(os.environ, {"AIRFLOW_VAR_LABELS": '{"bus": 2}'}):
+            self.assertEqual(
+                airflow_config.get_variable("labels", deserialize_json=True), {"bus": 2}
+            )
+
+    def test_get_connection(self):
+        self.assertIs(airflow_config.get_connection("labelbox"), mock.sentinel.labelbox_connection)
+        with self.assertRaises(AirflowException):
+            airflow_config.get_connection("missing")
+
+        with mock.patch.dict(os.environ, {"AIRFLOW_CONN_LABELBOX": "https://user@labelbox.com"}):
+            self.assertEqual(airflow_config.get_connection("labelbox").host, "labelbox.com")
+
+    def test_loaded_once_per_ttl(self):
+        airflow_config.get_variable("bucket_name")
+        airflow_config.get_variable("labels")
+        airflow_config.get_connection("labelbox")
+        self.assertEqual(self.load.call_count, 1)
+
+        self.variables["bucket_name"] = "new_bucket"
+        self.assertEqual(airflow_config.get_variable("bucket_name"), "db_bucket")
+
+        cache["loaded_at"] -= airflow_config.CACHE_TTL + 1
+        self.assertEqual(airflow_config.get_variable("bucket_name"), "new_bucket")
+        self.assertEqual(self.load.call_count, 2)
+
+        self.variables["bucket_name"] = "cleared_bucket"
+        airflow_config.clear_cache()
+        self.assertEqual(airflow_config.get_variable("bucket_name"), "cleared_bucket")
+        self.assertEqual(self.load.call_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
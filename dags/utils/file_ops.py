@@ -1,12 +1,16 @@
+import base64
+import errno
+import fcntl
 import filecmp
+import hashlib
 import json
 import logging
 import os
 import shutil
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 
-import requests
-
 
 def get_parent_folder_name(dir_path):
     """
@@ -161,19 +165,136 @@ def get_sub_folders_list(dir_path):
 
 def gcs_path_to_local_path(images_path, gcs_path):
     """
-    Convert a Google Cloud Storage link into a local path to get an image
+    Convert a Google Cloud Storage link into a local path to get an image.
+    Both gs://bucket/dataset/image and https://storage.googleapis.com/bucket/images/dataset/image
+    links are supported since only the last two segments are used
     : param image_path: Needed to find the images path within the container
     : param gcs_path: GCS Link to be converted
     : return: Converted local path to the image
     """
-    split = gcs_path.split("/")
+    split = gcs_path.rstrip("/").split("/")
 
-    dataset = split[3]
-    image = split[4]
+    dataset = split[-2]
+    image = split[-1]
 
     return os.path.join(images_path, dataset, image)
 
 
+def get_file_md5(file_path, chunk_size=1024 * 1024):
+    """
+    Compute the base64 encoded MD5 digest of a file, the format used by Google Cloud Storage
+    : param file_path: File path
+    : param chunk_size: Number of bytes read at once
+    : return: Base64 encoded MD5 digest
+    """
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as infile:
+        for chunk in iter(lambda: infile.read(chunk_size), b""):
+            md5.update(chunk)
+
+    return base64.b64encode(md5.digest()).decode("ascii")
+
+
+# linux/fs.h FICLONE ioctl, share the extents of a file on btrfs, xfs and overlayfs on them
+FICLONE = 0x40049409
+STAGING_METHODS = ["reflink", "hardlink", "copy"]
+# Files staged into a DVC managed repo must not be hardlinked: with the cache.type
+# reflink,hardlink,symlink of the repos, the DVC cache, the repo workspace and the staging
+# source could all share one inode, and a write in place to any of them would corrupt the others
+REPO_STAGING_METHODS = ["reflink", "copy"]
+STAGING_WORKERS = 8
+
+# Staging methods which failed for a (source device, destination device) pair
+__unsupported_staging_methods = {}
+
+
+def reflink_file(source_path, dest_path):
+    """
+    Clone a file with the FICLONE ioctl, the clone shares the data of its source until
+    one of them is modified (copy-on-write)
+    : param source_path: Source file path
+    : param dest_path: Destination file path, must not exist
+    : raises OSError: The file system does not support reflinks
+    """
+    with open(source_path, "rb") as infile:
+        try:
+            with open(dest_path, "xb") as outfile:
+                fcntl.ioctl(outfile.fileno(), FICLONE, infile.fileno())
+        except OSError:
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            raise
+    shutil.copystat(source_path, dest_path)
+
+
+def stage_file(source_path, dest_path, methods=STAGING_METHODS):
+    """
+    Make a file available at its destination without duplicating its data when possible:
+    reflink, then hardlink (same file system), then copy. An existing destination is
+    replaced, it is never written through.
+    Hardlinked files share their inode, files staged this way must be replaced
+    (i.e: written to a temporary file then os.replace) and never modified in place, use
+    REPO_STAGING_METHODS for the files staged into a DVC managed repo
+    : param source_path: Source file path
+    : param dest_path: Destination file path
+    : param methods: Staging methods allowed, copy is always allowed
+    : return: The staging method used, one of STAGING_METHODS
+    """
+    if os.path.lexists(dest_path):
+        os.remove(dest_path)
+
+    devices = (os.stat(source_path).st_dev, os.stat(os.path.dirname(dest_path) or ".").st_dev)
+    unsupported_methods = __unsupported_staging_methods.setdefault(devices, set())
+
+    if "reflink" in methods and "reflink" not in unsupported_methods:
+        try:
+            reflink_file(source_path, dest_path)
+            return "reflink"
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL):
+                raise
+            unsupported_methods.add("reflink")
+
+    if "hardlink" in methods and "hardlink" not in unsupported_methods:
+        try:
+            os.link(source_path, dest_path)
+            return "hardlink"
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            if e.errno != errno.EMLINK:
+                unsupported_methods.add("hardlink")
+
+    shutil.copy2(source_path, dest_path)
+    return "copy"
+
+
+def stage_files(source_paths, dest_dir, workers=STAGING_WORKERS, methods=STAGING_METHODS):
+    """
+    Stage files into a folder in parallel, see stage_file
+    : param source_paths: Source file paths
+    : param dest_dir: Destination directory, the file names are kept
+    : param workers: Number of threads
+    : param methods: Staging methods allowed, see stage_file
+    : return: Number of files staged with every method
+    """
+    folder_exist_or_create(dest_dir)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        method_counts = Counter(
+            executor.map(
+                lambda source_path: stage_file(
+                    source_path, os.path.join(dest_dir, os.path.basename(source_path)), methods
+                ),
+                source_paths,
+            )
+        )
+
+    logging.info(f"Staged {len(source_paths)} files into {dest_dir}: {dict(method_counts)}")
+
+    return method_counts
+
+
 def concat_json(json_files, output_path):
     """
     concat multiples json into one
@@ -219,20 +340,20 @@ def get_directory_subfolders_subset(dir_path, filter):
     return parsed_subfolder
 
 
-def copy_xml_files_from_folder(source_dir, dest_dir):
-    # TODO: docs string
+def copy_xml_files_from_folder(source_dir, dest_dir, methods=STAGING_METHODS):
+    """
+    Stage the xml files of a folder into another one, see stage_file
+    """
     files = glob(os.path.join(source_dir, "*.xml"))
-    for file in files:
-        if os.path.isfile(file):
-            shutil.copy2(file, dest_dir)
+    stage_files([file for file in files if os.path.isfile(file)], dest_dir, methods=methods)
 
 
-def copy_files_from_folder(source_dir, dest_dir):
-    # TODO: docs string
+def copy_files_from_folder(source_dir, dest_dir, methods=STAGING_METHODS):
+    """
+    Stage the files of a folder into another one, see stage_file
+    """
     files = glob(os.path.join(source_dir, "*.*"))
-    for file in files:
-        if os.path.isfile(file):
-            shutil.copy2(file, dest_dir)
+    stage_files([file for file in files if os.path.isfile(file)], dest_dir, methods=methods)
 
 
 def clean_up_folder_content(folders):
@@ -1,10 +1,17 @@
+import errno
 import os
+import tempfile
 import unittest
+from unittest import mock
 
 import file_ops
 
 class FileOptsTest(unittest.TestCase):
 
+    def setUp(self):
+        # getattr, the private name would be mangled in the class body
+        getattr(file_ops, "__unsupported_staging_methods").clear()
+
     def test_gcs_path_to_local_path(self):
         test_path = "gs://bucket-name/dataset/image"
         expected_path = "/ROOT_LOCATION/images_folder/dataset/image"
@@ -15,5 +22,89 @@ class FileOptsTest(unittest.TestCase):
 
         self.assertEqual(path, expected_path)
 
+    def test_gcs_https_path_to_local_path(self):
+        test_path = "https://storage.googleapis.com/bucket-name/images/dataset/image"
+        expected_path = "/ROOT_LOCATION/images_folder/dataset/image"
+
+        images_path = "/ROOT_LOCATION/images_folder"
+
+        path = file_ops.gcs_path_to_local_path(images_path, test_path)
+
+        self.assertEqual(path, expected_path)
+
+    def create_source_files(self, source_dir):
+        source_paths = []
+        for name in ["image.jpg", "annotation.xml"]:
+            source_path = os.path.join(source_dir, name)
+            with open(source_path, "w") as outfile:
+                outfile.write(name)
+            source_paths.append(source_path)
+        return source_paths
+
+    def assert_staged(self, source_path, dest_path, method):
+        with open(dest_path) as infile:
+            self.assertEqual(infile.read(), os.path.basename(source_path))
+        source_stat = os.stat(source_path)
+        dest_stat = os.stat(dest_path)
+        if method == "hardlink":
+            self.assertEqual(dest_stat.st_ino, source_stat.st_ino)
+            self.assertEqual(dest_stat.st_nlink, 2)
+        else:
+            # Reflinks and copies get their own inode, a write to one never reaches the other
+            self.assertNotEqual(dest_stat.st_ino, source_stat.st_ino)
+            self.assertEqual(dest_stat.st_nlink, 1)
+
+    def test_stage_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_paths = self.create_source_files(temp_dir)
+            dest_dir = os.path.join(temp_dir, "staged")
+
+            file_ops.stage_files(source_paths, dest_dir)
+            methods = file_ops.stage_files(source_paths, dest_dir)
+
+            self.assertEqual(sum(methods.values()), 2)
+            self.assertEqual(len(methods), 1)
+            self.assertIn(list(methods)[0], file_ops.STAGING_METHODS)
+            for source_path in source_paths:
+                self.assert_staged(
+                    source_path,
+                    os.path.join(dest_dir, os.path.basename(source_path)),
+                    list(methods)[0],
+                )
+
+    def test_stage_file_falls_back_to_hardlink_then_copy(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_path = self.create_source_files(temp_dir)[0]
+            dest_path = os.path.join(temp_dir, "staged.jpg")
+
+            reflink_error = OSError(errno.EOPNOTSUPP, "Operation not supported")
+            with mock.patch.object(file_ops, "reflink_file", side_effect=reflink_error):
+                self.assertEqual(file_ops.stage_file(source_path, dest_path), "hardlink")
+                self.assert_staged(source_path, dest_path, "hardlink")
+
+                self.assertEqual(
+                    file_ops.stage_file(source_path, dest_path, file_ops.REPO_STAGING_METHODS),
+                    "copy",
+                )
+                self.assert_staged(source_path, dest_path, "copy")
+
+    def test_repo_staging_is_never_written_through(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_paths = self.create_source_files(temp_dir)
+            dest_dir = os.path.join(temp_dir, "repo")
+
+            methods = file_ops.stage_files(
+                source_paths, dest_dir, methods=file_ops.REPO_STAGING_METHODS
+            )
+
+            self.assertNotIn("hardlink", methods)
+            for source_path in source_paths:
+                dest_path = os.path.join(dest_dir, os.path.basename(source_path))
+                self.assert_staged(source_path, dest_path, "copy")
+                with open(source_path, "a") as outfile:
+                    outfile.write(" modified")
+                with open(dest_path) as infile:
+                    self.assertEqual(infile.read(), os.path.basename(source_path))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
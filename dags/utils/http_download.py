@@ -0,0 +1,271 @@
+"""
+Streaming HTTP downloads resumed with range requests.
+
+The response is read in chunks and appended to a .part file, so memory use does not depend
+on the file size and an interrupted download continues where it stopped. Tar archives are
+extracted while they are downloaded. The size announced by the server, and optionally a
+known size and sha256, are checked once the whole file went through.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+
+import requests
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+PART_SUFFIX = ".part"
+
+
+class _DownloadStream:
+    """File-like object reading the downloaded part file, then the rest of the response
+
+    Response chunks are appended to the part file before being returned. The size and sha256
+    of everything read are kept to verify the download.
+    """
+
+    def __init__(self, part_path, response, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        self.part_file = open(part_path, "a+b")
+        self.part_file.seek(0)
+        self.chunks = (
+            response.raw.stream(chunk_size, decode_content=False) if response is not None else None
+        )
+        self.buffer = b""
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def __read_chunk(self, size):
+        if self.buffer:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+            return data
+
+        data = self.part_file.read(size)
+        if data or self.chunks is None:
+            return data
+
+        for chunk in self.chunks:
+            if chunk:
+                self.part_file.write(chunk)
+                self.buffer = chunk
+                return self.__read_chunk(size)
+        return b""
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = DOWNLOAD_CHUNK_SIZE
+
+        data = self.__read_chunk(size)
+        self.size += len(data)
+        self.sha256.update(data)
+        return data
+
+    def close(self):
+        self.part_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def __get_total_size(response):
+    content_range = response.headers.get("Content-Range")
+    if content_range is not None:
+        total_size = content_range.rsplit("/", 1)[-1]
+        return int(total_size) if total_size != "*" else None
+
+    content_length = response.headers.get("Content-Length")
+    return int(content_length) if content_length is not None else None
+
+
+def __request_remaining(url, part_path, timeout):
+    """__request_remaining
+
+    Request the part of the file which is not downloaded yet
+
+    :param url: File url
+    :type url: str
+    :param part_path: Part file path
+    :type part_path: str
+    :param timeout: Connect and read timeout in seconds
+    :type timeout: float
+    :return: The streamed response, None if the part file is complete, and the file size
+    :rtype: tuple
+    """
+    downloaded_size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={downloaded_size}-"} if downloaded_size else {}
+
+    response = requests.get(url, headers=headers, stream=True, timeout=timeout)
+
+    if response.status_code == 416:
+        response.close()
+        total_size = __get_total_size(response)
+        if total_size == downloaded_size:
+            return None, total_size
+        # The remote file changed, download it again
+        logging.warning(f"{part_path} does not match {url}, restarting the download")
+        os.remove(part_path)
+        return __request_remaining(url, part_path, timeout)
+
+    response.raise_for_status()
+
+    if response.status_code == 206:
+        logging.info(f"Resuming the download of {url} at {downloaded_size} bytes")
+    else:
+        # No range support or first request, the whole file is sent
+        open(part_path, "wb").close()
+        logging.info(f"Downloading {url}")
+
+    return response, __get_total_size(response)
+
+
+def __verify_download(url, stream, total_size, expected_size, expected_sha256):
+    if total_size is not None and stream.size != total_size:
+        raise IOError(f"Downloaded {stream.size} bytes of {url}, {total_size} were announced")
+    if expected_size is not None and stream.size != expected_size:
+        raise IOError(f"Downloaded {stream.size} bytes of {url}, {expected_size} were expected")
+    if expected_sha256 is not None and stream.sha256.hexdigest() != expected_sha256:
+        raise IOError(f"sha256 of {url} is {stream.sha256.hexdigest()}, {expected_sha256} expected")
+
+
+def __is_safe_member(member):
+    paths = [member.name]
+    if member.issym() or member.islnk():
+        paths.append(os.path.join(os.path.dirname(member.name), member.linkname))
+    return all(
+        not os.path.isabs(path) and not os.path.normpath(path).startswith("..") for path in paths
+    )
+
+
+def download_file(
+    url,
+    output_path,
+    expected_size=None,
+    expected_sha256=None,
+    chunk_size=DOWNLOAD_CHUNK_SIZE,
+    timeout=DOWNLOAD_TIMEOUT,
+):
+    """download_file
+
+    Download a file in chunks, resuming a previous partial download of output_path
+
+    :param url: File url
+    :type url: str
+    :param output_path: Output file path, the partial download is kept next to it
+    :type output_path: str
+    :param expected_size: File size in bytes, defaults to None
+    :type expected_size: int, optional
+    :param expected_sha256: File sha256 hex digest, defaults to None
+    :type expected_sha256: str, optional
+    :param chunk_size: Response chunk size in bytes
+    :type chunk_size: int, optional
+    :param timeout: Connect and read timeout in seconds
+    :type timeout: float, optional
+    :raises IOError: The downloaded file size or checksum is not the expected one
+    :raises requests.exceptions.RequestException: The request failed
+    """
+    part_path = output_path + PART_SUFFIX
+    response, total_size = __request_remaining(url, part_path, timeout)
+
+    try:
+        with _DownloadStream(part_path, response, chunk_size) as stream:
+            while stream.read(chunk_size):
+                pass
+    finally:
+        if response is not None:
+            response.close()
+
+    try:
+        __verify_download(url, stream, total_size, expected_size, expected_sha256)
+    except IOError:
+        os.remove(part_path)
+        raise
+
+    os.replace(part_path, output_path)
+    logging.info(f"Downloaded {url} to {output_path}, {stream.size} bytes")
+
+
+def download_and_extract_tar(
+    url,
+    archive_path,
+    output_folder,
+    expected_size=None,
+    expected_sha256=None,
+    chunk_size=DOWNLOAD_CHUNK_SIZE,
+    timeout=DOWNLOAD_TIMEOUT,
+):
+    """download_and_extract_tar
+
+    Extract a tar archive while it is downloaded. The archive is only kept as a part file to
+    resume an interrupted download, the extracted entries are moved to output_folder once
+    the whole archive is verified.
+
+    :param url: Archive url
+    :type url: str
+    :param archive_path: Archive path, its part file is archive_path + PART_SUFFIX
+    :type archive_path: str
+    :param output_folder: Directory in which the archive is extracted
+    :type output_folder: str
+    :param expected_size: Archive size in bytes, defaults to None
+    :type expected_size: int, optional
+    :param expected_sha256: Archive sha256 hex digest, defaults to None
+    :type expected_sha256: str, optional
+    :param chunk_size: Response chunk size in bytes
+    :type chunk_size: int, optional
+    :param timeout: Connect and read timeout in seconds
+    :type timeout: float, optional
+    :raises IOError: The archive size, checksum or gzip CRC is not the expected one
+    :raises tarfile.TarError: The archive is not valid
+    :raises requests.exceptions.RequestException: The request failed
+    :return: Names of the extracted top level entries
+    :rtype: list
+    """
+    part_path = archive_path + PART_SUFFIX
+    response, total_size = __request_remaining(url, part_path, timeout)
+    extract_folder = tempfile.mkdtemp(prefix=".extracting_", dir=output_folder)
+    is_gzip = archive_path.endswith((".gz", ".tgz"))
+
+    try:
+        with _DownloadStream(part_path, response, chunk_size) as stream:
+            # GzipFile checks the CRC and size of the content once read to the end,
+            # tarfile stream decompression does not
+            archive_stream = gzip.GzipFile(fileobj=stream) if is_gzip else stream
+            with tarfile.open(fileobj=archive_stream, mode="r|*") as archive:
+                for member in archive:
+                    if __is_safe_member(member):
+                        archive.extract(member, extract_folder)
+                    else:
+                        logging.warning(f"Skipped {member.name} of {url}, outside of the archive")
+            # Padding after the end of archive marker
+            while archive_stream.read(chunk_size):
+                pass
+            while stream.read(chunk_size):
+                pass
+
+        __verify_download(url, stream, total_size, expected_size, expected_sha256)
+
+        entry_names = os.listdir(extract_folder)
+        for entry_name in entry_names:
+            output_path = os.path.join(output_folder, entry_name)
+            if os.path.isdir(output_path):
+                shutil.rmtree(output_path)
+            os.replace(os.path.join(extract_folder, entry_name), output_path)
+    except (IOError, tarfile.TarError):
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    finally:
+        if response is not None:
+            response.close()
+        shutil.rmtree(extract_folder)
+
+    os.remove(part_path)
+    logging.info(f"Downloaded and extracted {url} to {output_folder}, {stream.size} bytes")
+
+    return entry_names
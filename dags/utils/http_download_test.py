@@ -0,0 +1,100 @@
+import hashlib
+import io
+import os
+import tarfile
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import http_download
+
+
+def create_archive():
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        data = os.urandom(300000)
+        member = tarfile.TarInfo("model/model.ckpt.data")
+        member.size = len(data)
+        tar.addfile(member, io.BytesIO(data))
+    return archive.getvalue(), data
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    content = b""
+
+    def do_GET(self):
+        start = 0
+        if "Range" in self.headers:
+            start = int(self.headers["Range"].split("=")[1].split("-")[0])
+            if start >= len(self.content):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(self.content)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(self.content) - 1}/{len(self.content)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(self.content) - start))
+        self.end_headers()
+        self.wfile.write(self.content[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.archive, self.data = create_archive()
+        RangeRequestHandler.content = self.archive
+        self.server = HTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/model.tar.gz"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_download_file_resumes_part(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = os.path.join(temp_dir, "model.tar.gz")
+            with open(output_path + http_download.PART_SUFFIX, "wb") as outfile:
+                outfile.write(self.archive[:1000])
+
+            http_download.download_file(
+                self.url, output_path, expected_sha256=hashlib.sha256(self.archive).hexdigest()
+            )
+
+            with open(output_path, "rb") as infile:
+                self.assertEqual(infile.read(), self.archive)
+            self.assertFalse(os.path.exists(output_path + http_download.PART_SUFFIX))
+
+    def test_download_and_extract_tar(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            archive_path = os.path.join(temp_dir, "model.tar.gz")
+            with open(archive_path + http_download.PART_SUFFIX, "wb") as outfile:
+                outfile.write(self.archive[:1000])
+
+            entry_names = http_download.download_and_extract_tar(
+                self.url, archive_path, temp_dir, expected_size=len(self.archive)
+            )
+
+            with open(os.path.join(temp_dir, "model", "model.ckpt.data"), "rb") as infile:
+                self.assertEqual(infile.read(), self.data)
+            self.assertEqual(entry_names, ["model"])
+            self.assertEqual(sorted(os.listdir(temp_dir)), ["model"])
+
+    def test_size_mismatch_raises(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = os.path.join(temp_dir, "model.tar.gz")
+            with self.assertRaises(IOError):
+                http_download.download_file(self.url, output_path, expected_size=1)
+
+            self.assertEqual(os.listdir(temp_dir), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import re
+
+LABEL_MAP_ITEM_REGEX = re.compile(r"item\s*\{(.*?)\}", re.DOTALL)
+LABEL_MAP_ID_REGEX = re.compile(r"\bid\s*:\s*(\d+)")
+LABEL_MAP_NAME_REGEX = re.compile(r"\bname\s*:\s*(['\"])(.*?)\1")
+
+
+def read_label_map(label_map_file):
+    """
+    Parse a label map (.pbtxt) file without requiring tensorflow object detection
+    :param label_map_file: Label map file path
+    :raises ValueError: Error raised when an item does not have an id or a name
+    :return: A list of (id, name) tuples
+    """
+    with open(label_map_file, "r") as infile:
+        content = infile.read()
+
+    items = []
+    for item in LABEL_MAP_ITEM_REGEX.findall(content):
+        id_match = LABEL_MAP_ID_REGEX.search(item)
+        name_match = LABEL_MAP_NAME_REGEX.search(item)
+        if id_match is None or name_match is None:
+            raise ValueError(f"Label map item without id or name in {label_map_file}: {item}")
+        items.append((int(id_match.group(1)), name_match.group(2)))
+
+    return items
+
+
+def get_label_map_dict(label_map_file):
+    """
+    Read a label map and return a dictionary of label names to id
+    :param label_map_file: Label map file path
+    :return: A dictionary mapping label names to id
+    """
+    return {name: label_id for label_id, name in read_label_map(label_map_file)}
+
+
+def read_canonical_label_map(label_map_file):
+    """
+    Read a label map as a set of (id, name) tuples, with its digest. Whitespace, quotes and
+    item order do not change the digest
+    :param label_map_file: Label map file path
+    :return: A (frozenset of (id, name) tuples, sha256 hex digest) tuple
+    """
+    items = frozenset(read_label_map(label_map_file))
+    canonical = json.dumps(sorted(items), separators=(",", ":")).encode("utf8")
+    return items, hashlib.sha256(canonical).hexdigest()
+
+
+def compare_label_maps(label_map_files):
+    """
+    Compare label maps to the first one. Each label map is parsed and digested once, and the
+    classes are only compared for the label maps whose digest differs from the reference
+    :param label_map_files: Label map file paths, the first one is the reference
+    :return: A dictionary with the reference file, its digest and, for every label map which
+        does not match, the classes it is missing and the classes it has in addition
+    """
+    reference_items, reference_digest = read_canonical_label_map(label_map_files[0])
+
+    mismatches = {}
+    for label_map_file in label_map_files[1:]:
+        items, digest = read_canonical_label_map(label_map_file)
+        if digest != reference_digest:
+            mismatches[label_map_file] = {
+                "missing": [
+                    f"{label_id}: {name}" for label_id, name in sorted(reference_items - items)
+                ],
+                "extra": [
+                    f"{label_id}: {name}" for label_id, name in sorted(items - reference_items)
+                ],
+            }
+
+    return {
+        "reference": label_map_files[0],
+        "digest": reference_digest,
+        "mismatches": mismatches,
+    }
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+
+import label_map
+
+
+class LabelMapTest(unittest.TestCase):
+    def write_label_map(self, folder, name, content):
+        label_map_file = os.path.join(folder, name)
+        with open(label_map_file, "w") as outfile:
+            outfile.write(content)
+        return label_map_file
+
+    def test_compare_label_maps(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            reference = self.write_label_map(
+                temp_dir,
+                "a.pbtxt",
+                "item {\n  id: 1\n  name: 'car'\n}\nitem {\n  id: 2\n  name: 'bus'\n}\n",
+            )
+            reordered = self.write_label_map(
+                temp_dir, "b.pbtxt", 'item { name: "bus" id: 2 }\nitem { id: 1 name: "car" }'
+            )
+            different = self.write_label_map(
+                temp_dir, "c.pbtxt", "item { id: 1 name: 'car' }\nitem { id: 3 name: 'truck' }"
+            )
+
+            report = label_map.compare_label_maps([reference, reordered, different])
+
+            self.assertEqual(report["reference"], reference)
+            self.assertEqual(report["digest"], label_map.read_canonical_label_map(reordered)[1])
+            self.assertEqual(
+                report["mismatches"], {different: {"missing": ["2: bus"], "extra": ["3: truck"]}}
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
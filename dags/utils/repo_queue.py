@@ -0,0 +1,241 @@
+"""
+Serialize git and DVC operations on a repository.
+
+git and DVC take repository wide locks and fail instead of waiting when they are held.
+Tasks working in the same repository queue on an exclusive flock of a file in its .git
+folder and run as soon as the previous operation releases it.
+
+Repositories are cloned shallow and sparse (clone_or_update_sparse): only the last commit
+and the folders a DAG works on are downloaded and checked out.
+
+Usable as a PythonOperator callable (run_repo_commands) or from the dags folder:
+    python -m utils.repo_queue --repo_folder=... "dvc add data/images/*" "git commit ..."
+"""
+
+import argparse
+import contextlib
+import fcntl
+import logging
+import os
+import re
+import subprocess
+import time
+
+REPO_LOCK_FILE = "airflow_repo_operation.lock"
+LOCK_POLL_INTERVAL = 1
+# git clone --filter, blobs are then fetched on checkout for the sparse folders only
+PARTIAL_CLONE_GIT_VERSION = (2, 19)
+
+
+def get_repo_lock_path(repo_folder):
+    """get_repo_lock_path
+
+    :param repo_folder: Git repository directory
+    :type repo_folder: str
+    :return: Lock file path, in the .git folder so that it is never tracked
+    :rtype: str
+    """
+    return os.path.join(repo_folder, ".git", REPO_LOCK_FILE)
+
+
+@contextlib.contextmanager
+def repo_lock(repo_folder, timeout=None):
+    """repo_lock
+
+    Hold the repository operation lock, blocking until it is released by other tasks
+
+    :param repo_folder: Git repository directory
+    :type repo_folder: str
+    :param timeout: Seconds to wait for the lock, waits forever if None
+    :type timeout: float, optional
+    :raises TimeoutError: The lock was not acquired in time
+    """
+    lock_path = get_repo_lock_path(repo_folder)
+    start_time = time.monotonic()
+
+    with open(lock_path, "a") as lock_file:
+        if timeout is None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() - start_time > timeout:
+                        raise TimeoutError(f"Could not lock {lock_path} in {timeout} seconds")
+                    time.sleep(LOCK_POLL_INTERVAL)
+
+        logging.info(f"Locked {lock_path} after {time.monotonic() - start_time:.1f} seconds")
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run_repo_commands(repo_folder, commands, working_folder=None, timeout=None):
+    """run_repo_commands
+
+    Run shell commands one after the other while holding the repository operation lock
+
+    :param repo_folder: Git repository directory
+    :type repo_folder: str
+    :param commands: Shell commands, stops at the first failing one
+    :type commands: list
+    :param working_folder: Directory the commands are run from, defaults to repo_folder
+    :type working_folder: str, optional
+    :param timeout: Seconds to wait for the lock, waits forever if None
+    :type timeout: float, optional
+    :raises subprocess.CalledProcessError: A command failed
+    """
+    with repo_lock(repo_folder, timeout):
+        run_commands(commands, working_folder or repo_folder)
+
+
+def run_commands(commands, working_folder):
+    """run_commands
+
+    Run shell commands one after the other, for callers already holding the repository
+    operation lock (see repo_lock)
+
+    :param commands: Shell commands, stops at the first failing one
+    :type commands: list
+    :param working_folder: Directory the commands are run from
+    :type working_folder: str
+    :raises subprocess.CalledProcessError: A command failed
+    """
+    for command in commands:
+        logging.info(f"Running: {command}")
+        result = subprocess.run(
+            command,
+            shell=True,
+            cwd=working_folder,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+        if result.stdout:
+            logging.info(result.stdout)
+        result.check_returncode()
+
+
+def __get_git_output(repo_folder, *args):
+    return subprocess.run(
+        ["git"] + list(args),
+        cwd=repo_folder,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.strip()
+
+
+def __get_git_version():
+    output = subprocess.run(
+        ["git", "--version"], check=True, stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout
+    return tuple(int(number) for number in re.search(r"(\d+)\.(\d+)", output).groups())
+
+
+def get_sparse_checkout_patterns(sparse_folders):
+    """get_sparse_checkout_patterns
+
+    Sparse checkout patterns of the files at the root of the repository and of folders,
+    written like git sparse-checkout cone mode does so that they also work with git < 2.25
+
+    :param sparse_folders: Folder paths relative to the repository root
+    :type sparse_folders: list
+    :return: .git/info/sparse-checkout lines
+    :rtype: list
+    """
+    patterns = ["/*", "!/*/"]
+    parent_folders = set()
+    for folder in sorted(set(folder.strip("/") for folder in sparse_folders)):
+        parts = folder.split("/")
+        for depth in range(1, len(parts)):
+            parent_folder = "/".join(parts[:depth])
+            if parent_folder not in parent_folders:
+                parent_folders.add(parent_folder)
+                patterns.extend([f"/{parent_folder}/", f"!/{parent_folder}/*/"])
+        patterns.append(f"/{folder}/")
+
+    return patterns
+
+
+def clone_or_update_sparse(repo_url, repo_folder, sparse_folders, timeout=None):
+    """clone_or_update_sparse
+
+    Clone the last commit of a repository with only sparse_folders and the root files checked
+    out, without the blobs of the other files when git supports partial clones. An existing
+    clone fetches the last commit of its branch, its local commits which were not pushed yet
+    are rebased on it, and gets its sparse checkout replaced, folders which are not needed
+    anymore are removed from the working tree
+
+    :param repo_url: Git repository url
+    :type repo_url: str
+    :param repo_folder: Git repository directory
+    :type repo_folder: str
+    :param sparse_folders: Folder paths relative to the repository root to check out
+    :type sparse_folders: list
+    :param timeout: Seconds to wait for the lock of an existing clone, waits forever if None
+    :type timeout: float, optional
+    :raises subprocess.CalledProcessError: A git command failed
+    """
+    patterns = get_sparse_checkout_patterns(sparse_folders)
+    filter_options = (
+        ["--filter=blob:none"] if __get_git_version() >= PARTIAL_CLONE_GIT_VERSION else []
+    )
+
+    is_cloned = os.path.isdir(os.path.join(repo_folder, ".git"))
+    if not is_cloned:
+        clone_command = ["git", "clone", "--depth", "1", "--no-checkout"] + filter_options
+        logging.info(f"Running: {' '.join(clone_command + [repo_url, repo_folder])}")
+        subprocess.run(clone_command + [repo_url, repo_folder], check=True)
+
+    with repo_lock(repo_folder, timeout):
+        with open(os.path.join(repo_folder, ".git", "info", "sparse-checkout"), "w") as outfile:
+            outfile.write("\n".join(patterns) + "\n")
+        logging.info(f"Sparse checkout of {repo_folder}: {patterns}")
+
+        commands = []
+        if is_cloned:
+            branch = __get_git_output(repo_folder, "rev-parse", "--abbrev-ref", "HEAD")
+            upstream = f"refs/remotes/origin/{branch}"
+            previous_upstream = __get_git_output(repo_folder, "rev-parse", upstream)
+            # Without --depth, a shallow clone only fetches the commits pushed since its last
+            # fetch, down to its shallow commit, and they stay connected to its history.
+            # --depth 1 would cut them from it and every merge would be unrelated
+            commands.append(
+                " ".join(["git fetch"] + filter_options + [f"origin +{branch}:{upstream}"])
+            )
+            if __get_git_output(repo_folder, "rev-parse", "HEAD") == previous_upstream:
+                commands.append(f"git merge --ff-only {upstream}")
+            else:
+                # Commits of a previous run which were not pushed, e.g. the push failed
+                commands.append(f"git rebase --onto {upstream} {previous_upstream}")
+
+        # git read-tree applies the sparse checkout and only removes files without local changes
+        run_commands(
+            commands + ["git config core.sparseCheckout true", "git read-tree -mu HEAD"],
+            repo_folder,
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repo_folder", type=str, required=True, help="Git repository directory.")
+    parser.add_argument(
+        "--working_folder",
+        type=str,
+        default=None,
+        help="Directory the commands are run from, the repository if not set.",
+    )
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds to wait for the lock.")
+    parser.add_argument("commands", nargs="+", help="Shell commands to run.")
+
+    return parser
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.INFO)
+    flags = parse_args().parse_args()
+    run_repo_commands(flags.repo_folder, flags.commands, flags.working_folder, flags.timeout)
@@ -0,0 +1,123 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import repo_queue
+
+
+class RepoQueueTest(unittest.TestCase):
+    def test_commands_are_serialized(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.mkdir(os.path.join(temp_dir, ".git"))
+            commands = ["echo start >> log", "sleep 0.2", "echo end >> log"]
+
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                for future in [
+                    executor.submit(repo_queue.run_repo_commands, temp_dir, commands)
+                    for _ in range(3)
+                ]:
+                    future.result()
+
+            with open(os.path.join(temp_dir, "log")) as infile:
+                self.assertEqual(infile.read().split(), ["start", "end"] * 3)
+
+    def test_failing_command_raises_and_releases_lock(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.mkdir(os.path.join(temp_dir, ".git"))
+
+            with self.assertRaises(subprocess.CalledProcessError):
+                repo_queue.run_repo_commands(temp_dir, ["false", "touch never_run"])
+
+            repo_queue.run_repo_commands(temp_dir, ["touch run"], timeout=1)
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, "never_run")))
+            self.assertTrue(os.path.exists(os.path.join(temp_dir, "run")))
+
+    def test_clone_or_update_sparse(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            origin_folder = os.path.join(temp_dir, "origin")
+            for path in ["README.md", "a_model/pipeline.config", "datasets/a/x", "datasets/b/x"]:
+                os.makedirs(os.path.dirname(os.path.join(origin_folder, path)), exist_ok=True)
+                open(os.path.join(origin_folder, path), "w").close()
+            subprocess.run(
+                "git init -q && git add -A && "
+                "git -c user.name=test -c user.email=test commit -q -m init",
+                shell=True,
+                cwd=origin_folder,
+                check=True,
+            )
+
+            clone_folder = os.path.join(temp_dir, "clone")
+            repo_queue.clone_or_update_sparse(
+                f"file://{origin_folder}", clone_folder, ["a_model", "datasets/a"]
+            )
+            self.assertEqual(
+                sorted(os.listdir(clone_folder)), [".git", "README.md", "a_model", "datasets"]
+            )
+            self.assertEqual(os.listdir(os.path.join(clone_folder, "datasets")), ["a"])
+
+            repo_queue.clone_or_update_sparse(
+                f"file://{origin_folder}", clone_folder, ["datasets/b"]
+            )
+            self.assertEqual(sorted(os.listdir(clone_folder)), [".git", "README.md", "datasets"])
+            self.assertEqual(os.listdir(os.path.join(clone_folder, "datasets")), ["b"])
+
+    def test_existing_clone_is_updated(self):
+        git = "git -c user.name=test -c user.email=test"
+        with tempfile.TemporaryDirectory() as temp_dir:
+            origin_folder = os.path.join(temp_dir, "origin.git")
+            work_folder = os.path.join(temp_dir, "work")
+            clone_folder = os.path.join(temp_dir, "clone")
+            os.makedirs(os.path.join(work_folder, "a_model"))
+            open(os.path.join(work_folder, "a_model", "pipeline.config"), "w").close()
+            subprocess.run(
+                f"git init -q --bare {origin_folder} && git init -q && git add -A && "
+                f"{git} commit -q -m init && git push -q {origin_folder} HEAD",
+                shell=True,
+                cwd=work_folder,
+                check=True,
+            )
+            repo_queue.clone_or_update_sparse(f"file://{origin_folder}", clone_folder, ["a_model"])
+
+            def push_file(path):
+                open(os.path.join(work_folder, path), "w").close()
+                subprocess.run(
+                    f"git add -A && {git} commit -q -m {path} && git push -q {origin_folder} HEAD",
+                    shell=True,
+                    cwd=work_folder,
+                    check=True,
+                )
+
+            push_file("a_model/new.config")
+            repo_queue.clone_or_update_sparse(f"file://{origin_folder}", clone_folder, ["a_model"])
+            self.assertTrue(os.path.exists(os.path.join(clone_folder, "a_model", "new.config")))
+
+            # A local commit which was not pushed is rebased on the new commits
+            open(os.path.join(clone_folder, "a_model", "local.config"), "w").close()
+            subprocess.run(
+                "git config user.name test && git config user.email test && "
+                "git add -A && git commit -q -m local",
+                shell=True,
+                cwd=clone_folder,
+                check=True,
+            )
+            push_file("a_model/other.config")
+            repo_queue.clone_or_update_sparse(f"file://{origin_folder}", clone_folder, ["a_model"])
+
+            log = subprocess.run(
+                ["git", "log", "--format=%s"],
+                cwd=clone_folder,
+                check=True,
+                stdout=subprocess.PIPE,
+                universal_newlines=True,
+            ).stdout.split()
+            self.assertEqual(log[:2], ["local", "a_model/other.config"])
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(clone_folder, "a_model"))),
+                ["local.config", "new.config", "other.config", "pipeline.config"],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
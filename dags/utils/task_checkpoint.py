@@ -0,0 +1,143 @@
+"""
+Completion markers for tasks which can be skipped when their inputs did not change.
+
+A checkpointed callable writes a marker once it succeeds, holding a manifest digest of its
+inputs and arguments and of the outputs it produced. When it runs again, on retry or when
+the DAG is triggered again, and both digests are unchanged, it returns right away instead of
+repeating its copies. Manifests are built from file metadata (path, size, modification time),
+file contents are never read.
+"""
+
+import functools
+import glob
+import hashlib
+import json
+import logging
+import os
+
+MARKER_VERSION = 1
+
+
+def __get_manifest_entries(path, include_mtime):
+    root_stat = os.lstat(path)
+    if not os.path.isdir(path) or os.path.islink(path):
+        yield path, root_stat, include_mtime
+        return
+
+    for folder, folder_names, file_names in os.walk(path):
+        folder_names.sort()
+        for name in folder_names + sorted(file_names):
+            entry_path = os.path.join(folder, name)
+            entry_stat = os.lstat(entry_path)
+            if os.path.isdir(entry_path) and not os.path.islink(entry_path):
+                # Folders are walked, their own modification time changes with any entry
+                yield entry_path, None, False
+            else:
+                yield entry_path, entry_stat, include_mtime
+
+
+def get_manifest_digest(paths, params=None, include_mtime=True):
+    """get_manifest_digest
+
+    Digest of the files under paths, from their metadata only
+
+    :param paths: File paths, folder paths or glob patterns, folders are walked recursively
+    :type paths: list
+    :param params: JSON serializable values added to the digest, defaults to None
+    :type params: object, optional
+    :param include_mtime: Include the modification time of the files, defaults to True
+    :type include_mtime: bool, optional
+    :return: sha256 hex digest
+    :rtype: str
+    """
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode("utf8"))
+
+    for pattern in paths:
+        digest.update(f"\0pattern\0{pattern}".encode("utf8"))
+        for path in sorted(glob.glob(pattern)):
+            for entry_path, entry_stat, with_mtime in __get_manifest_entries(path, include_mtime):
+                entry = [entry_path]
+                if entry_stat is not None:
+                    if os.path.islink(entry_path):
+                        entry.append(os.readlink(entry_path))
+                    else:
+                        entry.append(entry_stat.st_size)
+                    if with_mtime:
+                        entry.append(entry_stat.st_mtime_ns)
+                digest.update(("\0" + json.dumps(entry)).encode("utf8"))
+
+    return digest.hexdigest()
+
+
+def __read_marker(checkpoint_file):
+    try:
+        with open(checkpoint_file) as infile:
+            marker = json.load(infile)
+    except (IOError, ValueError):
+        return None
+    return marker if marker.get("version") == MARKER_VERSION else None
+
+
+def __write_marker(checkpoint_file, marker):
+    os.makedirs(os.path.dirname(os.path.abspath(checkpoint_file)), exist_ok=True)
+    temp_file = f"{checkpoint_file}.tmp"
+    with open(temp_file, "w") as outfile:
+        json.dump(marker, outfile)
+    os.replace(temp_file, checkpoint_file)
+
+
+def checkpointed(python_callable):
+    """checkpointed
+
+    Wrap a callable so that it is skipped when its completion marker matches its inputs,
+    arguments and outputs. The wrapper takes three keyword arguments on top of the ones of
+    the callable:
+
+    - checkpoint_file: Completion marker file path
+    - checkpoint_inputs: Paths or glob patterns read by the callable
+    - checkpoint_outputs: Paths or glob patterns written by the callable, optional
+
+    The inputs are digested again once the callable returned, since tracking tasks replace
+    their inputs with links to the DVC cache. The outputs are compared by path and size only
+    for the same reason.
+
+    :param python_callable: Callable taking keyword arguments only
+    :type python_callable: callable
+    :return: The wrapped callable
+    :rtype: callable
+    """
+    callable_name = f"{python_callable.__module__}.{python_callable.__qualname__}"
+
+    @functools.wraps(python_callable)
+    def wrapper(checkpoint_file, checkpoint_inputs, checkpoint_outputs=(), **kwargs):
+        params = {"callable": callable_name, "kwargs": kwargs}
+
+        marker = __read_marker(checkpoint_file)
+        if (
+            marker is not None
+            and marker["inputs"] == get_manifest_digest(checkpoint_inputs, params)
+            and marker["outputs"] == get_manifest_digest(checkpoint_outputs, include_mtime=False)
+        ):
+            logging.info(f"Inputs and outputs unchanged since {checkpoint_file}, skipping")
+            return marker["result"]
+
+        # An interrupted run must not leave the marker of a previous one behind
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+
+        result = python_callable(**kwargs)
+
+        __write_marker(
+            checkpoint_file,
+            {
+                "version": MARKER_VERSION,
+                "inputs": get_manifest_digest(checkpoint_inputs, params),
+                "outputs": get_manifest_digest(checkpoint_outputs, include_mtime=False),
+                "result": result if isinstance(result, (str, int, float, bool)) else None,
+            },
+        )
+        logging.info(f"Completion marker written to {checkpoint_file}")
+
+        return result
+
+    return wrapper
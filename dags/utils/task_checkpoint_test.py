@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import task_checkpoint
+
+
+class TaskCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_folder = os.path.join(self.temp_dir, "input")
+        self.output_folder = os.path.join(self.temp_dir, "output")
+        os.makedirs(self.input_folder)
+        with open(os.path.join(self.input_folder, "image.jpg"), "w") as outfile:
+            outfile.write("image")
+
+        self.calls = []
+
+        def copy_folder(input_folder, output_folder):
+            self.calls.append(output_folder)
+            if os.path.exists(output_folder):
+                shutil.rmtree(output_folder)
+            shutil.copytree(input_folder, output_folder)
+
+        self.copy_folder = task_checkpoint.checkpointed(copy_folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_copy(self):
+        self.copy_folder(
+            checkpoint_file=os.path.join(self.temp_dir, "checkpoints", "copy.json"),
+            checkpoint_inputs=[self.input_folder],
+            checkpoint_outputs=[self.output_folder],
+            input_folder=self.input_folder,
+            output_folder=self.output_folder,
+        )
+
+    def test_unchanged_inputs_are_skipped(self):
+        self.run_copy()
+        self.run_copy()
+
+        self.assertEqual(len(self.calls), 1)
+
+    def test_changed_inputs_or_missing_outputs_run_again(self):
+        self.run_copy()
+
+        with open(os.path.join(self.input_folder, "other.jpg"), "w") as outfile:
+            outfile.write("other")
+        self.run_copy()
+
+        shutil.rmtree(self.output_folder)
+        self.run_copy()
+
+        self.assertEqual(len(self.calls), 3)
+        self.assertTrue(os.path.exists(os.path.join(self.output_folder, "other.jpg")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,504 @@
+import glob
+import gzip
+import heapq
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+try:
+    # Optional C implementation, the pure python fallback below is much slower on large images
+    from crc32c import crc32c as _crc32c_update
+except ImportError:
+    _crc32c_update = None
+
+CRC32C_POLYNOMIAL = 0x82F63B78
+CRC32C_MASK_DELTA = 0xA282EAD8
+LENGTH_HEADER_SIZE = 8
+CRC_SIZE = 4
+RECORD_OVERHEAD = LENGTH_HEADER_SIZE + 2 * CRC_SIZE
+# Same names as tf.io.TFRecordOptions
+COMPRESSION_TYPES = [None, "GZIP", "ZLIB"]
+READ_CHUNK_SIZE = 1024 * 1024
+
+_crc32c_table = []
+for _byte in range(256):
+    _crc = _byte
+    for _ in range(8):
+        _crc = (_crc >> 1) ^ CRC32C_POLYNOMIAL if _crc & 1 else _crc >> 1
+    _crc32c_table.append(_crc)
+
+
+def crc32c(data):
+    """
+    Compute the CRC32C (Castagnoli) checksum of a buffer
+    :param data: Bytes to checksum
+    :return: CRC32C as an unsigned 32 bits integer
+    """
+    if _crc32c_update is not None:
+        return _crc32c_update(data)
+
+    crc = 0xFFFFFFFF
+    table = _crc32c_table
+    for byte in data:
+        crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+
+    return crc ^ 0xFFFFFFFF
+
+
+def masked_crc32c(data):
+    """
+    Compute the masked CRC32C stored in TFRecord files
+    :param data: Bytes to checksum
+    :return: Masked CRC32C as an unsigned 32 bits integer
+    """
+    crc = crc32c(data)
+    return (((crc >> 15) | (crc << 17)) + CRC32C_MASK_DELTA) & 0xFFFFFFFF
+
+
+def encode_record(data):
+    """
+    Frame a serialized record the same way tf.io.TFRecordWriter does:
+    uint64 length, uint32 masked crc of length, data, uint32 masked crc of data
+    :param data: Serialized record
+    :return: Framed record bytes
+    """
+    length = struct.pack("<Q", len(data))
+    return b"".join(
+        [
+            length,
+            struct.pack("<I", masked_crc32c(length)),
+            data,
+            struct.pack("<I", masked_crc32c(data)),
+        ]
+    )
+
+
+def get_index_path(path):
+    """
+    :param path: TFRecord file path
+    :return: Path of the sidecar index of a TFRecord file
+    """
+    return f"{path}.index"
+
+
+class _ZlibWriter:
+    def __init__(self, path):
+        self._file = open(path, "wb")
+        self._compressor = zlib.compressobj()
+
+    def write(self, data):
+        self._file.write(self._compressor.compress(data))
+
+    def flush(self):
+        self._file.write(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+        self._file.flush()
+
+    def close(self):
+        self._file.write(self._compressor.flush())
+        self._file.close()
+
+
+class _ZlibReader:
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._reset()
+
+    def _reset(self):
+        self._decompressor = zlib.decompressobj()
+        # Decompressed data, read from _buffer_offset. The bytes already read are only
+        # dropped on refill, so that small reads (record headers, crcs) never copy the buffer
+        self._buffer = bytearray()
+        self._buffer_offset = 0
+        self._position = 0
+
+    def _fill(self, size):
+        del self._buffer[: self._buffer_offset]
+        self._buffer_offset = 0
+        while len(self._buffer) < size and not self._decompressor.eof:
+            # Input left by the previous max_length bounded decompression comes first
+            chunk = self._decompressor.unconsumed_tail or self._file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            self._buffer += self._decompressor.decompress(
+                chunk, max(size - len(self._buffer), READ_CHUNK_SIZE)
+            )
+
+    def read(self, size):
+        if len(self._buffer) - self._buffer_offset < size:
+            self._fill(size)
+        data = bytes(self._buffer[self._buffer_offset : self._buffer_offset + size])
+        self._buffer_offset += len(data)
+        self._position += len(data)
+        return data
+
+    def seek(self, offset):
+        # Compressed streams can only be read forward, rewind for backward seeks like gzip does
+        if offset < self._position:
+            self._file.seek(0)
+            self._reset()
+        while self._position < offset:
+            if not self.read(min(offset - self._position, READ_CHUNK_SIZE)):
+                break
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _open_record_file(path, mode, compression_type):
+    if compression_type not in COMPRESSION_TYPES:
+        raise ValueError(
+            f"Unknown compression type {compression_type}, use one of {COMPRESSION_TYPES}"
+        )
+    if compression_type == "GZIP":
+        return gzip.open(path, mode)
+    if compression_type == "ZLIB":
+        return _ZlibWriter(path) if mode == "wb" else _ZlibReader(path)
+    return open(path, mode)
+
+
+class TFRecordWriter:
+    """
+    Minimal replacement of tf.io.TFRecordWriter which does not require tensorflow.
+    It can also write a sidecar index with the offset and length of every record,
+    one "offset length" line per record. Offsets are in the uncompressed stream
+    """
+
+    def __init__(self, path, compression_type=None, write_index=False):
+        self._file = _open_record_file(path, "wb", compression_type)
+        self._index_file = open(get_index_path(path), "w") if write_index else None
+        self._offset = 0
+
+    def write(self, record):
+        self.write_encoded(encode_record(record))
+
+    def write_encoded(self, encoded_record):
+        """
+        Write a record already framed by encode_record, i.g: copied from another file
+        """
+        self._file.write(encoded_record)
+        if self._index_file is not None:
+            self._index_file.write(f"{self._offset} {len(encoded_record)}\n")
+        self._offset += len(encoded_record)
+
+    def flush(self):
+        self._file.flush()
+        if self._index_file is not None:
+            self._index_file.flush()
+
+    def close(self):
+        self._file.close()
+        if self._index_file is not None:
+            self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _read_exactly(infile, size, path):
+    data = infile.read(size)
+    if len(data) != size:
+        raise ValueError(f"Truncated record in {path}")
+    return data
+
+
+def _read_record(infile, path, verify_crc):
+    length_bytes = infile.read(LENGTH_HEADER_SIZE)
+    if not length_bytes:
+        return None
+    if len(length_bytes) != LENGTH_HEADER_SIZE:
+        raise ValueError(f"Truncated record in {path}")
+
+    (length_crc,) = struct.unpack("<I", _read_exactly(infile, CRC_SIZE, path))
+    if verify_crc and length_crc != masked_crc32c(length_bytes):
+        raise ValueError(f"Corrupted record length in {path}")
+
+    (length,) = struct.unpack("<Q", length_bytes)
+    data = _read_exactly(infile, length, path)
+
+    (data_crc,) = struct.unpack("<I", _read_exactly(infile, CRC_SIZE, path))
+    if verify_crc and data_crc != masked_crc32c(data):
+        raise ValueError(f"Corrupted record data in {path}")
+
+    return data
+
+
+def iter_tf_records(path, verify_crc=True, compression_type=None):
+    """
+    Read the records of a TFRecord file one at a time
+    :param path: TFRecord file path
+    :param verify_crc: Validate length and data checksums
+    :param compression_type: None, "GZIP" or "ZLIB"
+    :raises ValueError: Error raised when the file is truncated or a checksum does not match
+    :return: A generator of serialized records
+    """
+    with _open_record_file(path, "rb", compression_type) as infile:
+        while True:
+            data = _read_record(infile, path, verify_crc)
+            if data is None:
+                return
+            yield data
+
+
+def read_tf_record_index(path):
+    """
+    Read the sidecar index of a TFRecord file
+    :param path: TFRecord file path
+    :return: A list of (offset, length) tuples, one per record
+    """
+    with open(get_index_path(path), "r") as infile:
+        return [tuple(int(value) for value in line.split()) for line in infile if line.strip()]
+
+
+def count_tf_records(path, compression_type=None):
+    """
+    Count the records of a TFRecord file, from its sidecar index when it exists
+    :param path: TFRecord file path
+    :param compression_type: None, "GZIP" or "ZLIB"
+    :return: Number of records
+    """
+    try:
+        return len(read_tf_record_index(path))
+    except FileNotFoundError:
+        return sum(1 for _ in iter_tf_records(path, False, compression_type))
+
+
+def read_tf_records_at(path, entries, verify_crc=True, compression_type=None):
+    """
+    Read records at the offsets of a sidecar index. Uncompressed files are read with one
+    seek per record, compressed files have to be decompressed up to every offset
+    :param path: TFRecord file path
+    :param entries: (offset, length) tuples from read_tf_record_index
+    :param verify_crc: Validate length and data checksums
+    :param compression_type: None, "GZIP" or "ZLIB"
+    :raises ValueError: Error raised when a record does not match its index entry
+    :return: A generator of serialized records in the order of entries
+    """
+    with _open_record_file(path, "rb", compression_type) as infile:
+        for offset, length in entries:
+            infile.seek(offset)
+            data = _read_record(infile, path, verify_crc)
+            if data is None or len(data) + RECORD_OVERHEAD != length:
+                raise ValueError(f"Record at offset {offset} does not match the index of {path}")
+            yield data
+
+
+def get_tf_record_entries(path):
+    """
+    Get the offset and length of every record of an uncompressed TFRecord file, from its
+    sidecar index when it exists or by reading the record headers only
+    :param path: TFRecord file path
+    :raises ValueError: Error raised when the file is truncated or a length is corrupted
+    :return: A list of (offset, length) tuples, one per record
+    """
+    try:
+        return read_tf_record_index(path)
+    except FileNotFoundError:
+        pass
+
+    entries = []
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as infile:
+        offset = 0
+        while offset < file_size:
+            length_bytes = _read_exactly(infile, LENGTH_HEADER_SIZE, path)
+            (length_crc,) = struct.unpack("<I", _read_exactly(infile, CRC_SIZE, path))
+            if length_crc != masked_crc32c(length_bytes):
+                raise ValueError(f"Corrupted record length in {path}")
+            (length,) = struct.unpack("<Q", length_bytes)
+            entries.append((offset, length + RECORD_OVERHEAD))
+            offset += length + RECORD_OVERHEAD
+            infile.seek(offset)
+        if offset != file_size:
+            raise ValueError(f"Truncated record in {path}")
+
+    return entries
+
+
+def get_shard_path(output_dir, name, shard_index, num_shards):
+    """
+    :return: The path of a shard i.g: name-00000-of-00010.record
+    """
+    return os.path.join(output_dir, f"{name}-{shard_index:05d}-of-{num_shards:05d}.record")
+
+
+def remove_shards(output_dir, name):
+    """
+    Remove the shards of a record and their sidecar index, whatever their shard count
+    """
+    stale_records = glob.glob(os.path.join(output_dir, f"{name}-*-of-*.record*"))
+    stale_records += glob.glob(os.path.join(output_dir, f"{name}.record*"))
+    for stale_record in stale_records:
+        os.remove(stale_record)
+
+
+def _copy_tf_records(output_path, entries):
+    input_files = {}
+    try:
+        with TFRecordWriter(output_path, write_index=True) as writer:
+            for input_path, offset, length in entries:
+                if input_path not in input_files:
+                    input_files[input_path] = open(input_path, "rb")
+                input_file = input_files[input_path]
+                input_file.seek(offset)
+                writer.write_encoded(_read_exactly(input_file, length, input_path))
+    finally:
+        for input_file in input_files.values():
+            input_file.close()
+
+    return len(entries)
+
+
+def merge_tf_records(input_paths, output_dir, name, num_shards, workers=None):
+    """
+    Merge uncompressed TFRecord files into evenly sized shards. Records of the inputs are
+    interleaved proportionally to their count, so that every shard holds a mix of all the
+    inputs, and given to the shard with the fewest bytes. Framed records are copied as is
+    with one process per shard, the inputs are left untouched
+    :param input_paths: TFRecord files to merge
+    :param output_dir: Directory of the shards
+    :param name: Name of the record, used as the shard filename prefix
+    :param num_shards: Number of shards to write
+    :param workers: Number of processes, defaults to the cpu count
+    :return: The list of shard paths
+    """
+    interleaved_entries = []
+    for input_number, input_path in enumerate(sorted(input_paths)):
+        entries = get_tf_record_entries(input_path)
+        for entry_number, (offset, length) in enumerate(entries):
+            position = (entry_number + 0.5) / len(entries)
+            interleaved_entries.append((position, input_number, input_path, offset, length))
+    interleaved_entries.sort()
+
+    num_shards = max(1, num_shards)
+    shard_entries = [[] for _ in range(num_shards)]
+    shard_sizes = [(0, shard_index) for shard_index in range(num_shards)]
+    for _, _, input_path, offset, length in interleaved_entries:
+        shard_size, shard_index = heapq.heappop(shard_sizes)
+        shard_entries[shard_index].append((input_path, offset, length))
+        heapq.heappush(shard_sizes, (shard_size + length, shard_index))
+
+    os.makedirs(output_dir, exist_ok=True)
+    remove_shards(output_dir, name)
+    shard_paths = [
+        get_shard_path(output_dir, name, shard_index, num_shards)
+        for shard_index in range(num_shards)
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_copy_tf_records, shard_paths, shard_entries))
+
+    return shard_paths
+
+
+def _build_example_messages():
+    """
+    Build the tensorflow.Example message classes from their descriptor using the protobuf runtime
+    (see tensorflow/core/example/feature.proto and example.proto). A private descriptor pool
+    is used so that it does not conflict with tensorflow if both are loaded
+    """
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name="tensorflow/core/example/example.proto", package="tensorflow", syntax="proto3"
+    )
+    field = descriptor_pb2.FieldDescriptorProto
+
+    for name, field_type in [
+        ("BytesList", field.TYPE_BYTES),
+        ("FloatList", field.TYPE_FLOAT),
+        ("Int64List", field.TYPE_INT64),
+    ]:
+        message = file_proto.message_type.add(name=name)
+        message.field.add(name="value", number=1, label=field.LABEL_REPEATED, type=field_type)
+
+    feature = file_proto.message_type.add(name="Feature")
+    feature.oneof_decl.add(name="kind")
+    for number, (name, type_name) in enumerate(
+        [("bytes_list", "BytesList"), ("float_list", "FloatList"), ("int64_list", "Int64List")],
+        start=1,
+    ):
+        feature.field.add(
+            name=name,
+            number=number,
+            label=field.LABEL_OPTIONAL,
+            type=field.TYPE_MESSAGE,
+            type_name=f".tensorflow.{type_name}",
+            oneof_index=0,
+        )
+
+    features = file_proto.message_type.add(name="Features")
+    feature_entry = features.nested_type.add(name="FeatureEntry")
+    feature_entry.options.map_entry = True
+    feature_entry.field.add(
+        name="key", number=1, label=field.LABEL_OPTIONAL, type=field.TYPE_STRING
+    )
+    feature_entry.field.add(
+        name="value",
+        number=2,
+        label=field.LABEL_OPTIONAL,
+        type=field.TYPE_MESSAGE,
+        type_name=".tensorflow.Feature",
+    )
+    features.field.add(
+        name="feature",
+        number=1,
+        label=field.LABEL_REPEATED,
+        type=field.TYPE_MESSAGE,
+        type_name=".tensorflow.Features.FeatureEntry",
+    )
+
+    example = file_proto.message_type.add(name="Example")
+    example.field.add(
+        name="features",
+        number=1,
+        label=field.LABEL_OPTIONAL,
+        type=field.TYPE_MESSAGE,
+        type_name=".tensorflow.Features",
+    )
+
+    pool = descriptor_pool.DescriptorPool()
+    pool.AddSerializedFile(file_proto.SerializeToString())
+    file_descriptor = pool.FindFileByName(file_proto.name)
+
+    if hasattr(message_factory, "GetMessageClass"):
+        get_message_class = message_factory.GetMessageClass
+    else:
+        get_message_class = message_factory.MessageFactory(pool).GetPrototype
+
+    return [
+        get_message_class(file_descriptor.message_types_by_name[name])
+        for name in ["BytesList", "FloatList", "Int64List", "Feature", "Features", "Example"]
+    ]
+
+
+BytesList, FloatList, Int64List, Feature, Features, Example = _build_example_messages()
+
+
+def int64_feature(value):
+    return Feature(int64_list=Int64List(value=[value]))
+
+
+def int64_list_feature(value):
+    return Feature(int64_list=Int64List(value=value))
+
+
+def bytes_feature(value):
+    return Feature(bytes_list=BytesList(value=[value]))
+
+
+def bytes_list_feature(value):
+    return Feature(bytes_list=BytesList(value=value))
+
+
+def float_list_feature(value):
+    return Feature(float_list=FloatList(value=value))
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import tf_record
+
+
+class TFRecordTest(unittest.TestCase):
+    def test_crc32c(self):
+        self.assertEqual(tf_record.crc32c(b""), 0)
+        self.assertEqual(tf_record.crc32c(b"123456789"), 0xE3069283)
+
+    def test_write_and_read_records(self):
+        example = tf_record.Example(
+            features=tf_record.Features(
+                feature={
+                    "image/height": tf_record.int64_feature(48),
+                    "image/filename": tf_record.bytes_feature(b"image.jpg"),
+                    "image/object/bbox/xmin": tf_record.float_list_feature([0.25, 0.5]),
+                }
+            )
+        )
+        records = [example.SerializeToString(deterministic=True), b""]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "test.record")
+            with tf_record.TFRecordWriter(path) as writer:
+                for record in records:
+                    writer.write(record)
+
+            read_records = list(tf_record.iter_tf_records(path))
+
+        self.assertEqual(read_records, records)
+        parsed_example = tf_record.Example.FromString(read_records[0])
+        self.assertEqual(parsed_example.features.feature["image/height"].int64_list.value, [48])
+
+    def test_compressed_records_and_index(self):
+        records = [b"first", b"", b"third" * 100]
+
+        for compression_type in tf_record.COMPRESSION_TYPES:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                path = os.path.join(temp_dir, "test.record")
+                with tf_record.TFRecordWriter(path, compression_type, write_index=True) as writer:
+                    for record in records:
+                        writer.write(record)
+
+                index = tf_record.read_tf_record_index(path)
+                read_records = list(
+                    tf_record.iter_tf_records(path, compression_type=compression_type)
+                )
+                sampled_records = list(
+                    tf_record.read_tf_records_at(
+                        path, [index[2], index[0]], compression_type=compression_type
+                    )
+                )
+
+                self.assertEqual(read_records, records)
+                self.assertEqual(tf_record.count_tf_records(path), len(records))
+                self.assertEqual(sampled_records, [records[2], records[0]])
+
+    def test_zlib_records_span_read_chunks(self):
+        records = [os.urandom(100), b"", b"compressible" * 50, os.urandom(3)]
+
+        with tempfile.TemporaryDirectory() as temp_dir, mock.patch.object(
+            tf_record, "READ_CHUNK_SIZE", 7
+        ):
+            path = os.path.join(temp_dir, "test.record")
+            with tf_record.TFRecordWriter(path, "ZLIB", write_index=True) as writer:
+                for record in records:
+                    writer.write(record)
+
+            index = tf_record.read_tf_record_index(path)
+            read_records = list(tf_record.iter_tf_records(path, compression_type="ZLIB"))
+            # Backward seeks rewind the stream
+            sampled_records = list(
+                tf_record.read_tf_records_at(
+                    path, [index[3], index[0], index[2]], compression_type="ZLIB"
+                )
+            )
+
+        self.assertEqual(read_records, records)
+        self.assertEqual(sampled_records, [records[3], records[0], records[2]])
+
+    def test_merge_tf_records(self):
+        inputs = {"big.record": [b"big%d" % i for i in range(20)], "small.record": [b"s0", b"s1"]}
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_paths = []
+            for filename, records in inputs.items():
+                input_paths.append(os.path.join(temp_dir, filename))
+                with tf_record.TFRecordWriter(input_paths[-1]) as writer:
+                    for record in records:
+                        writer.write(record)
+
+            shard_paths = tf_record.merge_tf_records(
+                input_paths, os.path.join(temp_dir, "merged"), "source_train", 3, workers=1
+            )
+            shard_records = [list(tf_record.iter_tf_records(path)) for path in shard_paths]
+            shard_counts = [tf_record.count_tf_records(path) for path in shard_paths]
+
+        self.assertEqual(
+            sorted(record for records in shard_records for record in records),
+            sorted(inputs["big.record"] + inputs["small.record"]),
+        )
+        self.assertEqual(shard_counts, [len(records) for records in shard_records])
+        self.assertLessEqual(max(shard_counts) - min(shard_counts), 1)
+        for records in shard_records:
+            big_records = [record for record in records if record in inputs["big.record"]]
+            self.assertEqual(big_records, sorted(big_records, key=inputs["big.record"].index))
+
+    def test_corrupted_record_raises(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "test.record")
+            with open(path, "wb") as outfile:
+                encoded_record = bytearray(tf_record.encode_record(b"some data"))
+                encoded_record[-5] ^= 0xFF
+                outfile.write(encoded_record)
+
+            with self.assertRaises(ValueError):
+                list(tf_record.iter_tf_records(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,250 @@
+"""
+Verify and inspect TFRecord files in parallel, one process per file.
+
+Every record is checked (length and data CRC32C, tf.train.Example parsing, consistent
+box features and a decodable JPEG matching the image size features), and examples and
+boxes per class are counted. The summary is written next to the records.
+
+PIL and protobuf are imported by the verifying processes only, so that importing the
+module from a DAG file stays cheap. Usable as a PythonOperator callable
+(verify_tf_records) or from the dags folder:
+    python -m utils.tf_record_verifier --record_folder=... --record_pattern="*.record"
+"""
+
+import argparse
+import glob
+import io
+import json
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+TF_RECORD_SUMMARY_FILE = "tf_record_summary.json"
+BOX_FEATURES = [
+    "image/object/bbox/xmin",
+    "image/object/bbox/ymin",
+    "image/object/bbox/xmax",
+    "image/object/bbox/ymax",
+    "image/object/class/label",
+]
+
+
+def __get_feature_values(feature_map, key):
+    feature = feature_map.get(key)
+    if feature is None:
+        return []
+    kind = feature.WhichOneof("kind")
+    return list(getattr(feature, kind).value) if kind is not None else []
+
+
+def __verify_example(serialized_example, decode_images):
+    """__verify_example
+
+    :param serialized_example: Serialized tf.train.Example
+    :type serialized_example: bytes
+    :param decode_images: Fully decode the image instead of reading its header only
+    :type decode_images: bool
+    :raises ValueError: The example is not valid
+    :return: Class names of the boxes
+    :rtype: list
+    """
+    import PIL.Image
+
+    from utils import tf_record
+
+    feature_map = tf_record.Example.FromString(serialized_example).features.feature
+
+    class_names = [
+        class_name.decode("utf8")
+        for class_name in __get_feature_values(feature_map, "image/object/class/text")
+    ]
+    for feature_name in BOX_FEATURES:
+        if len(__get_feature_values(feature_map, feature_name)) != len(class_names):
+            raise ValueError(f"{feature_name} does not have one value per box")
+
+    encoded_image = __get_feature_values(feature_map, "image/encoded")
+    if not encoded_image:
+        raise ValueError("Example without image/encoded")
+    try:
+        image = PIL.Image.open(io.BytesIO(encoded_image[0]))
+        if decode_images:
+            image.load()
+    except (IOError, SyntaxError) as e:
+        raise ValueError(f"Image can not be decoded: {e}")
+
+    expected_size = (
+        __get_feature_values(feature_map, "image/width"),
+        __get_feature_values(feature_map, "image/height"),
+    )
+    if expected_size != ([image.width], [image.height]):
+        raise ValueError(f"Image size {image.size} does not match the size features")
+
+    return class_names
+
+
+def verify_tf_record_file(record_file, compression_type=None, decode_images=False):
+    """verify_tf_record_file
+
+    Verify every record of a TFRecord file and count its examples and boxes per class
+
+    :param record_file: TFRecord file path
+    :type record_file: str
+    :param compression_type: None, "GZIP" or "ZLIB"
+    :type compression_type: str, optional
+    :param decode_images: Fully decode the images, slower, defaults to False
+    :type decode_images: bool, optional
+    :return: File summary with examples, boxes_per_class and errors
+    :rtype: dict
+    """
+    from utils import tf_record
+
+    examples = 0
+    boxes_per_class = Counter()
+    errors = []
+
+    try:
+        for record_number, serialized_example in enumerate(
+            tf_record.iter_tf_records(record_file, compression_type=compression_type)
+        ):
+            examples += 1
+            try:
+                boxes_per_class.update(__verify_example(serialized_example, decode_images))
+            except Exception as e:
+                errors.append(f"Record {record_number}: {e}")
+    except ValueError as e:
+        # Corrupted or truncated file, the following records can not be framed
+        errors.append(str(e))
+
+    if os.path.exists(tf_record.get_index_path(record_file)):
+        indexed_examples = len(tf_record.read_tf_record_index(record_file))
+        if indexed_examples != examples:
+            errors.append(f"Index lists {indexed_examples} records, {examples} were read")
+
+    return {
+        "size": os.path.getsize(record_file),
+        "examples": examples,
+        "boxes_per_class": dict(sorted(boxes_per_class.items())),
+        "errors": errors,
+    }
+
+
+def verify_tf_records(
+    record_folder,
+    record_pattern="*.record",
+    workers=None,
+    compression_type=None,
+    decode_images=False,
+    allow_empty=False,
+):
+    """verify_tf_records
+
+    Verify the TFRecord files of a folder in parallel and write the summary in
+    record_folder/TF_RECORD_SUMMARY_FILE
+
+    :param record_folder: Folder containing the records
+    :type record_folder: str
+    :param record_pattern: Glob pattern of the records relative to record_folder
+    :type record_pattern: str, optional
+    :param workers: Number of processes, defaults to the cpu count
+    :type workers: int, optional
+    :param compression_type: None, "GZIP" or "ZLIB"
+    :type compression_type: str, optional
+    :param decode_images: Fully decode the images, slower, defaults to False
+    :type decode_images: bool, optional
+    :param allow_empty: Do not fail when there is no example, defaults to False
+    :type allow_empty: bool, optional
+    :raises ValueError: A record is not valid or no example was found
+    :return: The summary
+    :rtype: dict
+    """
+    record_files = sorted(glob.glob(os.path.join(record_folder, record_pattern)))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        file_summaries = list(
+            executor.map(
+                verify_tf_record_file,
+                record_files,
+                [compression_type] * len(record_files),
+                [decode_images] * len(record_files),
+            )
+        )
+
+    boxes_per_class = Counter()
+    for file_summary in file_summaries:
+        boxes_per_class.update(file_summary["boxes_per_class"])
+
+    summary = {
+        "files": len(record_files),
+        "size": sum(file_summary["size"] for file_summary in file_summaries),
+        "examples": sum(file_summary["examples"] for file_summary in file_summaries),
+        "boxes_per_class": dict(sorted(boxes_per_class.items())),
+        "errors": sum(len(file_summary["errors"]) for file_summary in file_summaries),
+        "records": {
+            os.path.relpath(record_file, record_folder): file_summary
+            for record_file, file_summary in zip(record_files, file_summaries)
+        },
+    }
+
+    with open(os.path.join(record_folder, TF_RECORD_SUMMARY_FILE), "w") as outfile:
+        json.dump(summary, outfile, indent=2)
+
+    logging.info(
+        f"Verified {summary['examples']} examples in {summary['files']} files of {record_folder}: "
+        f"{summary['errors']} errors, boxes per class {summary['boxes_per_class']}"
+    )
+
+    if summary["errors"]:
+        invalid_records = {
+            record_file: file_summary["errors"][:10]
+            for record_file, file_summary in summary["records"].items()
+            if file_summary["errors"]
+        }
+        raise ValueError(f"Invalid records in {record_folder}: {invalid_records}")
+    if summary["examples"] == 0 and not allow_empty:
+        raise ValueError(f"No example found in {record_folder}/{record_pattern}")
+
+    return summary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--record_folder", type=str, required=True, help="Folder containing the records."
+    )
+    parser.add_argument(
+        "--record_pattern",
+        type=str,
+        default="*.record",
+        help="Glob pattern of the records relative to the record folder.",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="Number of verifying processes."
+    )
+    parser.add_argument(
+        "--compression",
+        type=str,
+        default=None,
+        choices=["GZIP", "ZLIB"],
+        help="Record compression, uncompressed if not set.",
+    )
+    parser.add_argument(
+        "--decode_images",
+        action="store_true",
+        help="Fully decode the images instead of reading their header only.",
+    )
+
+    return parser
+
+
+if __name__ == "__main__":
+    flags, _ = parse_args().parse_known_args()
+    summary = verify_tf_records(
+        flags.record_folder,
+        flags.record_pattern,
+        flags.workers,
+        flags.compression,
+        flags.decode_images,
+        allow_empty=True,
+    )
+    print(json.dumps({key: value for key, value in summary.items() if key != "records"}, indent=2))
@@ -0,0 +1,59 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import PIL.Image
+
+import tf_record
+import tf_record_verifier
+
+
+def create_example(width, height, image_size):
+    encoded_image = io.BytesIO()
+    PIL.Image.new("RGB", image_size).save(encoded_image, format="JPEG")
+    return tf_record.Example(
+        features=tf_record.Features(
+            feature={
+                "image/width": tf_record.int64_feature(width),
+                "image/height": tf_record.int64_feature(height),
+                "image/encoded": tf_record.bytes_feature(encoded_image.getvalue()),
+                "image/object/bbox/xmin": tf_record.float_list_feature([0.1]),
+                "image/object/bbox/ymin": tf_record.float_list_feature([0.1]),
+                "image/object/bbox/xmax": tf_record.float_list_feature([0.5]),
+                "image/object/bbox/ymax": tf_record.float_list_feature([0.5]),
+                "image/object/class/text": tf_record.bytes_list_feature([b"buoy"]),
+                "image/object/class/label": tf_record.int64_list_feature([1]),
+            }
+        )
+    ).SerializeToString()
+
+
+class TFRecordVerifierTest(unittest.TestCase):
+    def test_verify_tf_records(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with tf_record.TFRecordWriter(os.path.join(temp_dir, "a.record")) as writer:
+                writer.write(create_example(32, 24, (32, 24)))
+                writer.write(create_example(32, 24, (32, 24)))
+
+            summary = tf_record_verifier.verify_tf_records(temp_dir, workers=1)
+
+            with open(os.path.join(temp_dir, tf_record_verifier.TF_RECORD_SUMMARY_FILE)) as infile:
+                self.assertEqual(json.load(infile), summary)
+
+        self.assertEqual(summary["examples"], 2)
+        self.assertEqual(summary["boxes_per_class"], {"buoy": 2})
+        self.assertEqual(summary["errors"], 0)
+
+    def test_image_size_mismatch_raises(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with tf_record.TFRecordWriter(os.path.join(temp_dir, "a.record")) as writer:
+                writer.write(create_example(32, 24, (16, 24)))
+
+            with self.assertRaises(ValueError):
+                tf_record_verifier.verify_tf_records(temp_dir, workers=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Benchmark the time the scheduler spends parsing each DAG file.
+
+Every measure runs in a new interpreter so that the imports of the DAG file are not cached.
+Airflow itself is imported before the timer starts, like in the scheduler processes. With
+--compare_to, the dags folder of a git revision is extracted and measured the same way.
+
+From the repository root, in the airflow container (the DAG files read Variables):
+    python script/benchmark_dag_parse.py --compare_to=HEAD~1
+    python script/benchmark_dag_parse.py --module=prepare_model_and_data_for_training.prepare_model_and_data_for_training
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPOSITORY_FOLDER = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DAGS_FOLDER = os.path.join(REPOSITORY_FOLDER, "dags")
+
+PARSE_DAG_FILE_CODE = """
+import json, sys, tempfile, time
+sys.path.insert(0, sys.argv[1])
+from airflow.models import DagBag
+dag_bag = DagBag(dag_folder=tempfile.mkdtemp(), include_examples=False)
+start_time = time.perf_counter()
+dags = dag_bag.process_file(sys.argv[2], only_if_updated=False)
+print(json.dumps({"seconds": time.perf_counter() - start_time, "dags": len(dags)}))
+"""
+
+IMPORT_MODULE_CODE = """
+import importlib, json, sys, time
+sys.path.insert(0, sys.argv[1])
+start_time = time.perf_counter()
+importlib.import_module(sys.argv[2])
+print(json.dumps({"seconds": time.perf_counter() - start_time, "dags": 0}))
+"""
+
+
+def measure(code, dags_folder, target, repeat):
+    """measure
+
+    :param code: Python code printing the measure as JSON
+    :type code: str
+    :param dags_folder: Dags folder added to the python path
+    :type dags_folder: str
+    :param target: DAG file path or module name
+    :type target: str
+    :param repeat: Number of new interpreters
+    :type repeat: int
+    :return: Median seconds and DAG count
+    :rtype: tuple
+    """
+    results = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code, dags_folder, target],
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    return statistics.median(result["seconds"] for result in results), results[0]["dags"]
+
+
+def benchmark(dags_folder, modules, repeat):
+    if modules:
+        code, targets = IMPORT_MODULE_CODE, modules
+    else:
+        code = PARSE_DAG_FILE_CODE
+        targets = sorted(glob.glob(os.path.join(dags_folder, "*", "*_dag.py")))
+
+    return {
+        os.path.relpath(target, dags_folder) if not modules else target: measure(
+            code, dags_folder, target, repeat
+        )
+        for target in targets
+    }
+
+
+def extract_dags_folder(revision, output_folder):
+    archive = subprocess.run(
+        ["git", "-C", REPOSITORY_FOLDER, "archive", revision, "dags"],
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    subprocess.run(["tar", "-x", "-C", output_folder], input=archive, check=True)
+    return os.path.join(output_folder, "dags")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Number of measures, the median is reported."
+    )
+    parser.add_argument(
+        "--compare_to", type=str, default=None, help="Git revision to compare the dags folder to."
+    )
+    parser.add_argument(
+        "--module",
+        type=str,
+        action="append",
+        default=[],
+        help="Measure the import of a module of the dags folder instead of parsing DAG files.",
+    )
+
+    return parser
+
+
+if __name__ == "__main__":
+    flags = parse_args().parse_args()
+
+    results = benchmark(DAGS_FOLDER, flags.module, flags.repeat)
+    baseline_results = {}
+    if flags.compare_to:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            baseline_dags_folder = extract_dags_folder(flags.compare_to, temp_dir)
+            baseline_results = benchmark(baseline_dags_folder, flags.module, flags.repeat)
+
+    print(f"{'target':<90} {'dags':>5} {'seconds':>9} {'baseline':>9}")
+    for target, (seconds, dag_count) in results.items():
+        baseline = baseline_results.get(target, (None, None))[0]
+        baseline = f"{baseline:9.3f}" if baseline is not None else f"{'-':>9}"
+        print(f"{target:<90} {dag_count:>5} {seconds:9.3f} {baseline}")